@@ -1,18 +1,47 @@
 # Fix the imports at the top of your file
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for, flash
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
 import os
+import sqlite3
+import time
+import uuid
 import logging
 import difflib # Thêm thư viện này để so sánh văn bản
 
+import config
 # Import class GrammarCorrector
 from models.corrector import GrammarCorrector
+from models.segmentation import Sentence, segment, sentence_spans
+from models.executor import InferenceExecutor, RejectedError
+from models.auth import PasswordHasher, UserCache
+from models.loader import ModelLoader
+from models.analytics import AnalyticsRecorder
+from models.routing import RoutingPolicy
+from models.rules import RuleSet
+from models.overload import OverloadController
+from models.history import HistoryStore
+from models.snapshot import CacheSnapshotter, frequent_sentences, load_snapshot, prewarm_cache
+from models.workers import parse_core_sets
+from models import metrics
+from models.utils import load_examples
+from models.response import compact_result, request_etag, etag_matches, encode_json, sentence_hash, sentence_edits
+from models.sessions import DocumentSessionStore, SessionConflictError, apply_ops
+from models.admission import (
+    RequestContext, RequestCancelled, TokenBucketLimiter, SupersedeRegistry,
+    InputTooLargeError, DeadlineExceededError, estimate_tokens
+)
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.urandom(24)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///users.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = config.DATABASE_URL
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Giữ sẵn kết nối DB thay vì mở mới mỗi request; pre_ping bỏ kết nối đã chết
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'pool_size': config.DB_POOL_SIZE,
+    'max_overflow': config.DB_MAX_OVERFLOW,
+    'pool_recycle': config.DB_POOL_RECYCLE_SECONDS,
+    'pool_pre_ping': True,
+}
 
 db = SQLAlchemy(app)
 
@@ -30,6 +59,16 @@ class User(db.Model):
 with app.app_context():
     db.create_all()
 
+# Băm mật khẩu không chạy trên luồng request/CPU của inference; tra cứu user được cache
+password_hasher = PasswordHasher(max_workers=config.AUTH_HASH_WORKERS, max_queue=config.AUTH_HASH_QUEUE_SIZE)
+user_cache = UserCache(max_entries=config.USER_CACHE_SIZE, ttl=config.USER_CACHE_TTL_SECONDS)
+
+def find_user(user_id=None, email=None):
+    """User (bản sao CachedUser) theo id hoặc email, qua user_cache."""
+    if user_id is not None:
+        return user_cache.get(('id', user_id), lambda: db.session.get(User, user_id))
+    return user_cache.get(('email', email), lambda: User.query.filter_by(email=email).first())
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -40,7 +79,11 @@ logging.basicConfig(
 # Kiểm tra xem có đang chạy trong Docker không (thư mục weights có tồn tại không)
 docker_weight_path = "/app/weights/coedit-large"
 
-if os.path.exists(docker_weight_path):
+if config.CORRECTION_MODEL:
+    # Model thay thế (vd. model nhỏ khi chạy benchmarks/loadtest.py)
+    model_name = config.CORRECTION_MODEL
+    logging.info(f"Loading model from CORRECTION_MODEL: {model_name}")
+elif os.path.exists(docker_weight_path):
     # Ưu tiên load từ Volume đã mount (Nhanh, không cần tải lại)
     model_name = docker_weight_path
     logging.info(f"Loading model from Docker volume: {model_name}")
@@ -49,9 +92,147 @@ else:
     model_name = "grammarly/coedit-large"
     logging.info(f"Loading model from HuggingFace: {model_name}")
 
-# Khởi tạo model
-model = GrammarCorrector(model_name=model_name, device="cpu", use_8bit=False)
-logging.info("Model initialized successfully!")
+def classify_errors(original, corrected):
+    # Chỉ được gọi từ luồng ghi thống kê, sau khi model đã tải xong
+    return model_loader.get().identify_errors(original, corrected)
+
+# Thống kê lỗi theo từng câu, ghi nền ra Parquet (xem models/analytics.py)
+analytics_recorder = AnalyticsRecorder(
+    config.ANALYTICS_DIR,
+    classify=classify_errors,
+    flush_interval=config.ANALYTICS_FLUSH_SECONDS
+)
+
+# Lịch sử kiểm tra theo người dùng: /correct chỉ đưa vào hàng đợi, luồng nền ghi theo lô
+history_store = HistoryStore(config.HISTORY_DB_PATH, flush_interval=config.HISTORY_FLUSH_SECONDS)
+
+def load_model():
+    routing = RoutingPolicy(
+        short_words=config.ROUTING_SHORT_WORDS,
+        max_small_words=config.ROUTING_MAX_SMALL_WORDS,
+        trust_parser=config.ROUTING_TRUST_PARSER,
+        min_confidence=config.ROUTING_MIN_CONFIDENCE,
+        small_num_beams=config.ROUTING_SMALL_NUM_BEAMS
+    )
+    model = GrammarCorrector(
+        model_name=model_name, device="cpu", use_8bit=False, analytics=analytics_recorder,
+        num_beams=config.GENERATION_NUM_BEAMS, speculative=config.SPECULATIVE_DECODING,
+        encoder_cache_size=config.ENCODER_CACHE_SIZE,
+        small_model_name=config.SMALL_MODEL_NAME or None, routing=routing,
+        spelling_index_path=config.SPELLING_INDEX_PATH,
+        token_budget={
+            'initial': config.BATCH_TOKEN_BUDGET_INITIAL,
+            'minimum': config.BATCH_TOKEN_BUDGET_MIN,
+            'maximum': config.BATCH_TOKEN_BUDGET_MAX,
+            'target_latency': config.BATCH_TARGET_SECONDS,
+            'min_free_bytes': config.BATCH_MIN_FREE_MB * 1024 * 1024,
+        }
+    )
+    if config.INFERENCE_PROCESSES:
+        model.start_workers(
+            config.WORKER_WEIGHTS_DIR,
+            num_workers=config.INFERENCE_PROCESSES,
+            core_sets=parse_core_sets(config.WORKER_CORE_SETS) or None,
+            threads=config.WORKER_THREADS or None,
+            slots=config.WORKER_SLOTS,
+            max_batch=config.WORKER_MAX_BATCH
+        )
+    restore_cache(model)
+    logging.info("Model initialized successfully!")
+    return model
+
+# Ghi snapshot cache định kỳ (được tạo sau khi model tải xong)
+cache_snapshotter = None
+
+def restore_cache(model):
+    """
+    Nạp snapshot cache của lần chạy trước (cùng phiên bản model), làm nóng
+    thêm bằng các câu phổ biến trong log traffic, rồi bắt đầu ghi snapshot.
+    """
+    global cache_snapshotter
+    if model.cache is None or not config.CACHE_SNAPSHOT_PATH:
+        return
+    try:
+        restored = load_snapshot(model.cache, config.CACHE_SNAPSHOT_PATH, model.version)
+        logging.info(f"Đã nạp {restored} câu từ snapshot cache")
+    except (OSError, ValueError) as e:
+        logging.warning(f"Không nạp được snapshot cache: {e}")
+
+    if config.CACHE_PREWARM_LOGS:
+        sentences = frequent_sentences(config.CACHE_PREWARM_LOGS, limit=config.CACHE_PREWARM_MAX_SENTENCES)
+        generated = prewarm_cache(model, sentences, time_budget=config.CACHE_PREWARM_SECONDS)
+        logging.info(f"Làm nóng cache: sinh trước {generated}/{len(sentences)} câu phổ biến")
+
+    cache_snapshotter = CacheSnapshotter(
+        model.cache, config.CACHE_SNAPSHOT_PATH, model.version, interval=config.CACHE_SNAPSHOT_INTERVAL
+    )
+    cache_snapshotter.start()
+
+def save_cache_snapshot():
+    """Ghi snapshot lần cuối khi tiến trình dừng (lifespan shutdown)."""
+    if cache_snapshotter is not None:
+        cache_snapshotter.close()
+
+def load_warmup_inputs():
+    """Các câu đại diện (lấy từ data/examples.json) dùng để warm-up model."""
+    try:
+        examples = load_examples(config.WARMUP_EXAMPLES_PATH)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Không đọc được dữ liệu warm-up: {e}")
+        return []
+    sentences = [example['original'] for example in examples][:config.WARMUP_MAX_INPUTS]
+    # Thêm một đoạn nhiều câu để warm-up cả đường tách câu
+    return sentences + [" ".join(sentences)] if sentences else []
+
+def warmup_model(model, text):
+    build_correction(model, text)
+
+# Model được tải trong luồng nền (xem cuối file): server lắng nghe ngay, /readyz báo tiến độ
+model_loader = ModelLoader(load_model, warmup=warmup_model, warmup_inputs=load_warmup_inputs())
+
+# Hàng đợi inference có giới hạn: request vượt quá sẽ nhận 429 + Retry-After
+# Với tiến trình model riêng, mỗi slot của worker cần một luồng gửi lô để không worker nào rảnh
+inference_executor = InferenceExecutor(
+    max_workers=max(config.INFERENCE_WORKERS, config.INFERENCE_PROCESSES * config.WORKER_SLOTS),
+    max_queue=config.INFERENCE_QUEUE_SIZE
+)
+# Pool nhỏ riêng cho mức chỉ cache/bộ luật khi quá tải: không chiếm chỗ trong
+# hàng đợi model đang đầy, cũng không chạy trên event loop của asgi.py
+fallback_executor = InferenceExecutor(
+    max_workers=config.FALLBACK_WORKERS,
+    max_queue=config.FALLBACK_QUEUE_SIZE,
+    name="fallback"
+)
+
+# Quá tải: giảm dần chất lượng (POS, beam, greedy, chỉ cache/bộ luật) thay vì để request timeout
+overload_controller = OverloadController(
+    inference_executor,
+    latency_slo=config.OVERLOAD_LATENCY_SLO,
+    high_watermark=config.OVERLOAD_HIGH_WATERMARK,
+    low_watermark=config.OVERLOAD_LOW_WATERMARK,
+    step_up_interval=config.OVERLOAD_STEP_UP_SECONDS,
+    step_down_interval=config.OVERLOAD_STEP_DOWN_SECONDS,
+    reduced_beams=config.OVERLOAD_REDUCED_BEAMS,
+    max_level=config.OVERLOAD_MAX_LEVEL,
+    enabled=config.OVERLOAD_ENABLED
+)
+
+# Admission control: ngân sách token theo người dùng/phiên và huỷ request cũ của editor
+token_limiter = TokenBucketLimiter(
+    capacity=config.TOKEN_BUDGET_CAPACITY,
+    refill_rate=config.TOKEN_BUDGET_REFILL_PER_SECOND
+)
+supersede_registry = SupersedeRegistry()
+
+# Phiên tài liệu cho giao thức incremental của editor (giới hạn theo LRU/TTL/bộ nhớ)
+document_sessions = DocumentSessionStore(
+    max_sessions=config.SESSION_MAX_COUNT,
+    max_bytes=config.SESSION_MAX_BYTES,
+    ttl=config.SESSION_TTL_SECONDS
+)
+
+# Bộ luật xác định cho các lỗi hay gặp: trả kết quả tức thì, không cần model
+grammar_rules = RuleSet(config.GRAMMAR_RULES_PATH)
 
 # --- HELPER FUNCTION: Tạo Diff cho Frontend ---
 def generate_diff(original, corrected):
@@ -94,11 +275,26 @@ def generate_diff(original, corrected):
             
     return errors
 
+# Cookie khoá affinity: nginx băm khoá này (khi editor không gửi X-Document-Key)
+# để mọi request của một trình duyệt tới cùng replica (xem nginx/default.conf)
+DOCUMENT_KEY_COOKIE = 'document_key'
+
+@app.after_request
+def ensure_document_key(response):
+    if DOCUMENT_KEY_COOKIE not in request.cookies:
+        response.set_cookie(
+            DOCUMENT_KEY_COOKIE, uuid.uuid4().hex,
+            max_age=30 * 24 * 3600, httponly=True, samesite='Lax'
+        )
+    return response
+
 @app.route('/')
 def index():
     user = None
+    # Mỗi trình duyệt có một sid cố định để admission control phân biệt phiên
+    session.setdefault('sid', uuid.uuid4().hex)
     if 'user_id' in session:
-        user = User.query.get(session['user_id'])
+        user = find_user(user_id=session['user_id'])
     return render_template('index.html', user=user)
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -107,9 +303,14 @@ def login():
         email = request.form.get('email')
         password = request.form.get('password')
         
-        user = User.query.filter_by(email=email).first()
-        
-        if not user or not check_password_hash(user.password, password):
+        user = find_user(email=email)
+
+        try:
+            valid = user is not None and password_hasher.verify(user.password, password)
+        except RejectedError as e:
+            busy = render_template('login.html', error='Server is busy, please try again')
+            return busy, e.status_code, e.headers()
+        if not valid:
             return render_template('login.html', error='Invalid email or password')
         
         # Store user in session
@@ -134,12 +335,16 @@ def register():
             return render_template('register.html', error='Passwords do not match')
         
         # Check if email already exists
-        existing_user = User.query.filter_by(email=email).first()
+        existing_user = find_user(email=email)
         if existing_user:
             return render_template('register.html', error='Email already registered')
-        
+
         # Create new user
-        hashed_password = generate_password_hash(password, method='pbkdf2:sha256')
+        try:
+            hashed_password = password_hasher.hash(password)
+        except RejectedError as e:
+            busy = render_template('register.html', error='Server is busy, please try again')
+            return busy, e.status_code, e.headers()
         new_user = User(
             name=name,
             email=email,
@@ -167,51 +372,508 @@ def logout():
 def health_check():
     return jsonify({"status": "healthy"})
 
+@app.route('/livez', methods=['GET'])
+def liveness_check():
+    # Tiến trình còn sống (kể cả khi model đang tải)
+    return jsonify({"status": "alive"})
+
+@app.route('/readyz', methods=['GET'])
+def readiness_check():
+    # Chỉ trả 200 khi model đã tải và warm-up xong
+    status = model_loader.status()
+    return jsonify(status), (200 if model_loader.ready else 503)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    if not config.METRICS_ENABLED:
+        return jsonify({"error": "Not found"}), 404
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+def load_session_cookie(cookie_value):
+    """Giải mã cookie session của Flask (dùng cho route ASGI không đi qua Flask)."""
+    if not cookie_value:
+        return {}
+    serializer = app.session_interface.get_signing_serializer(app)
+    try:
+        return serializer.loads(cookie_value)
+    except Exception:
+        return {}
+
+def resolve_client_key(session_data, remote_addr):
+    """Khoá định danh người dùng/phiên cho ngân sách token."""
+    if session_data.get('user_id'):
+        return f"user:{session_data['user_id']}"
+    if session_data.get('sid'):
+        return f"sid:{session_data['sid']}"
+    return f"ip:{remote_addr}"
+
+def admit_correction(text, client_key, stream_id=None, tokens=None):
+    """
+    Kiểm tra giới hạn đầu vào/ngân sách token và tạo RequestContext.
+
+    Nếu editor gửi kèm stream_id, request trước đó của cùng luồng soạn thảo
+    sẽ bị huỷ (debounce đã kích hoạt lại nên kết quả cũ không còn cần).
+
+    Raises:
+        ModelNotReadyError, InputTooLargeError, TokenBudgetExceeded
+    """
+    # Chưa sẵn sàng thì từ chối luôn, không chiếm chỗ trong hàng đợi/ngân sách token
+    model_loader.get()
+    if len(text) > config.MAX_INPUT_CHARS:
+        raise InputTooLargeError(f"Text exceeds {config.MAX_INPUT_CHARS} characters")
+    tokens = estimate_tokens(text) if tokens is None else tokens
+    # Vượt cả dung lượng bucket thì chờ bao lâu cũng không được nhận: 413, không phải Retry-After
+    if tokens > token_limiter.capacity:
+        raise InputTooLargeError(
+            f"Text needs about {tokens} tokens, more than the {token_limiter.capacity} token budget"
+        )
+    token_limiter.consume(client_key, tokens)
+
+    context = RequestContext(timeout=config.REQUEST_DEADLINE_SECONDS)
+    if stream_id:
+        supersede_registry.register((client_key, stream_id), context)
+    return context
+
+def release_correction(context, client_key, stream_id=None):
+    if stream_id:
+        supersede_registry.release((client_key, stream_id), context)
+
+def quick_correction(text):
+    """
+    Sửa bằng bộ luật (models/rules.py): vài chục micro giây, không qua hàng
+    đợi model. Editor hiển thị ngay kết quả này trong lúc chờ /correct.
+
+    Raises:
+        InputTooLargeError: Khi văn bản vượt MAX_INPUT_CHARS
+    """
+    if len(text) > config.MAX_INPUT_CHARS:
+        raise InputTooLargeError(f"Text exceeds {config.MAX_INPUT_CHARS} characters")
+    corrected, errors = grammar_rules.apply(text)
+    return {
+        'corrected_text': corrected,
+        'errors': errors,
+        'source': 'rules'
+    }
+
+def parse_correction_request(data):
+    """
+    Đọc các trường của body /correct.
+
+    Returns:
+        tuple: (text, stream_id, compact, known)
+    """
+    text = (data.get('text') or '').strip()
+    known = [digest for digest in (data.get('known') or []) if isinstance(digest, str)]
+    return text, data.get('stream_id'), bool(data.get('compact')), known
+
+def correction_etag(text, compact=False):
+    """
+    ETag của kết quả /correct: chỉ phụ thuộc văn bản, chế độ và phiên bản
+    model (model_fingerprint: thay trọng số ở cùng đường dẫn cũng đổi ETag).
+    Không tính "known": client đã có kết quả đầy đủ cho văn bản này thì
+    danh sách câu đã biết không còn ý nghĩa.
+
+    Raises:
+        ModelNotReadyError: Model chưa tải xong (chưa biết phiên bản)
+    """
+    return request_etag(model_loader.get().version, 'compact' if compact else 'full', text)
+
+def render_correction(result, etag, accept_encoding):
+    """
+    Serialize + nén kết quả, gắn ETag (trừ kết quả dở dang do hết hạn).
+
+    Returns:
+        tuple: (body bytes, dict header)
+    """
+    body, headers = encode_json(result, accept_encoding)
+    headers['Cache-Control'] = 'private, no-cache'
+    mode = result.get('mode', 'full')
+    headers['X-Correction-Mode'] = mode
+    # Kết quả giảm chất lượng không được gắn ETag: client sẽ hỏi lại khi hết quá tải
+    if not result.get('partial') and mode == 'full':
+        headers['ETag'] = etag
+    return body, headers
+
+def submit_correction(text, context, compact=False, known=(), user_id=None):
+    """
+    Chọn mức degradation rồi đưa request vào hàng đợi tương ứng: hàng đợi
+    model, hoặc ở mức chỉ cache/bộ luật là fallback_executor (không chiếm
+    chỗ trong hàng đợi model đang đầy).
+
+    Args:
+        user_id (int): Người dùng đã đăng nhập (ghi lịch sử), None = khách
+
+    Returns:
+        concurrent.futures.Future: Kết quả của run_correction
+
+    Raises:
+        QueueFullError: Khi hàng đợi được chọn đã đầy
+    """
+    mode = overload_controller.mode()
+    executor = inference_executor if mode.use_model else fallback_executor
+    return executor.submit(run_correction, text, context, compact, known, mode, user_id)
+
+def run_correction(text, context=None, compact=False, known=(), mode=None, user_id=None):
+    """
+    Toàn bộ pipeline sửa lỗi cho một đoạn văn bản.
+    Được chạy trên inference executor, dùng chung cho Flask view và route ASGI.
+
+    Raises:
+        ModelNotReadyError: Model chưa tải/warm-up xong
+        RequestCancelled: Request bị huỷ trước/trong lúc chạy
+        DeadlineExceededError: Request hết hạn khi còn nằm trong hàng đợi
+    """
+    mode = mode or overload_controller.modes[0]
+    if not text:
+        return {
+            'errors': [],
+            'sentence_analysis': None,
+            'sentence_structure': None
+        }
+
+    model = model_loader.get()
+
+    if context is not None:
+        context.raise_if_cancelled()
+        if context.expired:
+            raise DeadlineExceededError(
+                "Request deadline exceeded while queued",
+                retry_after=inference_executor.retry_after()
+            )
+
+    result = build_correction(model, text, context, compact, known, mode, user_id)
+    result['mode'] = mode.name
+    if context is not None:
+        overload_controller.observe(time.monotonic() - context.started)
+    return result
+
+def mode_num_beams(model, mode):
+    """Số beam ở một mức degradation (None = mặc định của model)."""
+    if mode is None or (mode.use_model and mode.num_beams is None):
+        return None
+    if not mode.use_model:
+        return 1
+    return min(mode.num_beams, model.num_beams)
+
+def cached_or_rule_sentences(model, sentences):
+    """
+    Sửa không cần model (mức quá tải cao nhất): kết quả đã cache (ưu tiên
+    kết quả sinh với nhiều beam nhất), câu chưa có thì dùng bộ luật.
+    """
+    corrected_sentences = []
+    for sentence in sentences:
+        corrected = None
+        for num_beams in overload_controller.cache_beams(model.num_beams):
+            corrected = model.lookup(sentence.text, num_beams=num_beams)
+            if corrected is not None:
+                break
+        if corrected is None:
+            corrected, _ = grammar_rules.apply(sentence.text)
+        corrected_sentences.append(corrected)
+    return corrected_sentences
+
+def build_correction(model, text, context=None, compact=False, known=(), mode=None, user_id=None):
+    """
+    Sửa lỗi, tạo diff và phân tích câu bằng một model cụ thể.
+
+    Args:
+        compact (bool): Trả về dạng rút gọn (delta theo câu, xem models/response.py)
+        known (iterable): Hash các câu client đã có kết quả (chỉ dùng khi compact)
+        mode (DegradationMode): Mức chất lượng khi quá tải; mặc định đầy đủ
+        user_id (int): Ghi kết quả vào lịch sử của người dùng này (tuỳ chọn)
+    """
+    # Tách câu/tách từ một lần, dùng chung cho sinh câu, diff và phân tích câu
+    segmented = segment(text)
+
+    # 1. Sửa lỗi ngữ pháp (Quan trọng nhất)
+    if mode is None or mode.use_model:
+        corrected_sentences = model.correct_sentences(
+            segmented.sentences, context=context, num_beams=mode_num_beams(model, mode)
+        )
+    else:
+        corrected_sentences = cached_or_rule_sentences(model, segmented.sentences)
+    corrected = " ".join(corrected_sentences)
+
+    # 3. Phân tích cấu trúc câu (Optional - Try/Except để tránh crash)
+    sentence_analysis = []
+    sentence_structure = None
+
+    try:
+        # Kiểm tra xem pos_analyzer có tồn tại trong model không (tắt khi quá tải)
+        if (mode is None or mode.analyze_pos) and hasattr(model, 'pos_analyzer') and model.pos_analyzer:
+            sentence_analysis = model.pos_analyzer.analyze_segmented(segmented)
+
+            # Tìm thành phần structure
+            for item in sentence_analysis:
+                if isinstance(item, dict) and item.get('type') == 'sentence_structure':
+                    sentence_structure = item
+                    sentence_analysis.remove(item)
+                    break
+    except Exception as pos_error:
+        logging.warning(f"Skipping POS analysis due to error: {pos_error}")
+        # Vẫn tiếp tục chạy để trả về kết quả sửa lỗi
+
+    # 4. Gợi ý chính tả cho các từ lạ của cả văn bản (không gọi model)
+    spelling = {}
+    if getattr(model, 'spelling', None) is not None:
+        spelling = model.spelling.suggest_many(segmented.words())
+
+    # True nếu hết hạn giữa chừng và một số câu chưa được sửa
+    partial = bool(context is not None and context.truncated)
+
+    if user_id is not None and not partial:
+        history_store.record(user_id, text, segmented.spans, corrected_sentences)
+
+    if compact:
+        return compact_result(
+            text, segmented.spans, corrected_sentences, known,
+            analysis=sentence_analysis, structure=sentence_structure, partial=partial,
+            spelling=spelling
+        )
+
+    # 2. Tạo danh sách lỗi (Sử dụng hàm generate_diff mới)
+    # Thay vì gọi model.identify_errors (có thể gây lỗi nếu class chưa update)
+    errors = generate_diff(text, corrected)
+
+    return {
+        'corrected_text': corrected, # Trả về thêm text đã sửa
+        'errors': errors,
+        'sentence_analysis': sentence_analysis,
+        'sentence_structure': sentence_structure,
+        'spelling': spelling,
+        'partial': partial
+    }
+
+def parse_incremental_request(data):
+    """
+    Đọc body của /correct/incremental.
+
+    Client gửi document_id kèm một trong hai:
+      - "text": toàn văn (lần đầu hoặc khi server yêu cầu đồng bộ lại)
+      - "base_version" + "ops": các thao tác sửa [{start, end, text}] tính từ
+        phiên bản server đã xác nhận
+
+    Returns:
+        tuple: (document_id, base_version, ops, text, stream_id)
+
+    Raises:
+        ValueError: Khi body không hợp lệ
+    """
+    document_id = data.get('document_id')
+    if not isinstance(document_id, str) or not 0 < len(document_id) <= 64:
+        raise ValueError("document_id must be a string of 1-64 characters")
+    text = data.get('text')
+    ops = data.get('ops')
+    if text is None and not isinstance(ops, list):
+        raise ValueError("Either text or ops is required")
+    if text is not None and not isinstance(text, str):
+        raise ValueError("text must be a string")
+    return document_id, data.get('base_version'), ops or [], text, data.get('stream_id')
+
+def incremental_token_estimate(text, ops):
+    """Ước lượng token cần xử lý: chỉ phần văn bản mới được gửi lên."""
+    if text is not None:
+        return estimate_tokens(text)
+    return sum(estimate_tokens(op.get('text') or '') for op in ops if isinstance(op, dict))
+
+def submit_incremental(client_key, document_id, base_version, ops, text, context, user_id=None):
+    """
+    Như submit_correction cho /correct/incremental: ở mức chỉ cache/bộ luật,
+    cập nhật chạy trên fallback_executor.
+
+    Args:
+        user_id (int): Người dùng đã đăng nhập (ghi lịch sử), None = khách
+
+    Returns:
+        concurrent.futures.Future: Kết quả của run_incremental
+
+    Raises:
+        QueueFullError: Khi hàng đợi được chọn đã đầy
+    """
+    mode = overload_controller.mode()
+    executor = inference_executor if mode.use_model else fallback_executor
+    return executor.submit(
+        run_incremental, client_key, document_id, base_version, ops, text, context, mode, user_id
+    )
+
+def run_incremental(client_key, document_id, base_version, ops, text, context=None, mode=None,
+                    user_id=None):
+    """
+    Cập nhật phiên tài liệu và chỉ sửa các câu trong vùng vừa bị chỉnh.
+
+    Returns:
+        dict: {version, first, removed, delta, total, sentences} - client thay
+            các câu [first, first + removed) bằng `sentences` (dạng compact) và
+            dịch offset các câu phía sau đi `delta`.
+
+    Khi quá tải, số beam giảm theo overload_controller; ở mức chỉ cache/bộ
+    luật, câu mới được sửa không qua model và đánh dấu 'degraded'. Lần cập nhật
+    đầu tiên được dùng model sau đó tách lại toàn văn để sửa lại các câu này.
+
+    Args:
+        mode (DegradationMode): Mức chất lượng khi quá tải; mặc định đánh giá lại
+        user_id (int): Ghi toàn văn đã sửa vào lịch sử của người dùng này, tối
+            đa một lần mỗi HISTORY_INCREMENTAL_SECONDS cho mỗi tài liệu
+
+    Raises:
+        SessionConflictError: base_version không khớp (client cần gửi lại toàn văn)
+    """
+    model = model_loader.get()
+    if mode is None:
+        mode = overload_controller.mode()
+    if context is not None:
+        context.raise_if_cancelled()
+        if context.expired:
+            raise DeadlineExceededError(
+                "Request deadline exceeded while queued",
+                retry_after=inference_executor.retry_after()
+            )
+
+    key = (client_key, document_id)
+    session = document_sessions.get_or_create(key, document_id)
+    with session.lock:
+        if text is not None:
+            # Đồng bộ lại toàn văn: chỉ thay phiên khi commit, câu không đổi
+            # dùng lại kết quả cũ
+            new_text = text
+        else:
+            if base_version != session.version:
+                raise SessionConflictError("Document version mismatch", version=session.version)
+            try:
+                new_text = apply_ops(session.text, [op for op in ops if isinstance(op, dict)])
+            except ValueError as e:
+                raise SessionConflictError(str(e), version=session.version)
+
+        if len(new_text) > config.MAX_INPUT_CHARS:
+            raise InputTooLargeError(f"Text exceeds {config.MAX_INPUT_CHARS} characters")
+
+        # Còn câu sửa không qua model khi quá tải: thay cả văn bản để sửa lại
+        full = text is not None or (
+            mode.use_model and any(entry.get('degraded') for entry in session.sentences)
+        )
+        first, removed, spans, delta = session.plan_update(new_text, sentence_spans, full=full)
+
+        # Câu trong vùng tách lại mà nội dung không đổi: dùng lại kết quả cũ
+        previous = {
+            entry['h']: entry for entry in session.sentences[first:first + removed]
+            if not (mode.use_model and entry.get('degraded'))
+        }
+        entries = []
+        pending = []
+        for start, end in spans:
+            sentence = Sentence(new_text[start:end], start, end)
+            digest = sentence_hash(sentence.text)
+            entry = {'s': start, 'e': end, 'h': digest}
+            old = previous.get(digest)
+            if old is not None:
+                entry['corrected'] = old['corrected']
+                entry['edits'] = old['edits']
+                if old.get('degraded'):
+                    entry['degraded'] = True
+            else:
+                pending.append((entry, sentence))
+            entries.append(entry)
+
+        # Câu bị sửa nhẹ: ghép theo thứ tự với câu cũ đã bị thay, kết quả cũ làm
+        # bản nháp cho giải mã speculative. Khi đồng bộ lại toàn văn, thứ tự câu
+        # cũ không tương ứng với câu mới nên không ghép
+        reused = {entry['h'] for entry in entries if 'corrected' in entry}
+        replaced = [] if full else [
+            entry for entry in session.sentences[first:first + removed] if entry['h'] not in reused
+        ]
+        for (_, sentence), old in zip(pending, replaced):
+            sentence.previous = old['corrected']
+
+        # Bản nháp chỉ dùng được khi giải mã greedy: với INCREMENTAL_SPECULATIVE
+        # câu bị sửa nhẹ sinh greedy speculative (kết quả có thể khác beam
+        # search), các câu mới sinh theo số beam của mức hiện tại
+        edited = []
+        if config.INCREMENTAL_SPECULATIVE and mode.use_model:
+            edited = [pair for pair in pending if pair[1].previous is not None]
+        fresh = [pair for pair in pending if pair[1].previous is None] if edited else pending
+        for group, options in (
+            (fresh, {'num_beams': mode_num_beams(model, mode)}),
+            (edited, {'num_beams': 1, 'speculative': True}),
+        ):
+            if not group:
+                continue
+            if not mode.use_model:
+                corrected = cached_or_rule_sentences(model, [sentence for _, sentence in group])
+                for entry, _ in group:
+                    entry['degraded'] = True
+            else:
+                corrected = model.correct_sentences(
+                    [sentence for _, sentence in group], context=context, **options
+                )
+            # Hết hạn giữa chừng: không ghi nhận, client gửi lại các ops này sau
+            if context is not None and context.truncated:
+                raise DeadlineExceededError(
+                    "Request deadline exceeded",
+                    retry_after=inference_executor.retry_after()
+                )
+            for (entry, sentence), corrected_sentence in zip(group, corrected):
+                entry['corrected'] = corrected_sentence
+                entry['edits'] = sentence_edits(sentence.text, corrected_sentence)
+
+        session.commit(new_text, first, removed, entries, delta)
+
+        now = time.monotonic()
+        if user_id is not None and (
+            session.recorded_at is None or now - session.recorded_at >= config.HISTORY_INCREMENTAL_SECONDS
+        ):
+            session.recorded_at = now
+            history_store.record(
+                user_id, new_text,
+                [(entry['s'], entry['e']) for entry in session.sentences],
+                [entry['corrected'] for entry in session.sentences]
+            )
+
+        result = {
+            'document_id': document_id,
+            'version': session.version,
+            'mode': mode.name,
+            'first': first,
+            'removed': removed,
+            'delta': delta,
+            'total': len(session.sentences),
+            'sentences': [
+                {'s': entry['s'], 'e': entry['e'], 'h': entry['h'], 'edits': entry['edits']}
+                for entry in entries
+            ],
+        }
+
+    document_sessions.account(key, session)
+    if context is not None:
+        overload_controller.observe(time.monotonic() - context.started)
+    return result
+
 @app.route('/correct', methods=['POST'])
 def correct():
     try:
         data = request.get_json()
-        text = data.get('text', '').strip()
-        
-        if not text:
-            return jsonify({
-                'errors': [],
-                'sentence_analysis': None,
-                'sentence_structure': None
-            })
+        text, stream_id, compact, known = parse_correction_request(data)
+        client_key = resolve_client_key(session, request.headers.get('X-Real-IP', request.remote_addr))
 
-        # 1. Sửa lỗi ngữ pháp (Quan trọng nhất)
-        corrected = model.correct_text(text)
-        
-        # 2. Tạo danh sách lỗi (Sử dụng hàm generate_diff mới)
-        # Thay vì gọi model.identify_errors (có thể gây lỗi nếu class chưa update)
-        errors = generate_diff(text, corrected)
-        
-        # 3. Phân tích cấu trúc câu (Optional - Try/Except để tránh crash)
-        sentence_analysis = []
-        sentence_structure = None
-        
+        # Client đã có đúng kết quả này: trả 304, không chạy model
+        etag = correction_etag(text, compact)
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            return Response(status=304, headers={'ETag': etag, 'Cache-Control': 'private, no-cache'})
+
+        context = admit_correction(text, client_key, stream_id)
         try:
-            # Kiểm tra xem pos_analyzer có tồn tại trong model không
-            if hasattr(model, 'pos_analyzer') and model.pos_analyzer:
-                sentence_analysis = model.pos_analyzer.analyze_sentence(text)
-                
-                # Tìm thành phần structure
-                for item in sentence_analysis:
-                    if isinstance(item, dict) and item.get('type') == 'sentence_structure':
-                        sentence_structure = item
-                        sentence_analysis.remove(item)
-                        break
-        except Exception as pos_error:
-            logging.warning(f"Skipping POS analysis due to error: {pos_error}")
-            # Vẫn tiếp tục chạy để trả về kết quả sửa lỗi
+            # Đưa vào hàng đợi model; luồng Flask chỉ chờ kết quả
+            future = submit_correction(text, context, compact, known, session.get('user_id'))
+            body, headers = render_correction(future.result(), etag, request.headers.get('Accept-Encoding'))
+            return Response(body, status=200, headers=headers)
+        finally:
+            release_correction(context, client_key, stream_id)
 
-        return jsonify({
-            'corrected_text': corrected, # Trả về thêm text đã sửa
-            'errors': errors,
-            'sentence_analysis': sentence_analysis,
-            'sentence_structure': sentence_structure
-        })
+    except RejectedError as rejected:
+        return jsonify(rejected.to_dict()), rejected.status_code, rejected.headers()
+
+    except RequestCancelled:
+        return jsonify({'error': 'Request superseded'}), 409
 
     except Exception as e:
         logging.error(f"Error correcting text: {str(e)}")
@@ -224,6 +886,76 @@ def correct():
             'message': str(e)
         }), 500
 
+@app.route('/history', methods=['GET'])
+def correction_history():
+    """
+    Lịch sử kiểm tra của người dùng, mới nhất trước.
+
+    Query: before (id của mục cuối trang trước), limit, q (tìm kiếm toàn văn)
+    """
+    user_id = session.get('user_id')
+    if user_id is None:
+        return jsonify({'error': 'Login required'}), 401
+    try:
+        before = request.args.get('before', type=int)
+        limit = min(max(request.args.get('limit', 20, type=int), 1), config.HISTORY_MAX_PAGE_SIZE)
+        items = history_store.entries(user_id, before=before, limit=limit, query=request.args.get('q'))
+    except sqlite3.Error as e:
+        logging.error(f"Error reading history: {e}")
+        return jsonify({'error': 'History is unavailable'}), 503
+    return jsonify({
+        'items': items,
+        # Trang tiếp theo: gửi lại before=next_before
+        'next_before': items[-1]['id'] if len(items) == limit else None
+    })
+
+@app.route('/correct/quick', methods=['POST'])
+def correct_quick():
+    try:
+        text, _, _, _ = parse_correction_request(request.get_json() or {})
+        body, headers = encode_json(quick_correction(text), request.headers.get('Accept-Encoding'))
+        return Response(body, status=200, headers=headers)
+    except RejectedError as rejected:
+        return jsonify(rejected.to_dict()), rejected.status_code, rejected.headers()
+
+@app.route('/correct/incremental', methods=['POST'])
+def correct_incremental():
+    try:
+        data = request.get_json()
+        try:
+            document_id, base_version, ops, text, stream_id = parse_incremental_request(data)
+        except ValueError as e:
+            return jsonify({'error': 'Invalid request', 'message': str(e)}), 400
+        client_key = resolve_client_key(session, request.headers.get('X-Real-IP', request.remote_addr))
+
+        context = admit_correction('', client_key, stream_id, tokens=incremental_token_estimate(text, ops))
+        try:
+            future = submit_incremental(
+                client_key, document_id, base_version, ops, text, context, session.get('user_id')
+            )
+            body, headers = encode_json(future.result(), request.headers.get('Accept-Encoding'))
+            return Response(body, status=200, headers=headers)
+        finally:
+            release_correction(context, client_key, stream_id)
+
+    except RejectedError as rejected:
+        return jsonify(rejected.to_dict()), rejected.status_code, rejected.headers()
+
+    except RequestCancelled:
+        return jsonify({'error': 'Request superseded'}), 409
+
+    except Exception as e:
+        logging.error(f"Error correcting document: {str(e)}")
+        return jsonify({
+            'error': 'Internal server error',
+            'message': str(e)
+        }), 500
+
+# Bắt đầu tải model sau khi mọi hàm của module đã được định nghĩa
+model_loader.start()
+analytics_recorder.start()
+history_store.start()
+
 if __name__ == '__main__':
     # Chạy host 0.0.0.0 để Docker map port được
     app.run(host='0.0.0.0', port=5000, debug=False)
\ No newline at end of file
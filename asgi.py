@@ -0,0 +1,258 @@
+"""
+ASGI entrypoint: async /correct on top of the existing Flask app.
+
+Chạy bằng:  uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+/correct được xử lý trực tiếp trên event loop: request chỉ giữ một coroutine
+trong lúc chờ inference executor, nên hàng nghìn kết nối chậm/đang chờ không
+chiếm luồng nào. Các route còn lại (trang HTML, đăng nhập...) được chuyển
+nguyên vẹn cho Flask qua a2wsgi, chạy song song trên WSGI_THREADS luồng
+(WsgiToAsgi của asgiref chạy mọi request WSGI lần lượt trên một luồng duy nhất).
+"""
+
+import asyncio
+import json
+import logging
+
+from a2wsgi import WSGIMiddleware
+
+import config
+from app import (
+    app as flask_app, inference_executor, fallback_executor, model_loader, analytics_recorder, history_store,
+    admit_correction, release_correction, resolve_client_key, load_session_cookie,
+    parse_correction_request, correction_etag, render_correction,
+    parse_incremental_request, incremental_token_estimate, submit_incremental, quick_correction,
+    submit_correction, save_cache_snapshot
+)
+from models.admission import RequestCancelled
+from models.executor import RejectedError
+from models.response import etag_matches, encode_json
+
+logger = logging.getLogger(__name__)
+
+flask_asgi = WSGIMiddleware(flask_app, workers=config.WSGI_THREADS)
+# Đăng nhập/đăng ký chờ băm mật khẩu (models/auth.py) tới hết timeout: chạy trên
+# pool riêng để một đợt đăng nhập không chiếm luồng của các route Flask khác.
+# Đủ luồng cho mọi phép băm đang chạy/chờ, nên giới hạn hàng đợi của
+# PasswordHasher (429) mới thực sự có tác dụng
+auth_asgi = WSGIMiddleware(flask_app, workers=config.AUTH_HASH_WORKERS + config.AUTH_HASH_QUEUE_SIZE)
+AUTH_PATHS = ('/login', '/register')
+
+
+async def read_body(receive):
+    """Đọc toàn bộ body của request HTTP."""
+    chunks = []
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise asyncio.CancelledError()
+        chunks.append(message.get('body', b''))
+        more_body = message.get('more_body', False)
+    return b''.join(chunks)
+
+
+def request_headers(scope):
+    return {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+
+
+def request_cookies(headers):
+    cookies = {}
+    for part in headers.get('cookie', '').split(';'):
+        name, sep, value = part.strip().partition('=')
+        if sep:
+            cookies[name] = value
+    return cookies
+
+
+def session_for(headers):
+    """Dữ liệu session Flask (đã ký) từ cookie của request."""
+    cookie_name = flask_app.config.get('SESSION_COOKIE_NAME', 'session')
+    return load_session_cookie(request_cookies(headers).get(cookie_name))
+
+
+def client_key_for(scope, headers, session_data=None):
+    """Khoá người dùng/phiên giống như Flask view tính từ cookie session."""
+    if session_data is None:
+        session_data = session_for(headers)
+    remote_addr = headers.get('x-real-ip') or (scope.get('client') or ('unknown',))[0]
+    return resolve_client_key(session_data, remote_addr)
+
+
+async def watch_disconnect(receive, context):
+    """Huỷ request khi client ngắt kết nối trong lúc đang chờ model."""
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            context.cancel()
+            return
+
+
+async def send_response(send, status, body=b'', headers=None):
+    raw_headers = [(b'content-length', str(len(body)).encode('latin-1'))]
+    for name, value in (headers or {}).items():
+        raw_headers.append((name.lower().encode('latin-1'), str(value).encode('latin-1')))
+    await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def send_json(send, status, payload, headers=None):
+    body = json.dumps(payload).encode('utf-8')
+    await send_response(send, status, body, {'Content-Type': 'application/json', **(headers or {})})
+
+
+async def correct(scope, receive, send):
+    """Phiên bản async của /correct: không giữ luồng nào trong lúc chờ model."""
+    try:
+        data = json.loads(await read_body(receive) or b'{}')
+        if not isinstance(data, dict):
+            raise ValueError("Body must be a JSON object")
+    except ValueError as e:
+        await send_json(send, 400, {'error': 'Invalid JSON body', 'message': str(e)})
+        return
+
+    try:
+        headers = request_headers(scope)
+        text, stream_id, compact, known = parse_correction_request(data)
+        session_data = session_for(headers)
+        client_key = client_key_for(scope, headers, session_data)
+
+        # Client đã có đúng kết quả này: trả 304, không chạy model
+        etag = correction_etag(text, compact)
+        if etag_matches(headers.get('if-none-match'), etag):
+            await send_response(send, 304, headers={'ETag': etag, 'Cache-Control': 'private, no-cache'})
+            return
+
+        context = admit_correction(text, client_key, stream_id)
+        # submit có thể ném QueueFullError: watcher và đăng ký stream vẫn phải được dọn
+        watcher = None
+        try:
+            watcher = asyncio.ensure_future(watch_disconnect(receive, context))
+            future = submit_correction(text, context, compact, known, session_data.get('user_id'))
+            result = await asyncio.wrap_future(future)
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+            release_correction(context, client_key, stream_id)
+        body, response_headers = render_correction(result, etag, headers.get('accept-encoding'))
+        await send_response(send, 200, body, response_headers)
+
+    except RejectedError as rejected:
+        await send_json(send, rejected.status_code, rejected.to_dict(), rejected.headers())
+
+    except RequestCancelled:
+        await send_json(send, 409, {'error': 'Request superseded'})
+
+    except Exception as e:
+        logger.exception("Error correcting text")
+        await send_json(send, 500, {'error': 'Internal server error', 'message': str(e)})
+
+
+async def correct_quick(scope, receive, send):
+    """Sửa bằng bộ luật ngay trên event loop (không cần model hay executor)."""
+    try:
+        data = json.loads(await read_body(receive) or b'{}')
+        if not isinstance(data, dict):
+            raise ValueError("Body must be a JSON object")
+    except ValueError as e:
+        await send_json(send, 400, {'error': 'Invalid JSON body', 'message': str(e)})
+        return
+
+    try:
+        text, _, _, _ = parse_correction_request(data)
+        body, headers = encode_json(quick_correction(text), request_headers(scope).get('accept-encoding'))
+        await send_response(send, 200, body, headers)
+    except RejectedError as rejected:
+        await send_json(send, rejected.status_code, rejected.to_dict(), rejected.headers())
+
+
+async def correct_incremental(scope, receive, send):
+    """Giao thức incremental của editor: chỉ sửa vùng văn bản vừa thay đổi."""
+    try:
+        data = json.loads(await read_body(receive) or b'{}')
+        if not isinstance(data, dict):
+            raise ValueError("Body must be a JSON object")
+        document_id, base_version, ops, text, stream_id = parse_incremental_request(data)
+    except ValueError as e:
+        await send_json(send, 400, {'error': 'Invalid request', 'message': str(e)})
+        return
+
+    try:
+        headers = request_headers(scope)
+        session_data = session_for(headers)
+        client_key = client_key_for(scope, headers, session_data)
+
+        context = admit_correction('', client_key, stream_id, tokens=incremental_token_estimate(text, ops))
+        watcher = None
+        try:
+            watcher = asyncio.ensure_future(watch_disconnect(receive, context))
+            future = submit_incremental(
+                client_key, document_id, base_version, ops, text, context, session_data.get('user_id')
+            )
+            result = await asyncio.wrap_future(future)
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+            release_correction(context, client_key, stream_id)
+        body, response_headers = encode_json(result, headers.get('accept-encoding'))
+        await send_response(send, 200, body, response_headers)
+
+    except RejectedError as rejected:
+        await send_json(send, rejected.status_code, rejected.to_dict(), rejected.headers())
+
+    except RequestCancelled:
+        await send_json(send, 409, {'error': 'Request superseded'})
+
+    except Exception as e:
+        logger.exception("Error correcting document")
+        await send_json(send, 500, {'error': 'Internal server error', 'message': str(e)})
+
+
+async def livez(scope, receive, send):
+    await send_json(send, 200, {'status': 'alive'})
+
+
+async def readyz(scope, receive, send):
+    await send_json(send, 200 if model_loader.ready else 503, model_loader.status())
+
+
+# Các route được phục vụ trực tiếp bằng asyncio (path, method) -> handler
+ASYNC_ROUTES = {
+    ('/correct', 'POST'): correct,
+    ('/correct/quick', 'POST'): correct_quick,
+    ('/correct/incremental', 'POST'): correct_incremental,
+    ('/livez', 'GET'): livez,
+    ('/readyz', 'GET'): readyz,
+}
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            inference_executor.shutdown(wait=False)
+            fallback_executor.shutdown(wait=False)
+            analytics_recorder.close()
+            history_store.close()
+            save_cache_snapshot()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+
+    if scope['type'] == 'http':
+        handler = ASYNC_ROUTES.get((scope['path'], scope['method']))
+        if handler is not None:
+            await handler(scope, receive, send)
+            return
+        if scope['method'] == 'POST' and scope['path'] in AUTH_PATHS:
+            await auth_asgi(scope, receive, send)
+            return
+
+    await flask_asgi(scope, receive, send)
@@ -0,0 +1,125 @@
+"""
+Benchmark thời gian khởi động: thời gian import từng module và thời gian tới khi ready.
+
+Mỗi lần đo chạy trong một tiến trình Python mới (python -X importtime) để
+không bị ảnh hưởng bởi cache import của tiến trình hiện tại.
+
+    python benchmarks/bench_startup.py                 # config, models.corrector, app
+    python benchmarks/bench_startup.py --runs 10 --ready
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Thiết lập logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULES = ["config", "models.corrector", "app"]
+
+READY_SNIPPET = """
+import time
+start = time.monotonic()
+import app
+app.model_loader.wait()
+print(round(time.monotonic() - start, 3), app.model_loader.stage)
+"""
+
+
+def parse_importtime(stderr):
+    """
+    Phân tích output của -X importtime.
+
+    Returns:
+        dict: tên module -> thời gian cumulative (giây)
+    """
+    timings = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        try:
+            _self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            timings[name.strip()] = int(cumulative_us) / 1e6
+        except ValueError:
+            continue
+    return timings
+
+
+def measure_import(module, runs):
+    """Đo thời gian import một module trong `runs` tiến trình mới."""
+    wall_times = []
+    cumulative_times = []
+    heaviest = {}
+    for _ in range(runs):
+        start = time.monotonic()
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=BASE_DIR, capture_output=True, text=True
+        )
+        wall_times.append(time.monotonic() - start)
+        if proc.returncode != 0:
+            logger.error(f"Import {module} thất bại: {proc.stderr.strip().splitlines()[-1:]}")
+            return None
+        timings = parse_importtime(proc.stderr)
+        cumulative_times.append(timings.get(module, 0.0))
+        for name, seconds in timings.items():
+            heaviest[name] = max(heaviest.get(name, 0.0), seconds)
+
+    top = sorted(heaviest.items(), key=lambda item: item[1], reverse=True)[:10]
+    return {
+        "module": module,
+        "runs": runs,
+        "import_median_s": round(statistics.median(cumulative_times), 4),
+        "process_wall_median_s": round(statistics.median(wall_times), 4),
+        "heaviest_imports": [{"module": name, "cumulative_s": round(seconds, 4)} for name, seconds in top],
+    }
+
+
+def measure_ready():
+    """Đo thời gian từ lúc import app tới khi model tải + warm-up xong."""
+    proc = subprocess.run([sys.executable, "-c", READY_SNIPPET], cwd=BASE_DIR, capture_output=True, text=True)
+    if proc.returncode != 0:
+        logger.error(f"Đo thời gian ready thất bại: {proc.stderr.strip().splitlines()[-1:]}")
+        return None
+    seconds, stage = proc.stdout.strip().splitlines()[-1].split()
+    return {"time_to_ready_s": float(seconds), "stage": stage}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES, help="Các module cần đo")
+    parser.add_argument("--runs", type=int, default=5, help="Số lần đo mỗi module")
+    parser.add_argument("--ready", action="store_true", help="Đo thêm thời gian tới khi /readyz sẵn sàng")
+    parser.add_argument("--output", help="Ghi kết quả JSON ra file")
+    args = parser.parse_args()
+
+    results = {"imports": []}
+    for module in args.modules:
+        logger.info(f"Đang đo import {module} ({args.runs} lần)...")
+        result = measure_import(module, args.runs)
+        if result:
+            results["imports"].append(result)
+            logger.info(f"{module}: {result['import_median_s']:.3f}s (median)")
+
+    if args.ready:
+        logger.info("Đang đo thời gian tới khi model sẵn sàng...")
+        results["ready"] = measure_ready()
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+        logger.info(f"Đã ghi kết quả tại: {args.output}")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,494 @@
+"""
+Load test: phát lại traffic của editor (static/js/editor.js) với tốc độ đến mở (open-loop).
+
+Ba loại traffic chạy song song, mỗi loại là một quá trình Poisson:
+  - session: một người gõ tài liệu; mỗi lần ngừng gõ 300ms (debounce của
+    editor) tài liệu đã dài thêm được gửi lại qua /correct/incremental
+    (giống checkGrammarIncremental) hoặc /correct (--protocol full)
+  - burst: cả lớp nộp cùng một câu bài tập gần như cùng lúc
+  - paste: dán một văn bản rất dài vào editor
+
+Open-loop: mỗi request được gửi đúng thời điểm đã lên lịch dù request trước
+đã xong hay chưa, và độ trễ được tính từ thời điểm lên lịch, nên server
+chậm không làm giảm tải như với các client chờ lần lượt.
+
+Chạy thẳng vào API (không qua nginx: /metrics bị chặn ở nginx, và mỗi người
+dùng giả lập cần header X-Real-IP riêng), với model thật hoặc model nhỏ:
+
+    CORRECTION_MODEL=google/flan-t5-small python app.py
+    python benchmarks/loadtest.py --url http://localhost:5000 --duration 60 --session-rate 2
+    python benchmarks/loadtest.py --burst-rate 0.2 --burst-size 40 --paste-rate 0.05 --output loadtest.json
+"""
+
+import argparse
+import gzip
+import heapq
+import http.client
+import itertools
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+import urllib.parse
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# Thiết lập logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Editor gửi lại 300ms sau khi ngừng gõ (createAutoCheckGrammar)
+DEBOUNCE_SECONDS = 0.3
+
+# Câu tổng hợp cho tài liệu và bài tập: đủ đa dạng để tỉ lệ cache hit
+# không mặc nhiên là 100%, vẫn có các lỗi ngữ pháp thường gặp
+SUBJECTS = ["I", "She", "He", "We", "They", "My brother", "The students", "Our teacher", "Everyone", "The children"]
+VERBS = ["go", "goes", "went", "have went", "is go", "don't like", "doesn't likes", "play", "plays", "was playing"]
+OBJECTS = ["to school", "football", "in the park", "cats", "their homework", "an apple", "a university",
+           "the new book", "with his friends", "english"]
+TAILS = ["yesterday", "every day", "tomorrow", "last week", "on Sunday", "since two years", ""]
+
+# Các metric (models/metrics.py) dùng để đánh giá cache và gộp request
+SERVER_COUNTERS = {
+    'cache': 'grammar_correction_cache_total',
+    'coalesced': 'grammar_coalesced_sentences_total',
+    'generated': 'grammar_generated_sentences_total',
+}
+SERVER_GAUGES = {
+    'overload_level': 'grammar_overload_level',
+    'batch_token_budget': 'grammar_batch_token_budget',
+}
+
+
+def sentence_pool(rng, size=2000):
+    """Các câu mẫu: câu trong data/examples.json và câu tổng hợp ngẫu nhiên (không trùng)."""
+    sentences = []
+    try:
+        with open(os.path.join(BASE_DIR, "data", "examples.json"), 'r', encoding='utf-8') as f:
+            sentences.extend(example['original'] for example in json.load(f))
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Không đọc được data/examples.json: {e}")
+
+    combinations = list(itertools.product(SUBJECTS, VERBS, OBJECTS, TAILS))
+    rng.shuffle(combinations)
+    for parts in combinations[:size]:
+        sentences.append(" ".join(part for part in parts if part) + ".")
+    return sentences
+
+
+def diff_op(old_text, new_text):
+    """Một thao tác sửa {start, end, text} biến old_text thành new_text (như diffOp trong grammar.js)."""
+    limit = min(len(old_text), len(new_text))
+    prefix = 0
+    while prefix < limit and old_text[prefix] == new_text[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old_text[-1 - suffix] == new_text[-1 - suffix]:
+        suffix += 1
+    return {'start': prefix, 'end': len(old_text) - suffix, 'text': new_text[prefix:len(new_text) - suffix]}
+
+
+def percentile(values, fraction):
+    """Phân vị theo nearest-rank của danh sách đã sắp xếp."""
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, math.ceil(fraction * len(values)) - 1))
+    return values[index]
+
+
+def parse_metrics(text):
+    """
+    Phân tích output dạng text của Prometheus.
+
+    Returns:
+        dict: tên metric -> {chuỗi label: giá trị}
+    """
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        try:
+            name_labels, value = line.rsplit(" ", 1)
+            value = float(value)
+        except ValueError:
+            continue
+        name, _, labels = name_labels.partition("{")
+        samples.setdefault(name, {})[labels.rstrip("}")] = value
+    return samples
+
+
+class HttpClient:
+    """Client HTTP/1.1 keep-alive, mỗi luồng một kết nối riêng."""
+
+    def __init__(self, url, timeout=60.0):
+        parsed = urllib.parse.urlsplit(url)
+        self.https = parsed.scheme == "https"
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.prefix = parsed.path.rstrip("/")
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection_class = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            connection = self._local.connection = connection_class(self.host, self.port, timeout=self.timeout)
+        return connection
+
+    def _reset(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+        self._local.connection = None
+
+    def request(self, method, path, body=None, headers=None):
+        """
+        Returns:
+            tuple: (status, headers, body đã giải nén)
+
+        Raises:
+            OSError, http.client.HTTPException: Khi không kết nối được
+        """
+        payload = json.dumps(body).encode('utf-8') if body is not None else None
+        request_headers = {'Content-Type': 'application/json', 'Accept-Encoding': 'gzip'}
+        request_headers.update(headers or {})
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.request(method, self.prefix + path, body=payload, headers=request_headers)
+                response = connection.getresponse()
+                data = response.read()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                # Kết nối keep-alive đã bị server đóng: mở lại và gửi lại một lần
+                self._reset()
+                if attempt:
+                    raise
+                continue
+            except (OSError, http.client.HTTPException):
+                self._reset()
+                raise
+            if response.getheader('Content-Encoding') == 'gzip':
+                data = gzip.decompress(data)
+            return response.status, response.headers, data
+
+
+class EditorSession:
+    """Một người dùng đang gõ tài liệu, giữ phiên bản đã được server xác nhận như grammar.js."""
+
+    def __init__(self, session_id, document, client_ip):
+        self.session_id = session_id
+        self.client_ip = client_ip
+        self.words = document.split(" ")
+        self.typed = 0
+        self.acked_text = None
+        self.acked_version = None
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self):
+        return self.typed >= len(self.words)
+
+    @property
+    def headers(self):
+        return {'X-Document-Key': self.session_id, 'X-Real-IP': self.client_ip}
+
+    def type_words(self, count):
+        """Gõ thêm `count` từ, trả về toàn văn hiện tại."""
+        self.typed = min(len(self.words), self.typed + count)
+        return " ".join(self.words[:self.typed])
+
+    def incremental_body(self, text, full_sync=False):
+        body = {'document_id': self.session_id, 'stream_id': self.session_id}
+        with self._lock:
+            if full_sync or self.acked_text is None:
+                body['text'] = text
+            else:
+                body['base_version'] = self.acked_version
+                body['ops'] = [diff_op(self.acked_text, text)]
+        return body
+
+    def acknowledge(self, text, version):
+        with self._lock:
+            self.acked_text = text
+            self.acked_version = version
+
+
+class LoadTest:
+    """
+    Bộ sinh tải open-loop: luồng chính giữ lịch (heap theo thời điểm) và gửi
+    request đến hạn vào thread pool, không bao giờ chờ response.
+    """
+
+    def __init__(self, client, args):
+        self.client = client
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.sentences = sentence_pool(self.rng)
+        self.results = []
+        self._results_lock = threading.Lock()
+        self._schedule = []
+        self._sequence = itertools.count()
+        self._ids = itertools.count(1)
+        self._pool = ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix='loadtest')
+
+    def run(self):
+        """Chạy trong args.duration giây rồi chờ các request còn dở."""
+        args = self.args
+        for kind, rate in (('session', args.session_rate), ('burst', args.burst_rate), ('paste', args.paste_rate)):
+            if rate > 0:
+                self._at(self.rng.expovariate(rate), self._arrival, kind, rate)
+
+        self.started = time.monotonic()
+        while self._schedule:
+            when, _, action, action_args = self._schedule[0]
+            delay = self.started + when - time.monotonic()
+            if delay > 0:
+                time.sleep(min(delay, 0.05))
+                continue
+            heapq.heappop(self._schedule)
+            action(when, *action_args)
+        self._pool.shutdown(wait=True)
+        self.elapsed = time.monotonic() - self.started
+
+    def _at(self, when, action, *action_args):
+        # Không lên lịch gì sau khi hết thời gian chạy (phiên đang gõ dở bị cắt)
+        if when < self.args.duration:
+            heapq.heappush(self._schedule, (when, next(self._sequence), action, action_args))
+
+    def _client_ip(self):
+        number = next(self._ids)
+        return f"10.{(number >> 16) & 255}.{(number >> 8) & 255}.{number & 255}"
+
+    def _arrival(self, when, kind, rate):
+        self._at(when + self.rng.expovariate(rate), self._arrival, kind, rate)
+        if kind == 'session':
+            document = " ".join(self.rng.choices(self.sentences, k=self.rng.randint(3, 12)))
+            session = EditorSession(f"loadtest-{next(self._ids)}", document, self._client_ip())
+            self._session_step(when, session)
+        elif kind == 'burst':
+            # Cùng một câu bài tập, mỗi học sinh một IP và một tài liệu riêng
+            sentence = self.rng.choice(self.sentences)
+            for _ in range(self.args.burst_size):
+                offset = self.rng.uniform(0, self.args.burst_spread)
+                self._at(when + offset, self._submit_correct, 'burst', sentence, {
+                    'X-Document-Key': f"loadtest-{next(self._ids)}", 'X-Real-IP': self._client_ip()
+                })
+        else:
+            parts = []
+            length = 0
+            while length < self.args.paste_chars:
+                sentence = self.rng.choice(self.sentences)
+                parts.append(sentence)
+                length += len(sentence) + 1
+            text = " ".join(parts)[:self.args.paste_chars]
+            self._submit_correct(when, 'paste', text, {
+                'X-Document-Key': f"loadtest-{next(self._ids)}", 'X-Real-IP': self._client_ip()
+            })
+
+    def _session_step(self, when, session):
+        words = self.rng.randint(1, 8)
+        text = session.type_words(words)
+        if self.args.protocol == 'incremental':
+            self._pool.submit(self._send_incremental, when, session, text)
+        else:
+            body = {'text': text, 'stream_id': session.session_id, 'compact': True}
+            self._pool.submit(self._send, 'session', when, '/correct', body, session.headers)
+        if not session.finished:
+            # Lần gửi kế tiếp: nghĩ, gõ thêm vài từ, rồi debounce
+            pause = self.rng.expovariate(1.0 / self.args.think_time)
+            typing = self.rng.randint(1, 8) * self.args.seconds_per_word
+            self._at(when + pause + typing + DEBOUNCE_SECONDS, self._session_step, session)
+
+    def _submit_correct(self, when, kind, text, headers):
+        body = {'text': text, 'stream_id': headers['X-Document-Key'], 'compact': True}
+        self._pool.submit(self._send, kind, when, '/correct', body, headers)
+
+    def _send_incremental(self, when, session, text):
+        status, data = self._send('session', when, '/correct/incremental', session.incremental_body(text),
+                                  session.headers)
+        if status == 409 and data.get('error') == 'resync':
+            # Server mất phiên hoặc lệch phiên bản: gửi lại toàn văn một lần
+            status, data = self._send('session', when, '/correct/incremental',
+                                      session.incremental_body(text, full_sync=True), session.headers)
+        if status == 200 and 'version' in data:
+            session.acknowledge(text, data['version'])
+
+    def _send(self, kind, when, path, body, headers):
+        scheduled = self.started + when
+        sent = time.monotonic()
+        try:
+            status, response_headers, raw = self.client.request('POST', path, body, headers)
+            mode = response_headers.get('X-Correction-Mode')
+            try:
+                data = json.loads(raw) if raw else {}
+            except ValueError:
+                data = {}
+        except (OSError, http.client.HTTPException) as e:
+            logger.debug(f"{path} lỗi kết nối: {e}")
+            status, mode, data = 0, None, {}
+        finished = time.monotonic()
+        with self._results_lock:
+            self.results.append({
+                'kind': kind,
+                'status': status,
+                'outcome': outcome_of(status, data),
+                'latency': finished - scheduled,
+                'lag': sent - scheduled,
+                'mode': mode,
+            })
+        return status, data if isinstance(data, dict) else {}
+
+
+def outcome_of(status, data):
+    """Phân loại kết quả một request."""
+    if 200 <= status < 300 or status == 304:
+        return 'ok'
+    if status == 409:
+        # Bị lần gửi sau của cùng editor thay thế: hành vi đúng, không phải lỗi
+        return 'resync' if isinstance(data, dict) and data.get('error') == 'resync' else 'superseded'
+    if status in (429, 503):
+        return 'rejected'
+    if status == 0:
+        return 'network_error'
+    return 'client_error' if status < 500 else 'server_error'
+
+
+def summarize(results, elapsed):
+    """Thống kê một nhóm request: số lượng theo kết quả, tỉ lệ lỗi, phân vị độ trễ (ms)."""
+    outcomes = Counter(result['outcome'] for result in results)
+    statuses = Counter(str(result['status']) for result in results)
+    latencies = sorted(result['latency'] * 1000 for result in results if result['outcome'] == 'ok')
+    total = len(results)
+    failed = outcomes['rejected'] + outcomes['network_error'] + outcomes['server_error'] + outcomes['client_error']
+    return {
+        "requests": total,
+        "outcomes": dict(outcomes),
+        "statuses": dict(statuses),
+        "throughput_rps": round(outcomes['ok'] / elapsed, 3) if elapsed else 0.0,
+        "error_rate": round(failed / total, 4) if total else 0.0,
+        "rejected_rate": round(outcomes['rejected'] / total, 4) if total else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50), 1) if latencies else None,
+            "p90": round(percentile(latencies, 0.90), 1) if latencies else None,
+            "p99": round(percentile(latencies, 0.99), 1) if latencies else None,
+            "max": round(latencies[-1], 1) if latencies else None,
+            "mean": round(sum(latencies) / len(latencies), 1) if latencies else None,
+        },
+    }
+
+
+def fetch_metrics(client, path):
+    """Đọc /metrics của API; None nếu không đọc được (METRICS_ENABLED=0 hoặc qua nginx)."""
+    try:
+        status, _, raw = client.request('GET', path)
+    except (OSError, http.client.HTTPException) as e:
+        logger.warning(f"Không đọc được {path}: {e}")
+        return None
+    if status != 200:
+        logger.warning(f"{path} trả về {status}, bỏ qua thống kê phía server")
+        return None
+    return parse_metrics(raw.decode('utf-8', errors='replace'))
+
+
+def server_effectiveness(before, after):
+    """Hiệu quả cache và gộp request trong lúc chạy (chênh lệch counter trước/sau)."""
+    if before is None or after is None:
+        return None
+
+    def delta(name, labels=None):
+        old = before.get(name, {})
+        return sum(
+            value - old.get(key, 0.0) for key, value in after.get(name, {}).items()
+            if labels is None or key == labels
+        )
+
+    hits = delta(SERVER_COUNTERS['cache'], 'result="hit"')
+    misses = delta(SERVER_COUNTERS['cache'], 'result="miss"')
+    coalesced = delta(SERVER_COUNTERS['coalesced'])
+    generated = delta(SERVER_COUNTERS['generated'])
+    lookups = hits + misses
+    report = {
+        "cache_hits": int(hits),
+        "cache_misses": int(misses),
+        "cache_hit_rate": round(hits / lookups, 4) if lookups else None,
+        "coalesced_sentences": int(coalesced),
+        # Trong các câu không có sẵn trong cache, tỉ lệ được gộp vào một lần sinh đang chạy
+        "coalesced_rate": round(coalesced / misses, 4) if misses else None,
+        "generated_sentences": int(generated),
+    }
+    for key, name in SERVER_GAUGES.items():
+        report[key] = {labels or "value": value for labels, value in after.get(name, {}).items()}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:5000", help="Địa chỉ API (không qua nginx)")
+    parser.add_argument("--metrics-path", default="/metrics", help="Route Prometheus của API")
+    parser.add_argument("--duration", type=float, default=60.0, help="Thời gian sinh tải (giây)")
+    parser.add_argument("--protocol", choices=["incremental", "full"], default="incremental",
+                        help="Phiên editor gửi qua /correct/incremental hay /correct")
+    parser.add_argument("--session-rate", type=float, default=1.0, help="Số phiên editor mới mỗi giây")
+    parser.add_argument("--think-time", type=float, default=1.5, help="Thời gian nghỉ trung bình giữa hai đợt gõ (giây)")
+    parser.add_argument("--seconds-per-word", type=float, default=0.4, help="Tốc độ gõ (giây mỗi từ)")
+    parser.add_argument("--burst-rate", type=float, default=0.05, help="Số đợt nộp bài tập mỗi giây")
+    parser.add_argument("--burst-size", type=int, default=30, help="Số học sinh mỗi đợt")
+    parser.add_argument("--burst-spread", type=float, default=2.0, help="Các request của một đợt rải trong bao nhiêu giây")
+    parser.add_argument("--paste-rate", type=float, default=0.02, help="Số lần dán văn bản dài mỗi giây")
+    parser.add_argument("--paste-chars", type=int, default=15000, help="Độ dài văn bản dán (ký tự, <= MAX_INPUT_CHARS)")
+    parser.add_argument("--concurrency", type=int, default=256, help="Số request đang gửi tối đa của load test")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Timeout mỗi request (giây)")
+    parser.add_argument("--seed", type=int, default=1, help="Seed ngẫu nhiên (cùng seed = cùng kịch bản)")
+    parser.add_argument("--output", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    client = HttpClient(args.url, timeout=args.timeout)
+    before = fetch_metrics(client, args.metrics_path)
+
+    logger.info(
+        f"Sinh tải {args.duration:.0f}s vào {args.url}: {args.session_rate} phiên/s ({args.protocol}), "
+        f"{args.burst_rate} đợt bài tập/s x {args.burst_size}, {args.paste_rate} lần dán/s"
+    )
+    load_test = LoadTest(client, args)
+    load_test.run()
+    after = fetch_metrics(client, args.metrics_path)
+
+    results = load_test.results
+    lags = sorted(result['lag'] * 1000 for result in results)
+    max_lag = lags[-1] if lags else 0.0
+    if max_lag > 100:
+        logger.warning(
+            f"Load test gửi trễ tới {max_lag:.0f}ms so với lịch: tăng --concurrency, "
+            f"nếu không độ trễ đo được gồm cả thời gian chờ phía client"
+        )
+
+    report = {
+        "url": args.url,
+        "config": {key: value for key, value in vars(args).items() if key not in ("url", "output")},
+        "elapsed_s": round(load_test.elapsed, 2),
+        "overall": summarize(results, load_test.elapsed),
+        "by_kind": {
+            kind: summarize([result for result in results if result['kind'] == kind], load_test.elapsed)
+            for kind in ("session", "burst", "paste")
+        },
+        "modes": dict(Counter(result['mode'] for result in results if result['mode'])),
+        "client_lag_ms": {"p99": round(percentile(lags, 0.99), 1) if lags else None, "max": round(max_lag, 1)},
+        "server": server_effectiveness(before, after),
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        logger.info(f"Đã ghi kết quả vào {args.output}")
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
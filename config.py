@@ -1,10 +1,13 @@
 """Configuration settings for the grammar correction model."""
-import torch # type: ignore
+import os
 
 # Model settings
 MODEL_NAME = "grammar-t5-base"
 MODEL_PATH = "models/saved_model"
-DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+# Để trống: coedit-large (volume Docker hoặc HuggingFace). Đặt một model seq2seq
+# nhỏ (vd. google/flan-t5-small) để chạy thử tải/benchmark trên máy không có GPU
+CORRECTION_MODEL = os.environ.get("CORRECTION_MODEL", "")
+# DEVICE được tính lười (xem __getattr__ cuối file) để import config không kéo theo torch
 
 # API settings
 API_HOST = "0.0.0.0"
@@ -13,4 +16,138 @@ DEBUG_MODE = True
 
 # Correction settings
 MAX_SEQUENCE_LENGTH = 128
-BATCH_SIZE = 16
\ No newline at end of file
+BATCH_SIZE = 16
+
+# Inference queue settings (dùng chung cho /correct đồng bộ và bất đồng bộ)
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", 1))
+INFERENCE_QUEUE_SIZE = int(os.environ.get("INFERENCE_QUEUE_SIZE", 32))
+# Số luồng chạy các route Flask (trang HTML, đăng nhập, /history...) dưới uvicorn
+WSGI_THREADS = int(os.environ.get("WSGI_THREADS", 16))
+# Mức quá tải chỉ cache/bộ luật chạy trên pool riêng (xem app.submit_correction)
+FALLBACK_WORKERS = int(os.environ.get("FALLBACK_WORKERS", 2))
+FALLBACK_QUEUE_SIZE = int(os.environ.get("FALLBACK_QUEUE_SIZE", 256))
+
+# Chế độ nhiều tiến trình model (models/workers.py): 0 = sinh ngay trong tiến trình API.
+# WORKER_CORE_SETS dạng "0-7;8-15" (mặc định chia đều core theo NUMA node);
+# WORKER_THREADS = 0 nghĩa là bằng số core của nhóm
+INFERENCE_PROCESSES = int(os.environ.get("INFERENCE_PROCESSES", 0))
+WORKER_CORE_SETS = os.environ.get("WORKER_CORE_SETS", "")
+WORKER_THREADS = int(os.environ.get("WORKER_THREADS", 0))
+WORKER_SLOTS = int(os.environ.get("WORKER_SLOTS", 2))
+WORKER_MAX_BATCH = int(os.environ.get("WORKER_MAX_BATCH", 16))
+WORKER_WEIGHTS_DIR = os.environ.get("WORKER_WEIGHTS_DIR", "/tmp/grammar-shared-weights")
+
+# Chia lô theo số token (models/batching.py): ngân sách mỗi lô tăng dần khi lô xong trong
+# BATCH_TARGET_SECONDS, giảm khi lô chậm hoặc bộ nhớ trống dưới BATCH_MIN_FREE_MB
+BATCH_TOKEN_BUDGET_INITIAL = int(os.environ.get("BATCH_TOKEN_BUDGET_INITIAL", 512))
+BATCH_TOKEN_BUDGET_MIN = int(os.environ.get("BATCH_TOKEN_BUDGET_MIN", 64))
+BATCH_TOKEN_BUDGET_MAX = int(os.environ.get("BATCH_TOKEN_BUDGET_MAX", 8192))
+BATCH_TARGET_SECONDS = float(os.environ.get("BATCH_TARGET_SECONDS", 1.0))
+BATCH_MIN_FREE_MB = int(os.environ.get("BATCH_MIN_FREE_MB", 1024))
+
+# Admission control: giới hạn kích thước, thời gian và ngân sách token mỗi request
+MAX_INPUT_CHARS = int(os.environ.get("MAX_INPUT_CHARS", 20000))
+REQUEST_DEADLINE_SECONDS = float(os.environ.get("REQUEST_DEADLINE_SECONDS", 30))
+TOKEN_BUDGET_CAPACITY = int(os.environ.get("TOKEN_BUDGET_CAPACITY", 6000))
+TOKEN_BUDGET_REFILL_PER_SECOND = float(os.environ.get("TOKEN_BUDGET_REFILL_PER_SECOND", 150))
+
+# Bộ điều khiển quá tải (models/overload.py): khi hàng đợi đầy hoặc độ trễ vượt SLO,
+# lần lượt tắt POS -> giảm beam -> greedy -> chỉ cache/bộ luật (OVERLOAD_MAX_LEVEL = 4)
+OVERLOAD_ENABLED = os.environ.get("OVERLOAD_ENABLED", "1") == "1"
+OVERLOAD_LATENCY_SLO = float(os.environ.get("OVERLOAD_LATENCY_SLO", 5.0))
+OVERLOAD_HIGH_WATERMARK = float(os.environ.get("OVERLOAD_HIGH_WATERMARK", 0.75))
+OVERLOAD_LOW_WATERMARK = float(os.environ.get("OVERLOAD_LOW_WATERMARK", 0.3))
+OVERLOAD_STEP_UP_SECONDS = float(os.environ.get("OVERLOAD_STEP_UP_SECONDS", 2.0))
+OVERLOAD_STEP_DOWN_SECONDS = float(os.environ.get("OVERLOAD_STEP_DOWN_SECONDS", 10.0))
+OVERLOAD_REDUCED_BEAMS = int(os.environ.get("OVERLOAD_REDUCED_BEAMS", 2))
+OVERLOAD_MAX_LEVEL = int(os.environ.get("OVERLOAD_MAX_LEVEL", 4))
+
+# Snapshot cache kết quả: ghi định kỳ + khi dừng, nạp lại (mmap) khi replica mới khởi động.
+# CACHE_PREWARM_LOGS: glob tới log traffic dạng JSON lines ({"text": ...}); các câu phổ biến
+# nhất chưa có trong snapshot được chạy trước khi replica báo /readyz
+CACHE_SNAPSHOT_PATH = os.environ.get("CACHE_SNAPSHOT_PATH", "cache/corrections.snap")
+CACHE_SNAPSHOT_INTERVAL = float(os.environ.get("CACHE_SNAPSHOT_INTERVAL", 300))
+CACHE_PREWARM_LOGS = os.environ.get("CACHE_PREWARM_LOGS", "")
+CACHE_PREWARM_MAX_SENTENCES = int(os.environ.get("CACHE_PREWARM_MAX_SENTENCES", 5000))
+CACHE_PREWARM_SECONDS = float(os.environ.get("CACHE_PREWARM_SECONDS", 120))
+
+# Warm-up: các câu đại diện chạy qua pipeline trước khi replica báo /readyz
+WARMUP_EXAMPLES_PATH = os.environ.get("WARMUP_EXAMPLES_PATH", "data/examples.json")
+WARMUP_MAX_INPUTS = int(os.environ.get("WARMUP_MAX_INPUTS", 8))
+
+# Phiên tài liệu (giao thức incremental của editor)
+SESSION_MAX_COUNT = int(os.environ.get("SESSION_MAX_COUNT", 5000))
+SESSION_MAX_BYTES = int(os.environ.get("SESSION_MAX_BYTES", 256 * 1024 * 1024))
+SESSION_TTL_SECONDS = float(os.environ.get("SESSION_TTL_SECONDS", 1800))
+
+# Tham số sinh câu: num_beams=1 là greedy; SPECULATIVE_DECODING=1 thì greedy
+# chạy theo kiểu speculative (bản nháp chép từ câu gốc, cùng kết quả)
+GENERATION_NUM_BEAMS = int(os.environ.get("GENERATION_NUM_BEAMS", 5))
+SPECULATIVE_DECODING = os.environ.get("SPECULATIVE_DECODING", "0") == "1"
+# Phiên incremental: câu vừa bị sửa nhẹ được sinh greedy speculative với kết
+# quả cũ làm bản nháp (nhanh hơn nhiều khi gõ liên tục). Đánh đổi: câu đó nhận
+# kết quả greedy thay vì beam search (GENERATION_NUM_BEAMS) cho tới lần sửa
+# sau hoặc lần kiểm tra toàn văn qua /correct. Đặt 0 để luôn dùng beam search
+# (khi đó kết quả cũ không được dùng lại: encoder cache chỉ khớp câu giữ nguyên)
+INCREMENTAL_SPECULATIVE = os.environ.get("INCREMENTAL_SPECULATIVE", "1") == "1"
+# Số kết quả encoder gần nhất giữ lại để câu gửi lại không phải encode lại
+ENCODER_CACHE_SIZE = int(os.environ.get("ENCODER_CACHE_SIZE", 256))
+
+# Định tuyến hai tầng model (models/routing.py): để trống SMALL_MODEL_NAME để
+# chỉ dùng model lớn; model nhỏ cần cùng tiền tố "grammar: " (vd. t5-base sửa ngữ pháp)
+SMALL_MODEL_NAME = os.environ.get("SMALL_MODEL_NAME", "")
+ROUTING_SHORT_WORDS = int(os.environ.get("ROUTING_SHORT_WORDS", 12))
+ROUTING_MAX_SMALL_WORDS = int(os.environ.get("ROUTING_MAX_SMALL_WORDS", 30))
+ROUTING_TRUST_PARSER = os.environ.get("ROUTING_TRUST_PARSER", "1") == "1"
+# Log-xác suất trung bình mỗi token tối thiểu để giữ kết quả model nhỏ
+ROUTING_MIN_CONFIDENCE = float(os.environ.get("ROUTING_MIN_CONFIDENCE", -0.15))
+ROUTING_SMALL_NUM_BEAMS = int(os.environ.get("ROUTING_SMALL_NUM_BEAMS", 1))
+
+# Bộ luật sửa nhanh (/correct/quick), tự nạp lại khi file thay đổi
+GRAMMAR_RULES_PATH = os.environ.get("GRAMMAR_RULES_PATH", "data/grammar_rules.json")
+
+# Chỉ mục gợi ý chính tả: dựng từ pyspellchecker lần đầu rồi nạp lại từ file
+SPELLING_INDEX_PATH = os.environ.get("SPELLING_INDEX_PATH", "data/spelling_index.pkl")
+
+# Route /metrics cho Prometheus (job api_service trong monitoring/prometheus)
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+
+# Thống kê lỗi theo từng câu (Parquet chia theo giờ); để trống để tắt
+ANALYTICS_DIR = os.environ.get("ANALYTICS_DIR", "analytics")
+ANALYTICS_FLUSH_SECONDS = float(os.environ.get("ANALYTICS_FLUSH_SECONDS", 30))
+
+# Đăng nhập: băm mật khẩu trên executor riêng (không tranh luồng/CPU với /correct),
+# cache tra cứu người dùng và connection pool của SQLAlchemy
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///users.db")
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+DB_POOL_RECYCLE_SECONDS = int(os.environ.get("DB_POOL_RECYCLE_SECONDS", 1800))
+AUTH_HASH_WORKERS = int(os.environ.get("AUTH_HASH_WORKERS", 2))
+AUTH_HASH_QUEUE_SIZE = int(os.environ.get("AUTH_HASH_QUEUE_SIZE", 64))
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 10000))
+USER_CACHE_TTL_SECONDS = float(os.environ.get("USER_CACHE_TTL_SECONDS", 300))
+
+# Lịch sử kiểm tra của người dùng đã đăng nhập (SQLite WAL, ghi nền theo lô).
+# Các replica trên cùng máy dùng chung file qua volume (xem docker-compose.yml)
+HISTORY_DB_PATH = os.environ.get("HISTORY_DB_PATH", "history/corrections.db")
+HISTORY_FLUSH_SECONDS = float(os.environ.get("HISTORY_FLUSH_SECONDS", 1.0))
+HISTORY_MAX_PAGE_SIZE = int(os.environ.get("HISTORY_MAX_PAGE_SIZE", 100))
+# Tài liệu soạn qua /correct/incremental: ghi toàn văn vào lịch sử tối đa một
+# lần mỗi khoảng này (giây) cho mỗi tài liệu, không ghi theo từng phím gõ
+HISTORY_INCREMENTAL_SECONDS = float(os.environ.get("HISTORY_INCREMENTAL_SECONDS", 60))
+
+
+_device = None
+
+def __getattr__(name):
+    """Thuộc tính tính lười của module (PEP 562)."""
+    global _device
+    if name == "DEVICE":
+        if _device is None:
+            _device = os.environ.get("DEVICE")
+        if _device is None:
+            import torch # type: ignore
+            _device = "cuda" if torch.cuda.is_available() else "cpu"
+        return _device
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
@@ -11,7 +11,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Import các module cần thiết từ bên ngoài hàm main
-from utils import export_model, training_loss_chart, training_stats
+from utils import export_model, training_loss_chart, training_stats, model_evaluation
 
 def main():
     """Tạo tất cả các đánh giá cho mô hình trong một lần chạy."""
@@ -49,6 +49,13 @@ def main():
     except Exception as e:
         logger.error(f"Lỗi khi tạo báo cáo thống kê: {str(e)}")
     
+    # 4. Đánh giá chất lượng sửa lỗi trên tập có nhãn
+    logger.info("4. Đánh giá GLEU / precision / recall trên data/examples.json...")
+    try:
+        model_evaluation.evaluate_model()
+    except Exception as e:
+        logger.error(f"Lỗi khi đánh giá mô hình: {str(e)}")
+    
     logger.info("Hoàn thành! Các đánh giá được lưu trong thư mục 'evaluation'")
 
 if __name__ == "__main__":
@@ -0,0 +1,152 @@
+"""Admission control, deadlines and cancellation for correction requests."""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from models.executor import RejectedError
+
+logger = logging.getLogger(__name__)
+
+
+class InputTooLargeError(RejectedError):
+    """Văn bản gửi lên vượt quá giới hạn cho phép."""
+
+    status_code = 413
+
+
+class TokenBudgetExceeded(RejectedError):
+    """Người dùng/phiên đã dùng hết ngân sách token trong cửa sổ hiện tại."""
+
+    status_code = 429
+
+
+class DeadlineExceededError(RejectedError):
+    """Request hết hạn trước khi kịp được đưa vào model."""
+
+    status_code = 503
+
+
+class RequestCancelled(Exception):
+    """Request bị huỷ (client ngắt kết nối hoặc bị request mới hơn thay thế)."""
+
+
+def estimate_tokens(text):
+    """
+    Ước lượng nhanh số token SentencePiece của một đoạn văn bản
+    (khoảng 1.3 token cho mỗi từ tiếng Anh) mà không cần gọi tokenizer.
+    """
+    return int(len(text.split()) * 1.3) + 1
+
+
+class RequestContext:
+    """
+    Deadline và cờ huỷ của một request, được truyền xuống vòng lặp câu
+    trong GrammarCorrector.correct_text và vào model.generate.
+    """
+
+    def __init__(self, timeout=None):
+        """
+        Args:
+            timeout (float): Số giây tối đa cho request, None = không giới hạn
+        """
+        self.started = time.monotonic()
+        self.deadline = self.started + timeout if timeout else None
+        self._cancelled = threading.Event()
+        # Được đặt True khi có câu bị bỏ qua do hết hạn
+        self.truncated = False
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def expired(self):
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def remaining(self):
+        """Số giây còn lại trước deadline (None nếu không giới hạn)."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def should_stop(self):
+        return self.cancelled or self.expired
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise RequestCancelled("Request was cancelled")
+
+
+class TokenBucketLimiter:
+    """
+    Giới hạn số token được xử lý theo từng người dùng/phiên (token bucket).
+
+    Mỗi khoá có tối đa `capacity` token và được nạp lại `refill_rate`
+    token mỗi giây. Số khoá được theo dõi có giới hạn (LRU) để không rò bộ nhớ.
+    """
+
+    def __init__(self, capacity, refill_rate, max_keys=10000):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, tokens):
+        """
+        Trừ `tokens` khỏi bucket của `key`.
+
+        Raises:
+            TokenBudgetExceeded: Khi bucket không còn đủ token
+        """
+        now = time.monotonic()
+        with self._lock:
+            level, updated = self._buckets.pop(key, (self.capacity, now))
+            level = min(self.capacity, level + (now - updated) * self.refill_rate)
+
+            if tokens > level:
+                self._buckets[key] = (level, now)
+                self._evict()
+                retry_after = (min(tokens, self.capacity) - level) / self.refill_rate
+                raise TokenBudgetExceeded("Token budget exceeded", retry_after=max(1, retry_after))
+
+            self._buckets[key] = (level - tokens, now)
+            self._evict()
+
+    def _evict(self):
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+
+class SupersedeRegistry:
+    """
+    Theo dõi request mới nhất của mỗi luồng soạn thảo (editor stream).
+
+    Khi editor gửi lần kiểm tra mới (debounce kích hoạt lại), request cũ
+    cùng khoá bị huỷ để không tốn CPU cho kết quả không còn ai dùng.
+    """
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._active = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, key, context):
+        with self._lock:
+            previous = self._active.pop(key, None)
+            self._active[key] = context
+            while len(self._active) > self.max_keys:
+                self._active.popitem(last=False)
+        if previous is not None and previous is not context:
+            previous.cancel()
+            logger.debug(f"Cancelled superseded request for {key}")
+
+    def release(self, key, context):
+        with self._lock:
+            if self._active.get(key) is context:
+                del self._active[key]
@@ -0,0 +1,206 @@
+"""Per-sentence error analytics written to hourly-partitioned Parquet files."""
+
+import atexit
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+# Thứ tự cố định: bit i của cột "categories" ứng với ERROR_CATEGORIES[i].
+# Chỉ được thêm vào cuối danh sách để dữ liệu cũ vẫn đọc đúng.
+ERROR_CATEGORIES = (
+    'capitalization',
+    'missing sentence punctuation',
+    'spelling',
+    'subject-verb agreement',
+    'article usage',
+    'verb tense',
+    'verb form',
+    'preposition usage',
+    'plural/singular noun',
+    'pronoun usage',
+    'word order',
+    'punctuation',
+    'missing word',
+    'unnecessary word',
+    'modal verb usage',
+    'grammar',
+)
+
+_CATEGORY_BITS = {name: 1 << index for index, name in enumerate(ERROR_CATEGORIES)}
+
+# Tên cột và kiểu dữ liệu (gọn: bitmask thay cho danh sách chuỗi)
+COLUMNS = (
+    ('ts', 'int64'),              # thời điểm (ms từ epoch)
+    ('categories', 'uint32'),     # bitmask ERROR_CATEGORIES
+    ('error_count', 'uint8'),
+    ('sentence_chars', 'uint32'),
+    ('sentence_words', 'uint16'),
+    ('latency_ms', 'float32'),
+    ('cache_hit', 'bool'),
+    ('changed', 'bool'),
+)
+
+
+def category_mask(errors):
+    """
+    Bitmask các loại lỗi từ kết quả identify_errors.
+
+    error_type có thể kèm chi tiết ("spelling: teh", "missing word(s): a"),
+    nên so khớp theo tiền tố.
+    """
+    mask = 0
+    for error in errors:
+        error_type = error.get('error_type', '')
+        for name, bit in _CATEGORY_BITS.items():
+            if error_type.startswith(name):
+                mask |= bit
+                break
+    return mask
+
+
+def categories_from_mask(mask):
+    return [name for name, bit in _CATEGORY_BITS.items() if mask & bit]
+
+
+class AnalyticsRecorder:
+    """
+    Ghi thống kê lỗi theo từng câu vào các file Parquet chia theo giờ.
+
+    record() chỉ đưa bản ghi thô vào hàng đợi có giới hạn (đầy thì bỏ và
+    đếm vào `dropped`), nên request không bao giờ bị chặn. Luồng nền phân
+    loại lỗi, gom cột và ghi một file part mỗi lần flush vào
+    <directory>/date=YYYY-MM-DD/hour=HH/ - pandas/pyarrow đọc cả thư mục
+    như một dataset phân vùng.
+    """
+
+    def __init__(self, directory, classify, flush_interval=30.0, max_rows=50000, max_queue=100000):
+        """
+        Args:
+            directory (str): Thư mục gốc chứa dữ liệu
+            classify (callable): classify(original, corrected) -> list lỗi
+                (cùng định dạng với GrammarCorrector.identify_errors)
+            flush_interval (float): Số giây tối đa giữa hai lần ghi file
+            max_rows (int): Ghi ngay khi gom đủ số dòng này
+            max_queue (int): Số bản ghi tối đa chờ trong hàng đợi
+        """
+        self.directory = directory
+        self.classify = classify
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self.dropped = 0
+        self.written = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return pa is not None and bool(self.directory)
+
+    def start(self):
+        if not self.enabled:
+            if self.directory:
+                logger.warning("Chưa cài pyarrow - tắt ghi thống kê lỗi")
+            return
+        with self._lock:
+            if self._thread is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._thread = threading.Thread(target=self._run, name='error-analytics', daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def record(self, original, corrected, latency_ms, cache_hit):
+        """Ghi nhận kết quả sửa một câu (không chặn)."""
+        if self._thread is None:
+            return
+        try:
+            self._queue.put_nowait((time.time(), original, corrected, latency_ms, cache_hit))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout=10.0):
+        """Ghi nốt dữ liệu còn trong hàng đợi rồi dừng luồng nền."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(None)
+        thread.join(timeout)
+
+    def stats(self):
+        return {'queued': self._queue.qsize(), 'written': self.written, 'dropped': self.dropped}
+
+    def _run(self):
+        columns = self._empty_columns()
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.monotonic(), 0.01))
+            except queue.Empty:
+                item = False
+
+            if item:
+                self._append(columns, item)
+
+            rows = len(columns['ts'])
+            if item is None or rows >= self.max_rows or time.monotonic() >= deadline:
+                if rows:
+                    self._flush(columns)
+                    columns = self._empty_columns()
+                deadline = time.monotonic() + self.flush_interval
+            if item is None:
+                return
+
+    def _empty_columns(self):
+        return {name: [] for name, _ in COLUMNS}
+
+    def _append(self, columns, item):
+        timestamp, original, corrected, latency_ms, cache_hit = item
+        try:
+            errors = self.classify(original, corrected) if original != corrected else []
+        except Exception as e:
+            logger.warning(f"Không phân loại được lỗi: {e}")
+            errors = [{'error_type': 'grammar'}]
+        columns['ts'].append(int(timestamp * 1000))
+        columns['categories'].append(category_mask(errors))
+        columns['error_count'].append(min(len(errors), 255))
+        columns['sentence_chars'].append(len(original))
+        columns['sentence_words'].append(min(len(original.split()), 65535))
+        columns['latency_ms'].append(latency_ms)
+        columns['cache_hit'].append(bool(cache_hit))
+        columns['changed'].append(original != corrected)
+
+    def _flush(self, columns):
+        schema = pa.schema([(name, pa.type_for_alias(dtype)) for name, dtype in COLUMNS])
+        table = pa.Table.from_pydict(columns, schema=schema)
+        # Phân vùng theo giờ của bản ghi đầu tiên; một lần flush không vượt quá flush_interval
+        hour = time.gmtime(columns['ts'][0] / 1000)
+        partition = os.path.join(
+            self.directory,
+            time.strftime('date=%Y-%m-%d', hour),
+            time.strftime('hour=%H', hour)
+        )
+        # hostname + pid: nhiều replica có thể ghi chung một volume
+        filename = f"part-{columns['ts'][0]}-{socket.gethostname()}-{os.getpid()}.parquet"
+        path = os.path.join(partition, filename)
+        # File tạm bắt đầu bằng "." nên pyarrow bỏ qua khi đọc dataset
+        temp_path = os.path.join(partition, f".{filename}.tmp")
+        try:
+            os.makedirs(partition, exist_ok=True)
+            pq.write_table(table, temp_path, compression='zstd')
+            os.replace(temp_path, path)
+            self.written += table.num_rows
+        except OSError as e:
+            logger.error(f"Không ghi được file thống kê {path}: {e}")
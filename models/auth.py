@@ -0,0 +1,128 @@
+"""Password hashing on a bounded executor and a cache of user lookups."""
+
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from models.admission import DeadlineExceededError
+from models.executor import InferenceExecutor, QueueFullError
+from models.metrics import AUTH_HASH_PENDING, AUTH_HASH_REJECTED, AUTH_HASH_SECONDS, AUTH_USER_CACHE
+
+# Bản sao chỉ đọc của một User (không gắn với session SQLAlchemy nào)
+CachedUser = namedtuple('CachedUser', ['id', 'name', 'email', 'password'])
+
+
+class PasswordHasher:
+    """
+    Băm/kiểm tra mật khẩu (pbkdf2-sha256) trên thread pool riêng có giới hạn.
+
+    pbkdf2 tốn CPU có chủ đích; chạy trên luồng request, một đợt đăng nhập
+    đầu giờ học sẽ chiếm CPU và luồng của /correct. Ở đây số phép băm chạy
+    đồng thời bị giới hạn bởi max_workers; hàng đợi đầy thì ném
+    QueueFullError (429) ngay thay vì xếp hàng vô hạn.
+    """
+
+    def __init__(self, max_workers=2, max_queue=64, method='pbkdf2:sha256', timeout=30.0):
+        self.method = method
+        self.timeout = timeout
+        self._executor = InferenceExecutor(max_workers=max_workers, max_queue=max_queue, name="auth-hash")
+
+    def hash(self, password):
+        """
+        Raises:
+            QueueFullError: Khi đã có quá nhiều phép băm đang chờ
+            DeadlineExceededError: Khi phép băm không xong trong timeout giây
+        """
+        return self._run('hash', generate_password_hash, password, method=self.method)
+
+    def verify(self, password_hash, password):
+        """
+        Raises:
+            QueueFullError: Khi đã có quá nhiều phép băm đang chờ
+            DeadlineExceededError: Khi phép băm không xong trong timeout giây
+        """
+        return self._run('verify', check_password_hash, password_hash, password)
+
+    def _run(self, operation, fn, *args, **kwargs):
+        def timed():
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                AUTH_HASH_SECONDS.labels(operation).observe(time.perf_counter() - started)
+
+        try:
+            future = self._executor.submit(timed)
+        except QueueFullError:
+            AUTH_HASH_REJECTED.labels(operation).inc()
+            raise
+        AUTH_HASH_PENDING.set(self._executor.pending)
+        try:
+            return future.result(self.timeout)
+        except FutureTimeoutError:
+            # Còn nằm trong hàng đợi thì bỏ luôn, không băm cho một request đã trả lỗi
+            future.cancel()
+            AUTH_HASH_REJECTED.labels(operation).inc()
+            raise DeadlineExceededError(
+                "Password hashing timed out", retry_after=self._executor.retry_after()
+            ) from None
+        finally:
+            AUTH_HASH_PENDING.set(self._executor.pending)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+class UserCache:
+    """
+    Cache LRU có TTL cho tra cứu người dùng theo id và theo email, để
+    trang chủ và đăng nhập không truy vấn DB mỗi lần.
+    """
+
+    def __init__(self, max_entries=10000, ttl=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, load):
+        """
+        Args:
+            key (tuple): ('id', user_id) hoặc ('email', email)
+            load (callable): Hàm không tham số trả về User (hoặc None) khi cache không có
+
+        Returns:
+            CachedUser hoặc None (không tìm thấy thì không cache)
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                AUTH_USER_CACHE.labels('hit').inc()
+                return entry[1]
+        AUTH_USER_CACHE.labels('miss').inc()
+
+        user = load()
+        if user is None:
+            return None
+        cached = CachedUser(user.id, user.name, user.email, user.password)
+        self.put(cached)
+        return cached
+
+    def put(self, user):
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for key in (('id', user.id), ('email', user.email)):
+                self._entries[key] = (expires_at, user)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id=None, email=None):
+        with self._lock:
+            self._entries.pop(('id', user_id), None)
+            self._entries.pop(('email', email), None)
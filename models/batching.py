@@ -0,0 +1,117 @@
+"""Token-budget batching with latency and memory feedback (AIMD)."""
+
+import threading
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from models.metrics import BATCH_TOKEN_BUDGET
+
+
+def batch_cost(lengths, num_beams=1):
+    """Số token sau khi đệm của một lô: số câu x câu dài nhất x số beam."""
+    return len(lengths) * max(lengths, default=0) * num_beams
+
+
+def plan_batches(pending, length_of, budget, num_beams=1, max_sentences=None):
+    """
+    Chia các câu (đã sắp theo độ dài) thành các lô có tổng token sau khi
+    đệm không vượt budget. Câu dài hơn cả budget được xếp một mình một lô.
+
+    Args:
+        pending (list): Các câu chờ sinh
+        length_of (callable): Số token đầu vào của một phần tử
+        budget (int): Số token tối đa của một lô (tính cả đệm và beam)
+        max_sentences (int): Số câu tối đa mỗi lô (tuỳ chọn)
+
+    Returns:
+        list: Các lô (list), cùng thứ tự với pending
+    """
+    batches = []
+    batch = []
+    longest = 0
+    for item in pending:
+        length = length_of(item)
+        longest_with_item = max(longest, length)
+        full = max_sentences is not None and len(batch) >= max_sentences
+        if batch and (full or (len(batch) + 1) * longest_with_item * num_beams > budget):
+            batches.append(batch)
+            batch = []
+            longest_with_item = length
+        batch.append(item)
+        longest = longest_with_item
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class TokenBudget:
+    """
+    Ngân sách token mỗi lô, tự điều chỉnh kiểu AIMD (như điều khiển tắc nghẽn TCP).
+
+    Lô đã dùng gần hết ngân sách mà xong trong target_latency thì ngân sách
+    tăng thêm một lượng cố định; lô nhiều câu chậm hơn target_latency, hoặc
+    bộ nhớ trống xuống dưới min_free_bytes, thì ngân sách bị nhân với
+    decrease_factor. Lô một câu chậm không làm giảm ngân sách: lô không thể
+    nhỏ hơn nữa (vd. coedit-large 5 beam trên CPU thường quá 1 giây/câu).
+    Cùng một image tự tìm được kích thước lô phù hợp cho máy nhỏ lẫn máy lớn.
+    """
+
+    def __init__(self, name, initial=512, minimum=64, maximum=8192, target_latency=1.0,
+                 increase_step=64, decrease_factor=0.7, min_free_bytes=1024 ** 3):
+        """
+        Args:
+            name (str): Nhãn của metric (tầng model)
+            initial, minimum, maximum (int): Ngân sách ban đầu và giới hạn (token)
+            target_latency (float): Thời gian tối đa mong muốn của một lô (giây)
+            increase_step (int): Số token cộng thêm sau mỗi lô đủ nhanh
+            decrease_factor (float): Hệ số nhân khi lô chậm hoặc thiếu bộ nhớ
+            min_free_bytes (int): Bộ nhớ trống tối thiểu (psutil), 0 = không kiểm tra
+        """
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.min_free_bytes = min_free_bytes if psutil is not None else 0
+        self._budget = float(max(minimum, min(initial, maximum)))
+        self._lock = threading.Lock()
+        self.increases = 0
+        self.decreases = 0
+        BATCH_TOKEN_BUDGET.labels(name).set(int(self._budget))
+
+    @property
+    def budget(self):
+        return int(self._budget)
+
+    def memory_low(self):
+        if not self.min_free_bytes:
+            return False
+        return psutil.virtual_memory().available < self.min_free_bytes
+
+    def observe(self, tokens, seconds, sentences=1):
+        """Ghi nhận một lô đã sinh xong: số token (batch_cost), thời gian (giây) và số câu."""
+        memory_low = self.memory_low()
+        with self._lock:
+            if memory_low or (seconds > self.target_latency and sentences > 1):
+                self._budget = max(self.minimum, self._budget * self.decrease_factor)
+                self.decreases += 1
+            elif seconds <= self.target_latency and tokens >= 0.8 * self._budget:
+                # Chỉ tăng khi lô thực sự chạm ngân sách: lô nhỏ nhanh không
+                # chứng minh được lô lớn hơn cũng nhanh
+                self._budget = min(self.maximum, self._budget + self.increase_step)
+                self.increases += 1
+            else:
+                return
+            budget = int(self._budget)
+        BATCH_TOKEN_BUDGET.labels(self.name).set(budget)
+
+    def stats(self):
+        return {
+            'budget': self.budget,
+            'increases': self.increases,
+            'decreases': self.decreases,
+        }
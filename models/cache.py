@@ -0,0 +1,62 @@
+"""Process-wide LRU cache of per-sentence corrections."""
+
+import threading
+from collections import OrderedDict
+
+
+class CorrectionCache:
+    """
+    Cache LRU kết quả sửa lỗi theo từng câu.
+
+    Dùng chung cho mọi request và mọi phiên tài liệu trong tiến trình: câu
+    đã sửa một lần (cùng tham số sinh) thì không cần chạy lại model.
+    """
+
+    def __init__(self, max_entries=50000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Tăng mỗi lần put: cho biết cache đã đổi kể từ lần snapshot trước
+        self.writes = 0
+
+    def get(self, key):
+        """Trả về kết quả đã cache hoặc None."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self.writes += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def items(self):
+        """Bản sao các cặp (key, value), từ ít dùng gần đây nhất đến mới nhất."""
+        with self._lock:
+            return list(self._entries.items())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+        }
@@ -1,24 +1,131 @@
 """Core model for grammar correction."""
 
+import hashlib
 import traceback
-import torch 
-from transformers import T5ForConditionalGeneration, T5Tokenizer, AutoTokenizer
-import nltk 
-from nltk.tokenize import sent_tokenize
-from nltk.tokenize import word_tokenize
-from nltk.parse.chart import ChartParser
 import logging
 import os
 import re
-from spellchecker import SpellChecker
+import threading
+import time
 
+from models.batching import TokenBudget, batch_cost, plan_batches
+from models.cache import CorrectionCache
+from models.singleflight import SingleFlight, normalize_sentence
+from models.decoding import speculative_greedy
+from models.metrics import CORRECTION_CACHE, GENERATE_SECONDS, GENERATED_SENTENCES
+from models.routing import LARGE_TIER, SMALL_TIER, ModelRouter
+from models.segmentation import GRAMMAR_PREFIX, Sentence, get_segmenter, segment
+from models.spelling import edit_distance, get_spelling_index
 
-# Download necessary NLTK data
-nltk.download('punkt', quiet=True)
+# torch, transformers, nltk và spellchecker được import lười (trong hàm) để
+# việc import module này không tốn vài giây và không gây truy cập mạng.
 
 logger = logging.getLogger(__name__)
 
+# Dữ liệu NLTK cần thiết; được đóng gói sẵn trong image (xem Dockerfile)
+NLTK_RESOURCES = {
+    'punkt': 'tokenizers/punkt',
+    'averaged_perceptron_tagger': 'taggers/averaged_perceptron_tagger',
+}
+
+def ensure_nltk_data(allow_download=None):
+    """
+    Kiểm tra (offline) rằng dữ liệu NLTK đã có sẵn.
+
+    Chỉ tải về khi được bật rõ ràng qua NLTK_ALLOW_DOWNLOAD=1 (dev local);
+    trong container, thiếu dữ liệu là lỗi đóng gói và được báo ngay.
+
+    Raises:
+        LookupError: Khi thiếu dữ liệu và không được phép tải
+    """
+    import nltk
+
+    if allow_download is None:
+        allow_download = os.environ.get('NLTK_ALLOW_DOWNLOAD') == '1'
+    for package, path in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            if not allow_download:
+                raise LookupError(
+                    f"Thiếu dữ liệu NLTK '{package}'. Chạy "
+                    f"'python -m nltk.downloader {package}' hoặc đặt NLTK_ALLOW_DOWNLOAD=1"
+                )
+            logger.info(f"Đang tải gói NLTK: {package}")
+            nltk.download(package, quiet=True)
+
+def model_fingerprint(model_name, model, use_8bit=False):
+    """
+    Định danh phiên bản model: tên, commit trên HuggingFace Hub (nếu có),
+    lượng tử hoá và kích thước/mtime các file khi tải từ thư mục cục bộ.
+    Kết quả cache (và snapshot của nó) chỉ dùng được với đúng phiên bản này.
+    """
+    digest = hashlib.sha256(str(model_name).encode('utf-8'))
+    digest.update(str(getattr(model.config, '_commit_hash', None)).encode('utf-8'))
+    digest.update(b'8bit' if use_8bit else b'fp')
+    if os.path.isdir(model_name):
+        for name in sorted(os.listdir(model_name)):
+            stat = os.stat(os.path.join(model_name, name))
+            digest.update(f"{name}:{stat.st_size}:{int(stat.st_mtime)}".encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+class PosTagger:
+    """
+    Averaged-perceptron tagger dùng chung (tải một lần), gắn nhãn theo lô và
+    nhớ kết quả theo từng câu (LRU) - câu không đổi giữa các lần gõ không
+    phải gắn nhãn lại.
+    """
+
+    def __init__(self, memo_size=20000):
+        from nltk.tag import PerceptronTagger
+
+        self._tagger = PerceptronTagger()
+        self.memo = CorrectionCache(memo_size)
+
+    def tag_sents(self, sentences):
+        """
+        Args:
+            sentences (list): Danh sách câu, mỗi câu là list token
+
+        Returns:
+            list: [(word, tag)] cho từng câu (không được sửa đổi - dùng chung với memo)
+        """
+        results = [None] * len(sentences)
+        misses = []
+        for index, tokens in enumerate(sentences):
+            cached = self.memo.get(tuple(tokens))
+            if cached is None:
+                misses.append(index)
+            else:
+                results[index] = cached
+
+        if misses:
+            tagged = self._tagger.tag_sents([list(sentences[index]) for index in misses])
+            for index, pairs in zip(misses, tagged):
+                results[index] = pairs
+                self.memo.put(tuple(sentences[index]), pairs)
+        return results
+
+    def tag(self, tokens):
+        return self.tag_sents([tokens])[0]
+
+_pos_tagger = None
+_pos_tagger_lock = threading.Lock()
+
+def get_pos_tagger():
+    """PosTagger dùng chung cho cả tiến trình (tải model perceptron một lần)."""
+    global _pos_tagger
+    if _pos_tagger is None:
+        with _pos_tagger_lock:
+            if _pos_tagger is None:
+                _pos_tagger = PosTagger()
+    return _pos_tagger
+
 class PartOfSpeechAnalyzer:
+    # Bảng CYK tốn O(n^3): văn bản dài hơn ngưỡng này chỉ dùng nhãn POS
+    MAX_PARSE_TOKENS = 40
+
     def __init__(self):
         # Định nghĩa ngữ pháp CFG cho tiếng Anh
         grammar_str = """
@@ -115,54 +222,101 @@ class PartOfSpeechAnalyzer:
                     NUM -> 'one' | 'two' | 'three' | 'four' | 'five' | 'first' | 'second' | 'third' | 'fourth' | 'fifth'
                     NUM -> 'many' | 'few' | 'several' | 'some' | 'any' | 'all' | 'both' | 'half' | 'quarter'
                     """
+        import nltk
+        from nltk.parse.chart import ChartParser
+
         self.grammar = nltk.CFG.fromstring(grammar_str)
         self.parser = ChartParser(self.grammar)
-        
-    def analyze_sentence(self, sentence):
+
+        # Chỉ mục luật dựng một lần: từ -> nhãn, (B, C) -> nhãn của luật A -> B C ...
+        self._lexical = {}
+        self._binary = {}
+        for rule in self.grammar.productions():
+            rhs = rule.rhs()
+            if rule.is_lexical():
+                self._lexical.setdefault(rhs[0], set()).add(rule.lhs().symbol())
+            elif len(rhs) >= 2:
+                key = (rhs[0].symbol(), rhs[1].symbol())
+                self._binary.setdefault(key, set()).add(rule.lhs().symbol())
+
+        self.tagger = get_pos_tagger()
+
+    def analyze_segmented(self, segmented):
+        """
+        Phân tích văn bản đã tách câu (models.segmentation.SegmentedText).
+        Toàn bộ việc gắn nhãn POS của request là một lần gọi tag_sents theo
+        lô, các câu đã gặp lấy từ memo.
+        """
+        sentences = segmented.analysis_sentences()
+        tagged = self.tagger.tag_sents(sentences)
+        tokens = [word for words in sentences for word in words]
+        tags = [pair for pairs in tagged for pair in pairs]
+        return self.analyze_sentence(segmented.text, tokens=tokens, tags=tags)
+
+    def analyze_sentence(self, sentence, tokens=None, tags=None):
+        """
+        Args:
+            sentence (str): Câu/đoạn văn cần phân tích
+            tokens (list): Token đã tách sẵn (SegmentedText.analysis_tokens());
+                nếu có thì không tách từ lại
+            tags (list): [(word, tag)] tương ứng với tokens; nếu không có thì
+                được gắn một lần ở đây và dùng chung cho các bước bên dưới
+        """
         try:
-            # Tiền xử lý câu
-            sentence = sentence.lower().strip()
-            if sentence[-1] in ['.', '?', '!']:
-                sentence = sentence[:-1]
-            
-            tokens = word_tokenize(sentence)
-            
+            if tokens is None:
+                # Tiền xử lý câu
+                tokens = segment(sentence.strip()).analysis_tokens()
+            if tags is None:
+                tags = self.tagger.tag(tokens)
+
             n = len(tokens)
-            table = [[set() for _ in range(n)] for _ in range(n)]
-            
-            for i in range(n):
-                word = tokens[i]
-                for rule in self.grammar.productions():
-                    if rule.is_lexical() and word == rule.rhs()[0]:
-                        table[0][i].add(rule.lhs().symbol())
-            
-            for l in range(1, n):
-                for s in range(n - l):
-                    for p in range(l):
-                        for rule in self.grammar.productions():
-                            if not rule.is_lexical():
-                                B = rule.rhs()[0]
-                                C = rule.rhs()[1]
-                                if B in table[p][s] and C in table[l-p-1][s+p+1]:
-                                    table[l][s].add(rule.lhs().symbol())
-            
-            if 'S' in table[n-1][0]:
-                return self._get_detailed_analysis(tokens, table)
+            table = self._parse_table(tokens) if n <= self.MAX_PARSE_TOKENS else None
+
+            if table is not None and 'S' in table[n-1][0]:
+                return self._get_detailed_analysis(tokens, table, tags)
             else:
-                tagged_tokens = nltk.pos_tag(tokens)
                 return [
                     {
                         "word": word,
                         "pos": self._map_tag_to_part_of_speech(tag)
                     }
-                    for word, tag in tagged_tokens
+                    for word, tag in tags
                 ]
                 
         except Exception as e:
             print(f"Error in sentence analysis: {str(e)}")
             return []
+
+    def is_well_formed(self, tokens):
+        """True nếu bảng CYK phủ được cả câu bằng nhãn S (token chữ thường)."""
+        n = len(tokens)
+        if not n or n > self.MAX_PARSE_TOKENS:
+            return False
+        return 'S' in self._parse_table(tokens)[n-1][0]
+
+    def _parse_table(self, tokens):
+        """Bảng CYK: table[l][s] là các nhãn phủ tokens[s:s+l+1]."""
+        n = len(tokens)
+        table = [[set() for _ in range(n)] for _ in range(n)]
+
+        for i in range(n):
+            table[0][i].update(self._lexical.get(tokens[i], ()))
+
+        for l in range(1, n):
+            for s in range(n - l):
+                for p in range(l):
+                    left = table[p][s]
+                    right = table[l-p-1][s+p+1]
+                    if not left or not right:
+                        continue
+                    for B in left:
+                        for C in right:
+                            labels = self._binary.get((B, C))
+                            if labels:
+                                table[l][s].update(labels)
+        return table
             
-    def _get_detailed_analysis(self, tokens, table):
+    def _get_detailed_analysis(self, tokens, table, tags):
         """Trích xuất phân tích chi tiết từ bảng CYK"""
         n = len(tokens)
         result = []
@@ -197,8 +351,8 @@ class PartOfSpeechAnalyzer:
                     "confidence": "high" if len(possible_labels) == 1 else "medium"
                 })
             else:
-                # Nếu không tìm thấy nhãn phù hợp, sử dụng NLTK POS tagger
-                tag = nltk.pos_tag([word])[0][1]
+                # Nếu không tìm thấy nhãn phù hợp, dùng nhãn POS đã gắn cho cả câu
+                tag = tags[i][1]
                 result.append({
                     "word": word,
                     "pos": self._map_tag_to_part_of_speech(tag),
@@ -216,7 +370,7 @@ class PartOfSpeechAnalyzer:
             result.append({
                 "type": "sentence_structure",
                 "value": "invalid",
-                "suggestions": self._generate_structure_suggestions(tokens)
+                "suggestions": self._generate_structure_suggestions(tokens, tags)
             })
         
         return result
@@ -258,22 +412,24 @@ class PartOfSpeechAnalyzer:
         
         return components
     
-    def _generate_structure_suggestions(self, tokens):
+    def _generate_structure_suggestions(self, tokens, tags=None):
         """Tạo gợi ý cải thiện cấu trúc câu"""
+        if tags is None:
+            tags = self.tagger.tag(tokens)
+
         suggestions = []
         
         # Kiểm tra xem có chủ ngữ không
-        has_subject = any(tag[1].startswith('NN') for tag in nltk.pos_tag(tokens))
+        has_subject = any(tag[1].startswith('NN') for tag in tags)
         if not has_subject:
             suggestions.append("Thiếu chủ ngữ trong câu")
         
         # Kiểm tra xem có động từ không
-        has_verb = any(tag[1].startswith('VB') for tag in nltk.pos_tag(tokens))
+        has_verb = any(tag[1].startswith('VB') for tag in tags)
         if not has_verb:
             suggestions.append("Thiếu động từ trong câu")
         
         # Kiểm tra thứ tự từ
-        tags = nltk.pos_tag(tokens)
         for i in range(len(tags)-1):
             if tags[i][1].startswith('VB') and tags[i+1][1].startswith('NN'):
                 suggestions.append("Có thể cần điều chỉnh thứ tự từ: động từ nên đứng sau danh từ")
@@ -319,22 +475,136 @@ class PartOfSpeechAnalyzer:
         }
         return tag_map.get(tag, 'NOUN')
 
+class RequestStoppingCriteria:
+    """
+    Dừng model.generate ngay khi request bị huỷ hoặc hết hạn.
+    (Cùng giao diện với transformers.StoppingCriteria, không cần import transformers.)
+    """
+
+    def __init__(self, context):
+        self.context = context
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return self.context.should_stop()
+
 class GrammarCorrector:
     """
     A grammar correction model using T5.
     """
     
-    def __init__(self, model_name="grammarly/coedit-large", device="cpu", use_8bit=False):
+    def __init__(self, model_name="grammarly/coedit-large", device="cpu", use_8bit=False, cache_size=50000,
+                 analytics=None, num_beams=5, speculative=False, encoder_cache_size=256,
+                 small_model_name=None, routing=None, spelling_index_path=None, token_budget=None):
         """
         Khởi tạo mô hình sửa lỗi ngữ pháp.
         
         Args:
             model_name (str): Tên model trên HuggingFace hoặc đường dẫn cục bộ
             device (str): Thiết bị chạy ('cuda' hoặc 'cpu')
+            use_8bit (bool): Lượng tử hoá động int8 (torch.quantization.quantize_dynamic, CPU)
+            cache_size (int): Số câu tối đa trong cache kết quả (0 = tắt cache)
+            analytics (AnalyticsRecorder): Nơi ghi thống kê lỗi theo từng câu (tuỳ chọn)
+            num_beams (int): Số beam mặc định khi sinh
+            speculative (bool): Dùng giải mã speculative khi num_beams=1
+            encoder_cache_size (int): Số kết quả encoder gần nhất được giữ lại theo
+                token đầu vào (0 = tắt); câu gửi lại y hệt với tham số sinh khác
+                không phải chạy encoder lần nữa
+            small_model_name (str): Model nhỏ cho câu ngắn/đơn giản (tuỳ chọn);
+                khi có, mỗi câu được định tuyến giữa hai model (models/routing.py)
+            routing (RoutingPolicy): Chính sách định tuyến; mặc định RoutingPolicy()
+            spelling_index_path (str): File chỉ mục gợi ý chính tả (dựng và lưu lần đầu)
+            token_budget (dict): Tham số của TokenBudget (models/batching.py) cho
+                lô tự điều chỉnh theo số token; mỗi tầng model có ngân sách riêng
         """
+        self.cache = CorrectionCache(cache_size) if cache_size else None
+        self.analytics = analytics
+        self.encoder_cache = CorrectionCache(encoder_cache_size) if encoder_cache_size else None
+        # Câu đang được sinh: request trùng câu chờ kết quả thay vì sinh lại
+        self.inflight = SingleFlight()
+        self.num_beams = num_beams
+        self.speculative = speculative
+        self.decode_stats = {
+            'speculative_sentences': 0,
+            'speculative_tokens': 0,
+            'speculative_forward_passes': 0,
+        }
         self.device = device
         logger.info(f"Sử dụng thiết bị: {self.device}")
         
+        # 1. Model chính (model lớn khi có định tuyến)
+        self.tokenizer, self.model = self._load_pretrained(model_name, use_8bit)
+        self.use_8bit = use_8bit and self.device == "cpu"
+        # Phiên bản model (cả model nhỏ nếu có), dùng để vô hiệu snapshot cache cũ
+        self.version = model_fingerprint(model_name, self.model, self.use_8bit)
+        # Phiên bản riêng của model lớn: định danh file trọng số dùng chung của worker
+        self.model_version = self.version
+        # Số token của tiền tố "grammar: " (bỏ qua khi chép bản nháp từ câu gốc)
+        self._prefix_length = len(self.tokenizer(GRAMMAR_PREFIX, add_special_tokens=False)['input_ids'])
+
+        # Kiểm tra dữ liệu NLTK (offline, không tự tải trong production)
+        ensure_nltk_data()
+        # Tải Punkt một lần khi khởi động thay vì ở request đầu tiên
+        get_segmenter()
+        # Gợi ý chính tả không cần gọi model (models/spelling.py)
+        self.spelling = get_spelling_index(spelling_index_path)
+
+        # Phân tích thành phần câu (CFG + POS tagger dùng chung)
+        self.pos_analyzer = PartOfSpeechAnalyzer()
+
+        # Tiến trình model riêng (tuỳ chọn, xem start_workers)
+        self.workers = None
+
+        # Ngân sách token mỗi lô theo tầng model (khi không chỉ định batch_size)
+        token_budget = token_budget or {}
+        self.batch_budgets = {LARGE_TIER: TokenBudget(LARGE_TIER, **token_budget)}
+
+        # 2. Model nhỏ (tuỳ chọn): câu ngắn/đơn giản không cần model lớn
+        self.router = None
+        if small_model_name:
+            small_tokenizer, small_model = self._load_pretrained(small_model_name, use_8bit)
+            self.version += "+" + model_fingerprint(small_model_name, small_model, self.use_8bit)
+            self.router = ModelRouter(
+                small_model, small_tokenizer, routing, device=self.device,
+                is_well_formed=self.pos_analyzer.is_well_formed
+            )
+            self.batch_budgets[SMALL_TIER] = TokenBudget(SMALL_TIER, **token_budget)
+
+    def start_workers(self, weights_dir, **pool_options):
+        """
+        Chuyển việc sinh của model lớn sang các tiến trình worker (models/workers.py).
+
+        Trọng số được xuất một lần ra weights_dir và chính tiến trình này cũng
+        chuyển sang dùng bản mmap, nên mọi tiến trình đọc chung một bản trong
+        page cache. Giải mã speculative và model nhỏ vẫn chạy tại chỗ.
+
+        Args:
+            weights_dir (str): Thư mục chứa file trọng số dùng chung
+            **pool_options: Tham số của WorkerPool (num_workers, core_sets, threads...)
+        """
+        from models.workers import WorkerPool, attach_shared_weights, export_shared_weights
+
+        if self.use_8bit:
+            raise ValueError("Chế độ nhiều tiến trình không hỗ trợ model lượng tử hoá")
+        export_shared_weights(self.model, weights_dir, model_version=self.model_version)
+        attach_shared_weights(self.model, weights_dir)
+        pool = WorkerPool(weights_dir, **pool_options)
+        try:
+            pool.start()
+        except Exception:
+            pool.close()
+            raise
+        self.workers = pool
+        return pool
+
+    def _load_pretrained(self, model_name, use_8bit=False):
+        """
+        Tải tokenizer + model T5 lên self.device.
+
+        Returns:
+            tuple: (tokenizer, model)
+        """
+        from transformers import T5ForConditionalGeneration, AutoTokenizer
+
         try:
             # Ưu tiên tải từ Hugging Face để phù hợp với Docker/Cloud
             # Nếu model_name là đường dẫn local nhưng không tồn tại, tự động chuyển sang tên HF chuẩn
@@ -348,86 +618,335 @@ class GrammarCorrector:
 
             logger.info(f"Bắt đầu tải model: {model_name}")
             
-            # 1. Tải Tokenizer
-            self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+            tokenizer = AutoTokenizer.from_pretrained(model_name)
             
-            # 2. Tải Model
             # low_cpu_mem_usage=True: Giúp không bị tràn RAM khi load model nặng
-            self.model = T5ForConditionalGeneration.from_pretrained(
+            model = T5ForConditionalGeneration.from_pretrained(
                 model_name,
                 low_cpu_mem_usage=True 
             )
-            self.model = self.model.to(self.device)
+            model = model.to(self.device)
+
+            # Lượng tử hoá động int8 cho các lớp Linear (chỉ hỗ trợ trên CPU)
+            if use_8bit:
+                if self.device == "cpu":
+                    import torch
+                    model = torch.quantization.quantize_dynamic(
+                        model, {torch.nn.Linear}, dtype=torch.qint8
+                    )
+                    logger.info("Đã lượng tử hoá model (dynamic int8)")
+                else:
+                    logger.warning("use_8bit chỉ hỗ trợ trên CPU - bỏ qua lượng tử hoá")
             
-            logger.info("Đã tải xong model thành công!")
+            logger.info(f"Đã tải xong model {model_name} thành công!")
+            return tokenizer, model
                 
         except Exception as e:
             logger.error(f"Lỗi nghiêm trọng khi tải model: {e}")
             logger.error(traceback.format_exc())
             raise
 
-        # Tải các gói NLTK cần thiết (quan trọng cho Docker chưa có data NLTK)
-        self._download_nltk_data()
-
-    def _download_nltk_data(self):
-        """Hàm phụ trợ để tải dữ liệu NLTK an toàn"""
-        required_packages = ['punkt', 'averaged_perceptron_tagger']
-        for package in required_packages:
-            try:
-                nltk.data.find(f'tokenizers/{package}' if package == 'punkt' else f'taggers/{package}')
-            except LookupError:
-                logger.info(f"Đang tải gói NLTK: {package}")
-                nltk.download(package, quiet=True)
+    def correct_text(self, text, max_length=128, context=None):
+        """
+        Sửa lỗi ngữ pháp cho từng câu trong văn bản.
 
-    def correct_text(self, text, max_length=128):
+        Args:
+            text (str): Văn bản cần sửa
+            max_length (int): Độ dài tối đa của câu sinh ra
+            context (RequestContext): Deadline/cờ huỷ của request (tuỳ chọn).
+                Khi hết hạn, các câu chưa sinh được giữ nguyên và
+                context.truncated được đặt True.
 
-        sentences = sent_tokenize(text)
+        Raises:
+            RequestCancelled: Khi request bị huỷ giữa chừng
+        """
+        segmented = segment(text)
 
-        corrected_sentences = []
+        # Join the corrected sentences
+        return " ".join(self.correct_sentences(segmented.sentences, max_length, context))
 
-       
+    def lookup(self, text, max_length=128, num_beams=None):
+        """Kết quả đã cache của một câu (không chạy model), hoặc None."""
+        if self.cache is None:
+            return None
+        num_beams = self.num_beams if num_beams is None else num_beams
+        return self.cache.get((normalize_sentence(text), max_length, num_beams))
 
-        for sentence in sentences:
+    def encode_sentences(self, sentences):
+        """
+        Điền token_ids cho các Sentence chưa có, bằng một lần gọi tokenizer
+        cho cả lô (tokenizer fast xử lý lô nhanh hơn gọi encode từng câu).
+        """
+        missing = [sentence for sentence in sentences if sentence.token_ids is None]
+        if missing:
+            encoded = self.tokenizer([GRAMMAR_PREFIX + sentence.text for sentence in missing])
+            for sentence, token_ids in zip(missing, encoded['input_ids']):
+                sentence.token_ids = token_ids
 
-            # For T5, we prefix the input with "grammar: "
+    def correct_sentences(self, sentences, max_length=128, context=None, batch_size=None, num_beams=None,
+                          speculative=None):
+        """
+        Sửa lỗi cho một danh sách câu đã tách sẵn.
+        Câu đã có trong cache (cùng max_length, num_beams) không chạy lại model;
+        câu trùng với một câu đang được sinh thì chờ kết quả đó (self.inflight).
+        Khi có model nhỏ, câu được định tuyến giữa hai model (models/routing.py);
+        num_beams/speculative áp dụng cho model lớn.
 
-            input_text = f"grammar: {sentence}"
+        Args:
+            sentences (list): Các câu (str hoặc Sentence của models.segmentation);
+                với Sentence, token_ids đã tính được dùng lại
+            batch_size (int): Số câu sinh cùng lúc trong một lần generate
+                (có đệm token); 1 = từng câu một. None = chia lô theo tổng số
+                token sau khi đệm, với ngân sách tự điều chỉnh theo độ trễ và
+                bộ nhớ trống (self.batch_budgets)
+            num_beams (int): Số beam khi sinh (1 = greedy); mặc định self.num_beams
+            speculative (bool): Với num_beams=1, giải mã greedy có bản nháp chép
+                từ câu gốc (cùng kết quả, ít lần forward hơn); mặc định self.speculative
 
-           
+        Returns:
+            list: Câu đã sửa, cùng thứ tự với `sentences`
+        """
+        from transformers import StoppingCriteriaList
 
-            # Tokenize and prepare for the model
+        num_beams = self.num_beams if num_beams is None else num_beams
+        speculative = self.speculative if speculative is None else speculative
 
-            input_ids = self.tokenizer.encode(input_text, return_tensors="pt").to(self.device)
+        corrected_sentences = [None] * len(sentences)
 
-           
+        stopping_criteria = None
+        if context is not None:
+            stopping_criteria = StoppingCriteriaList([RequestStoppingCriteria(context)])
 
-            # Generate corrected output
+        def key_of(item):
+            return (normalize_sentence(item.text), max_length, num_beams)
 
-            outputs = self.model.generate(
+        # Tra cache trước; chỉ các câu chưa có mới cần tokenize + generate.
+        # Câu trùng với một câu đang được sinh (ở request khác hoặc ngay
+        # trong request này) chờ kết quả đó thay vì sinh lại.
+        pending = []
+        claimed = []
+        waiting = []
+        for index, item in enumerate(sentences):
+            if isinstance(item, str):
+                item = Sentence(item, 0, len(item))
+            key = key_of(item)
+            cached = self.cache.get(key) if self.cache is not None else None
+            if cached is not None:
+                CORRECTION_CACHE.labels('hit').inc()
+                corrected_sentences[index] = cached
+                if self.analytics is not None:
+                    self.analytics.record(item.text, cached, 0.0, True)
+                continue
+            CORRECTION_CACHE.labels('miss').inc()
+            leader, call = self.inflight.claim(key)
+            if leader:
+                pending.append((index, item))
+                claimed.append((key, call))
+            else:
+                waiting.append((index, item, call))
 
-                input_ids=input_ids,
+        def finish(batch, decoded, latency_ms):
+            for (index, item), corrected in zip(batch, decoded):
+                corrected_sentences[index] = corrected
+                key = key_of(item)
+                if self.cache is not None:
+                    self.cache.put(key, corrected)
+                self.inflight.resolve(key, corrected)
+                if self.analytics is not None:
+                    self.analytics.record(item.text, corrected, latency_ms, False)
 
-                max_length=max_length,
+        def run(pending):
+            # Số token (tokenizer của model lớn) dùng để chia lô cho cả hai tầng
+            self.encode_sentences([item for _, item in pending])
 
-                num_beams=5,
+            # Định tuyến: câu ngắn/đơn giản thử model nhỏ trước, câu kém tự tin
+            # được sinh lại bằng model lớn cùng các câu còn lại
+            if self.router is not None and pending:
+                small, pending = self.router.split(pending)
+                batches = self._run_batches(
+                    small, batch_size, context, SMALL_TIER, corrected_sentences,
+                    lambda batch: self.router.generate(batch, max_length, stopping_criteria),
+                    num_beams=self.router.policy.small_num_beams
+                )
+                for batch, (decoded, confidences), latency_ms in batches:
+                    accepted = []
+                    for pair, corrected, confidence in zip(batch, decoded, confidences):
+                        if self.router.accept(confidence):
+                            accepted.append((pair, corrected))
+                        else:
+                            pending.append(pair)
+                    finish([pair for pair, _ in accepted], [corrected for _, corrected in accepted], latency_ms)
 
-                early_stopping=True
+            def generate(batch):
+                if speculative and num_beams == 1:
+                    return self._speculative_batch(batch, max_length, context)
+                return self._generate_batch(batch, max_length, num_beams, stopping_criteria, context)
 
+            # Giải mã speculative chạy từng câu một: chia lô theo token không có ích
+            batches = self._run_batches(
+                pending, (batch_size or 1) if speculative and num_beams == 1 else batch_size, context, LARGE_TIER,
+                corrected_sentences, generate, num_beams=num_beams
             )
+            for batch, decoded, latency_ms in batches:
+                finish(batch, decoded, latency_ms)
+
+        # Sinh các câu mình dẫn trước rồi mới chờ câu của request khác: hai
+        # request chờ chéo nhau không thể treo. Khoá chưa có kết quả (hết
+        # hạn, bị huỷ, lỗi) được trả lại để người chờ tự sinh.
+        try:
+            run(pending)
+        finally:
+            for key, call in claimed:
+                self.inflight.abandon(key, call)
+
+        retry = []
+        for index, item, call in waiting:
+            corrected = self.inflight.wait(call, context)
+            if corrected is not None:
+                corrected_sentences[index] = corrected
+                if self.analytics is not None:
+                    self.analytics.record(item.text, corrected, 0.0, True)
+            elif context is not None and context.expired:
+                context.truncated = True
+                corrected_sentences[index] = item.text
+            else:
+                retry.append((index, item))
+        if retry:
+            run(retry)
 
-           
+        return corrected_sentences
 
-            # Decode the generated tokens
+    def _run_batches(self, pending, batch_size, context, tier, corrected_sentences, generate, num_beams=1):
+        """
+        Chạy generate(batch) theo từng lô, yield (batch, kết quả, độ trễ mỗi câu ms).
 
-            corrected = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+        batch_size=None: lô được chia theo ngân sách token của tầng
+        (self.batch_budgets[tier]) và thời gian mỗi lô được báo lại để
+        điều chỉnh ngân sách.
 
-            corrected_sentences.append(corrected)
+        Lô bị bỏ qua vì request hết hạn hoặc bị dừng giữa chừng không được
+        yield: các câu của nó giữ nguyên văn bản gốc trong corrected_sentences.
+        """
+        def length_of(pair):
+            return len(pair[1].token_ids)
 
-       
+        # Gom các câu dài gần bằng nhau vào cùng lô để ít token đệm nhất
+        budget = self.batch_budgets[tier] if batch_size is None else None
+        if budget is not None or batch_size > 1:
+            pending = sorted(pending, key=length_of)
 
-        # Join the corrected sentences
+        if budget is not None:
+            # Tiến trình worker nhận tối đa max_batch câu mỗi lô
+            max_sentences = self.workers.max_batch if self.workers is not None and tier == LARGE_TIER else None
+            batches = plan_batches(pending, length_of, budget.budget, num_beams, max_sentences)
+        else:
+            batches = [pending[offset:offset + batch_size] for offset in range(0, len(pending), batch_size)]
+
+        for batch in batches:
+
+            # Hết hạn: bỏ qua các câu còn lại, giữ nguyên văn bản gốc
+            if context is not None:
+                context.raise_if_cancelled()
+                if context.expired:
+                    context.truncated = True
+                    for index, item in batch:
+                        corrected_sentences[index] = item.text
+                    continue
+
+            started = time.perf_counter()
+            result = generate(batch)
+
+            # generate bị dừng giữa chừng: kết quả dở dang, không dùng được
+            if context is not None and context.should_stop():
+                context.raise_if_cancelled()
+                context.truncated = True
+                for index, item in batch:
+                    corrected_sentences[index] = item.text
+                continue
+
+            seconds = time.perf_counter() - started
+            if budget is not None:
+                budget.observe(batch_cost([length_of(pair) for pair in batch], num_beams), seconds, len(batch))
+            GENERATE_SECONDS.labels(tier).observe(seconds)
+            GENERATED_SENTENCES.labels(tier).inc(len(batch))
+            yield batch, result, seconds * 1000 / len(batch)
+
+    def _encode(self, item, input_ids):
+        """
+        Kết quả encoder cho một câu, lấy từ encoder_cache nếu đã có.
+        Luôn trả về object mới vì generate() sửa encoder_outputs tại chỗ khi nhân beam.
+        """
+        import torch
+        from transformers.modeling_outputs import BaseModelOutput
+
+        key = tuple(item.token_ids)
+        hidden = self.encoder_cache.get(key) if self.encoder_cache is not None else None
+        if hidden is None:
+            with torch.no_grad():
+                hidden = self.model.get_encoder()(input_ids=input_ids).last_hidden_state
+            if self.encoder_cache is not None:
+                self.encoder_cache.put(key, hidden)
+        return BaseModelOutput(last_hidden_state=hidden)
+
+    def _generate_batch(self, batch, max_length, num_beams, stopping_criteria, context=None):
+        """Sinh một lô bằng model.generate (beam search hoặc greedy), tại chỗ hoặc trên worker."""
+        import torch
+
+        token_ids = [item.token_ids for _, item in batch]
+        if self.workers is not None and self.workers.accepts(token_ids, max_length):
+            remaining = context.remaining() if context is not None else None
+            # 0 nghĩa là "không giới hạn" với RequestContext của worker
+            timeout = max(remaining, 0.001) if remaining is not None else None
+            outputs = self.workers.generate(token_ids, max_length, num_beams, timeout=timeout, context=context)
+            return self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+        # For T5, the input is prefixed with "grammar: " (token_ids đã tính sẵn)
+        if len(batch) == 1:
+            item = batch[0][1]
+            inputs = {'input_ids': torch.tensor([item.token_ids], device=self.device)}
+            if self.encoder_cache is not None:
+                inputs['encoder_outputs'] = self._encode(item, inputs['input_ids'])
+        else:
+            inputs = self.tokenizer.pad(
+                {'input_ids': [item.token_ids for _, item in batch]}, return_tensors="pt"
+            ).to(self.device)
+
+        # Generate corrected output
+        outputs = self.model.generate(
+            **inputs,
+            max_length=max_length,
+            num_beams=num_beams,
+            early_stopping=num_beams > 1,
+            stopping_criteria=stopping_criteria
+        )
 
-        return " ".join(corrected_sentences)
+        # Decode the generated tokens
+        return self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+    def _speculative_batch(self, batch, max_length, context):
+        """Greedy với bản nháp chép từ câu gốc (xem models/decoding.py), từng câu một."""
+        import torch
+
+        should_stop = context.should_stop if context is not None else None
+        decoded = []
+        for _, item in batch:
+            input_ids = torch.tensor([item.token_ids], device=self.device)
+
+            # Kết quả của phiên bản trước (nếu có) là bản nháp tốt nhất cho phần
+            # câu chưa đổi; sau đó chép từ chính câu gốc
+            sources = [item.token_ids[self._prefix_length:]]
+            if item.previous:
+                sources.insert(0, self.tokenizer(item.previous)['input_ids'])
+
+            tokens, forward_passes = speculative_greedy(
+                self.model, input_ids, max_length=max_length, should_stop=should_stop,
+                encoder_outputs=self._encode(item, input_ids), draft_sources=sources
+            )
+            self.decode_stats['speculative_sentences'] += 1
+            self.decode_stats['speculative_tokens'] += len(tokens) - 1
+            self.decode_stats['speculative_forward_passes'] += forward_passes
+            decoded.append(self.tokenizer.decode(tokens, skip_special_tokens=True))
+        return decoded
     
     def identify_errors(self, original, corrected):
         errors = []
@@ -436,6 +955,9 @@ class GrammarCorrector:
         
         orig_lower = original.lower()
         corr_lower = corrected.lower()
+        # Tách từ một lần, dùng chung cho các kiểm tra bên dưới
+        orig_tokens = orig_lower.split()
+        corr_tokens = corr_lower.split()
         
         # Track whether the sentence has at least one identified error
         found_specific_error = False
@@ -460,16 +982,15 @@ class GrammarCorrector:
             found_specific_error = True
         
         # There are some more errors below.
-        #Spelling errors - use dedicated spell checker
-        spell = SpellChecker()
-        orig_words = orig_lower.split()
-        misspelled = list(spell.unknown(orig_words))
+        #Spelling errors - dùng chỉ mục chính tả (kèm gợi ý)
+        misspelled = self.spelling.unknown(orig_tokens)
         
         if misspelled:
             errors.append({
                 "original": original,
                 "corrected": corrected,
-                "error_type": f"spelling: {', '.join(misspelled)}"
+                "error_type": f"spelling: {', '.join(misspelled)}",
+                "suggestions": {word: self.spelling.suggest(word) for word in misspelled}
             })
             found_specific_error = True
 
@@ -543,8 +1064,8 @@ class GrammarCorrector:
             found_specific_error = True
         
         # Plural/singular noun errors
-        if any(re.search(rf'\b{word[:-1]}\b', corr_lower) for word in orig_lower.split() if word.endswith('s')) or \
-            any(re.search(rf'\b{word}s\b', corr_lower) for word in orig_lower.split()):
+        if any(re.search(rf'\b{word[:-1]}\b', corr_lower) for word in orig_tokens if word.endswith('s')) or \
+            any(re.search(rf'\b{word}s\b', corr_lower) for word in orig_tokens):
             errors.append({
                 "original": original,
                 "corrected": corrected,
@@ -564,7 +1085,7 @@ class GrammarCorrector:
             found_specific_error = True
         
         # Word order errors
-        if sorted(orig_lower.split()) == sorted(corr_lower.split()) and orig_lower.split() != corr_lower.split():
+        if sorted(orig_tokens) == sorted(corr_tokens) and orig_tokens != corr_tokens:
             errors.append({
                 "original": original,
                 "corrected": corrected,
@@ -582,9 +1103,9 @@ class GrammarCorrector:
             found_specific_error = True
         
         # Missing word errors
-        if len(original.split()) < len(corrected.split()):
-            orig_words = set(orig_lower.split())
-            corr_words = set(corr_lower.split())
+        if len(orig_tokens) < len(corr_tokens):
+            orig_words = set(orig_tokens)
+            corr_words = set(corr_tokens)
             missing = corr_words - orig_words
             if missing:
                 errors.append({
@@ -595,9 +1116,9 @@ class GrammarCorrector:
                 found_specific_error = True
         
         # Unnecessary word errors
-        if len(original.split()) > len(corrected.split()):
-            orig_words = set(orig_lower.split())
-            corr_words = set(corr_lower.split())
+        if len(orig_tokens) > len(corr_tokens):
+            orig_words = set(orig_tokens)
+            corr_words = set(corr_tokens)
             extra = orig_words - corr_words
             if extra:
                 errors.append({
@@ -629,21 +1150,6 @@ class GrammarCorrector:
         return errors
 
     # Helper function for spelling error detection
-    def levenshtein_distance(self, s1, s2):
-        """Calculate the Levenshtein distance between two strings."""
-        if len(s1) < len(s2):
-            return self.levenshtein_distance(s2, s1)
-        if len(s2) == 0:
-            return len(s1)
-        
-        previous_row = range(len(s2) + 1)
-        for i, c1 in enumerate(s1):
-            current_row = [i + 1]
-            for j, c2 in enumerate(s2):
-                insertions = previous_row[j + 1] + 1
-                deletions = current_row[j] + 1
-                substitutions = previous_row[j] + (c1 != c2)
-                current_row.append(min(insertions, deletions, substitutions))
-            previous_row = current_row
-        
-        return previous_row[-1]
\ No newline at end of file
+    def levenshtein_distance(self, s1, s2, max_distance=None):
+        """Calculate the Levenshtein distance between two strings (xem models.spelling.edit_distance)."""
+        return edit_distance(s1, s2, max_distance, transpositions=False)
\ No newline at end of file
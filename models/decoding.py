@@ -0,0 +1,128 @@
+"""Copy-based speculative decoding for encoder-decoder correction models."""
+
+# Số token tối đa đề xuất mỗi bước và độ dài n-gram dùng để dò vị trí trong câu gốc
+DRAFT_TOKENS = 8
+MAX_MATCH_NGRAM = 3
+
+
+def propose_draft(source_ids, generated_ids, max_tokens=DRAFT_TOKENS, max_ngram=MAX_MATCH_NGRAM):
+    """
+    Đề xuất các token tiếp theo bằng cách chép từ câu gốc.
+
+    Câu sửa phần lớn trùng câu gốc: tìm lần xuất hiện gần nhất của n-gram
+    cuối cùng đã sinh (n giảm dần từ max_ngram xuống 1) trong câu gốc và đề
+    xuất các token đứng ngay sau nó. Khi chưa sinh gì, đề xuất phần đầu câu.
+
+    Args:
+        source_ids (list): Token của đầu vào encoder
+        generated_ids (list): Token decoder đã chấp nhận (không gồm decoder_start)
+
+    Returns:
+        list: Tối đa max_tokens token đề xuất (có thể rỗng)
+    """
+    if not generated_ids:
+        return source_ids[:max_tokens]
+
+    for n in range(min(max_ngram, len(generated_ids)), 0, -1):
+        suffix = generated_ids[-n:]
+        # Duyệt từ cuối để ưu tiên vị trí gần nhất với phần đã sinh
+        for start in range(len(source_ids) - n, -1, -1):
+            if source_ids[start:start + n] == suffix:
+                continuation = source_ids[start + n:start + n + max_tokens]
+                if continuation:
+                    return continuation
+    return []
+
+
+def _crop_past(past_key_values, length):
+    """Giữ `length` vị trí đầu của cache self-attention (cache cross-attention không đổi)."""
+    return tuple(
+        (self_key[:, :, :length], self_value[:, :, :length]) + tuple(rest)
+        for self_key, self_value, *rest in past_key_values
+    )
+
+
+def speculative_greedy(model, input_ids, attention_mask=None, max_length=128,
+                       draft_tokens=DRAFT_TOKENS, should_stop=None, encoder_outputs=None,
+                       draft_sources=None):
+    """
+    Giải mã greedy với bản nháp chép từ câu gốc, cho đúng kết quả của
+    model.generate(num_beams=1) (với generation config không có logits
+    processor, như coedit).
+
+    Mỗi bước đưa token cuối đã chấp nhận + bản nháp vào decoder trong một lần
+    forward. Vì decoder là nhân quả, argmax tại mỗi vị trí chính là token
+    greedy nếu phần nháp phía trước đúng: chấp nhận phần nháp trùng khớp,
+    cộng thêm token argmax tại vị trí sai đầu tiên, rồi cắt KV cache về độ
+    dài đã chấp nhận. Câu ít lỗi cần ít lần forward hơn nhiều so với từng token.
+
+    Args:
+        input_ids: Tensor [1, seq] của encoder (chỉ hỗ trợ batch 1)
+        should_stop (callable): Trả True để dừng sớm (huỷ/hết hạn request)
+        encoder_outputs: Kết quả encoder đã tính sẵn (tuỳ chọn)
+        draft_sources (list): Các dãy token dùng để chép bản nháp, theo thứ tự
+            ưu tiên (ví dụ kết quả sửa của phiên bản trước của câu, rồi câu
+            gốc không kèm tiền tố "grammar: "); mặc định là input_ids.
+            Nguồn có bản nháp bị từ chối ngay token đầu sẽ bị đẩy xuống cuối.
+
+    Returns:
+        tuple: (list token đầu ra gồm decoder_start, số lần forward decoder)
+    """
+    import torch
+
+    config = model.config
+    eos_token_id = config.eos_token_id
+    # Giữ cả EOS cuối đầu vào để bản nháp có thể đề xuất kết thúc câu
+    sources = [list(source) for source in draft_sources] if draft_sources else [input_ids[0].tolist()]
+
+    with torch.no_grad():
+        if encoder_outputs is None:
+            encoder_outputs = model.get_encoder()(input_ids=input_ids, attention_mask=attention_mask)
+
+        generated = [config.decoder_start_token_id]
+        past_key_values = None
+        forward_passes = 0
+
+        while len(generated) < max_length:
+            if should_stop is not None and should_stop():
+                break
+
+            # Không đề xuất quá giới hạn độ dài
+            budget = max_length - len(generated) - 1
+            draft = []
+            for source in sources if budget > 0 else ():
+                draft = propose_draft(source, generated[1:], min(draft_tokens, budget))
+                if draft:
+                    break
+
+            cached = 0 if past_key_values is None else len(generated) - 1
+            decoder_input_ids = torch.tensor([generated[cached:] + draft], device=input_ids.device)
+            outputs = model(
+                encoder_outputs=encoder_outputs,
+                attention_mask=attention_mask,
+                decoder_input_ids=decoder_input_ids,
+                past_key_values=past_key_values,
+                use_cache=True,
+            )
+            forward_passes += 1
+
+            # predictions[i]: token greedy sau vị trí (cuối phần đã chấp nhận + draft[:i])
+            predictions = outputs.logits[0, -(len(draft) + 1):].argmax(-1).tolist()
+            accepted = 0
+            while accepted < len(draft) and draft[accepted] == predictions[accepted]:
+                if draft[accepted] == eos_token_id:
+                    break
+                accepted += 1
+            new_tokens = draft[:accepted] + [predictions[accepted]]
+            if draft and not accepted and len(sources) > 1:
+                sources.append(sources.pop(sources.index(source)))
+
+            # Cache hợp lệ cho mọi token đã chấp nhận trừ token mới nhất
+            past_key_values = _crop_past(outputs.past_key_values, len(generated) + accepted)
+
+            for token in new_tokens:
+                generated.append(token)
+                if token == eos_token_id or len(generated) >= max_length:
+                    return generated, forward_passes
+
+    return generated, forward_passes
@@ -0,0 +1,114 @@
+"""Bounded executor that runs model inference off the request threads."""
+
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class RejectedError(Exception):
+    """Yêu cầu bị từ chối trước khi chạy model (quá tải, vượt giới hạn...)."""
+
+    status_code = 503
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.message = message
+        self.retry_after = retry_after
+
+    def headers(self):
+        if self.retry_after is None:
+            return {}
+        return {'Retry-After': str(int(math.ceil(self.retry_after)))}
+
+    def to_dict(self):
+        return {'error': self.message, 'retry_after': self.retry_after}
+
+
+class QueueFullError(RejectedError):
+    """Hàng đợi inference đã đầy - client nên thử lại sau Retry-After giây."""
+
+    status_code = 429
+
+
+class InferenceExecutor:
+    """
+    Thread pool có giới hạn hàng đợi cho các tác vụ gọi model.
+
+    View đồng bộ (Flask) và route bất đồng bộ (ASGI) dùng chung executor này,
+    nên số request đang chờ model được giới hạn ở một chỗ duy nhất. Khi hàng
+    đợi đầy, submit() ném QueueFullError ngay lập tức thay vì để request
+    xếp hàng cho đến khi nginx timeout.
+    """
+
+    def __init__(self, max_workers=1, max_queue=32, name="inference"):
+        """
+        Args:
+            max_workers (int): Số luồng chạy model song song
+            max_queue (int): Số tác vụ tối đa được phép chờ ngoài số đang chạy
+            name (str): Tiền tố tên luồng
+        """
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._pending = 0
+        # Thời gian xử lý trung bình (EWMA, giây) dùng để ước lượng Retry-After
+        self._avg_service_time = 1.0
+
+    @property
+    def pending(self):
+        """Số tác vụ đang chạy hoặc đang chờ."""
+        return self._pending
+
+    @property
+    def avg_service_time(self):
+        return self._avg_service_time
+
+    def retry_after(self):
+        """Ước lượng số giây cần chờ để hàng đợi hiện tại được xử lý hết."""
+        waves = self._pending / max(self.max_workers, 1)
+        return max(1, int(math.ceil(waves * self._avg_service_time)))
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Đưa một tác vụ vào hàng đợi model.
+
+        Returns:
+            concurrent.futures.Future: Kết quả của fn(*args, **kwargs)
+
+        Raises:
+            QueueFullError: Khi số tác vụ đang chờ đã chạm giới hạn
+        """
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                raise QueueFullError("Inference queue is full", retry_after=self.retry_after())
+            self._pending += 1
+
+        try:
+            future = self._pool.submit(self._run, fn, args, kwargs)
+        except Exception:
+            self._release(None)
+            raise
+        # Giảm bộ đếm cả khi future bị huỷ trước khi kịp chạy
+        future.add_done_callback(self._release)
+        return future
+
+    def _run(self, fn, args, kwargs):
+        start = time.monotonic()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.monotonic() - start
+            with self._lock:
+                self._avg_service_time = 0.8 * self._avg_service_time + 0.2 * elapsed
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
@@ -0,0 +1,258 @@
+"""Per-user correction history in SQLite, written by a background batching writer."""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import zlib
+
+from models.response import sentence_edits
+
+logger = logging.getLogger(__name__)
+
+# Văn bản dài hơn ngưỡng này được nén zlib (lưu dạng BLOB)
+COMPRESS_MIN_BYTES = 256
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS corrections (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    created_at INTEGER NOT NULL,
+    text BLOB NOT NULL,
+    edits TEXT NOT NULL,
+    error_count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS corrections_user_id ON corrections (user_id, id);
+"""
+
+# Chỉ mục toàn văn contentless: không lưu văn bản lần thứ hai. Cột owner
+# ("u<user_id>") giới hạn kết quả ngay trong FTS thay vì lọc sau.
+_FTS_SCHEMA = "CREATE VIRTUAL TABLE IF NOT EXISTS corrections_fts USING fts5(owner, text, content='')"
+
+
+def document_edits(text, spans, corrected_sentences):
+    """
+    Chỉnh sửa của cả văn bản, ghép từ diff từng câu (nhanh hơn diff toàn văn).
+
+    Returns:
+        list: [start, end, replacement] theo offset trong text, tăng dần
+    """
+    edits = []
+    for (start, end), corrected in zip(spans, corrected_sentences):
+        for edit_start, edit_end, replacement in sentence_edits(text[start:end], corrected):
+            edits.append([start + edit_start, start + edit_end, replacement])
+    return edits
+
+
+def apply_edits(text, edits):
+    """Văn bản đã sửa từ văn bản gốc và danh sách edits (document_edits)."""
+    parts = []
+    position = 0
+    for start, end, replacement in edits:
+        parts.append(text[position:start])
+        parts.append(replacement)
+        position = end
+    parts.append(text[position:])
+    return "".join(parts)
+
+
+def _pack_text(text):
+    data = text.encode('utf-8')
+    if len(data) >= COMPRESS_MIN_BYTES:
+        return sqlite3.Binary(zlib.compress(data, 6))
+    return text
+
+
+def _unpack_text(value):
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode('utf-8')
+    return value
+
+
+def _match_expression(user_id, query):
+    """Biểu thức MATCH: mọi từ của query (từ cuối khớp tiền tố), chỉ trong lịch sử của user."""
+    terms = ['"' + term.replace('"', '""') + '"' for term in query.split()]
+    if not terms:
+        return None
+    terms[-1] += '*'
+    return f'owner:"u{int(user_id)}" AND text:({" ".join(terms)})'
+
+
+class HistoryStore:
+    """
+    Lịch sử kiểm tra của từng người dùng.
+
+    record() chỉ đưa bản ghi vào hàng đợi (đầy thì bỏ và đếm vào
+    `dropped`), nên /correct không bao giờ chờ đĩa. Luồng nền tính diff và
+    ghi theo nhóm: mỗi transaction gồm tối đa max_batch bản ghi, SQLite ở
+    chế độ WAL nên các request đọc lịch sử không bị chặn trong lúc ghi.
+
+    Mỗi dòng lưu văn bản gốc (nén nếu dài) và các chỉnh sửa, không lưu văn
+    bản đã sửa. Phân trang theo khoá (id < before) trên chỉ mục
+    (user_id, id), tìm kiếm bằng FTS5 nếu SQLite hỗ trợ.
+    """
+
+    def __init__(self, path, flush_interval=1.0, max_batch=500, max_queue=10000):
+        """
+        Args:
+            path (str): File SQLite
+            flush_interval (float): Số giây tối đa một bản ghi chờ trước khi được ghi
+            max_batch (int): Số bản ghi tối đa mỗi transaction
+            max_queue (int): Số bản ghi tối đa chờ trong hàng đợi
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.fts = False
+        self.written = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            connection = self._connect()
+            connection.executescript(_SCHEMA)
+            try:
+                connection.execute(_FTS_SCHEMA)
+                self.fts = True
+            except sqlite3.OperationalError as e:
+                logger.warning(f"SQLite không hỗ trợ FTS5, tìm kiếm lịch sử dùng LIKE: {e}")
+            connection.commit()
+            self._thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def record(self, user_id, text, spans, corrected_sentences):
+        """Ghi nhận một lần kiểm tra (không chặn); diff được tính ở luồng nền."""
+        if self._thread is None:
+            return
+        try:
+            self._queue.put_nowait((int(time.time()), user_id, text, list(spans), list(corrected_sentences)))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout=10.0):
+        """Ghi nốt hàng đợi rồi dừng luồng nền."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(None)
+        thread.join(timeout)
+
+    def entries(self, user_id, before=None, limit=20, query=None):
+        """
+        Lịch sử mới nhất trước, tối đa `limit` mục có id < before.
+
+        Returns:
+            list: [{id, created_at, text, corrected, edits, error_count}]
+        """
+        connection = self._reader()
+        query = (query or '').strip()
+        before = before if before is not None else (1 << 62)
+        if query and self.fts:
+            match = _match_expression(user_id, query)
+            rows = connection.execute(
+                "SELECT c.id, c.created_at, c.text, c.edits, c.error_count "
+                "FROM corrections_fts JOIN corrections c ON c.id = corrections_fts.rowid "
+                "WHERE corrections_fts MATCH ? AND corrections_fts.rowid < ? "
+                "ORDER BY corrections_fts.rowid DESC LIMIT ?",
+                (match, before, limit)
+            ).fetchall() if match else []
+        elif query:
+            # Không có FTS5: chỉ tìm được trong văn bản không nén
+            rows = connection.execute(
+                "SELECT id, created_at, text, edits, error_count FROM corrections "
+                "WHERE user_id = ? AND id < ? AND text LIKE ? ORDER BY id DESC LIMIT ?",
+                (user_id, before, f"%{query}%", limit)
+            ).fetchall()
+        else:
+            rows = connection.execute(
+                "SELECT id, created_at, text, edits, error_count FROM corrections "
+                "WHERE user_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                (user_id, before, limit)
+            ).fetchall()
+
+        items = []
+        for row_id, created_at, text, edits, error_count in rows:
+            text = _unpack_text(text)
+            edits = json.loads(edits)
+            items.append({
+                'id': row_id,
+                'created_at': created_at,
+                'text': text,
+                'corrected': apply_edits(text, edits),
+                'edits': edits,
+                'error_count': error_count,
+            })
+        return items
+
+    def stats(self):
+        return {'queued': self._queue.qsize(), 'written': self.written, 'dropped': self.dropped}
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _reader(self):
+        # Mỗi luồng request một kết nối đọc riêng (sqlite3 không chia sẻ kết nối giữa các luồng)
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+
+    def _run(self):
+        connection = self._connect()
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            # Gom thêm bản ghi đến khi đủ lô hoặc hết flush_interval
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= self.max_batch:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0.0))
+                except queue.Empty:
+                    break
+            if item is None:
+                stopping = True
+            if batch:
+                self._write(connection, batch)
+        connection.close()
+
+    def _write(self, connection, batch):
+        try:
+            with connection:
+                for created_at, user_id, text, spans, corrected_sentences in batch:
+                    edits = document_edits(text, spans, corrected_sentences)
+                    cursor = connection.execute(
+                        "INSERT INTO corrections (user_id, created_at, text, edits, error_count) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (user_id, created_at, _pack_text(text),
+                         json.dumps(edits, ensure_ascii=False, separators=(',', ':')), len(edits))
+                    )
+                    if self.fts:
+                        connection.execute(
+                            "INSERT INTO corrections_fts (rowid, owner, text) VALUES (?, ?, ?)",
+                            (cursor.lastrowid, f"u{user_id}", text)
+                        )
+            self.written += len(batch)
+        except sqlite3.Error as e:
+            self.dropped += len(batch)
+            logger.error(f"Không ghi được lịch sử sửa lỗi: {e}")
@@ -0,0 +1,139 @@
+"""Background model loading and warm-up with readiness reporting."""
+
+import logging
+import threading
+import time
+import traceback
+
+from models.executor import RejectedError
+
+logger = logging.getLogger(__name__)
+
+
+class ModelNotReadyError(RejectedError):
+    """Model chưa tải/warm-up xong - replica chưa sẵn sàng nhận traffic."""
+
+    status_code = 503
+
+
+class ModelLoader:
+    """
+    Tải model trong luồng nền để server có thể lắng nghe ngay khi khởi động.
+
+    Quá trình gồm các giai đoạn: tải model -> warm-up -> ready. Warm-up chạy
+    một loạt câu đại diện qua toàn bộ pipeline để khởi tạo kernel, dữ liệu
+    NLTK... trước khi replica báo /readyz, nhờ vậy request thật đầu tiên
+    không phải trả chi phí khởi động nguội.
+    """
+
+    # Tỉ lệ tiến độ khi bắt đầu mỗi giai đoạn
+    STAGE_PROGRESS = {
+        'pending': 0.0,
+        'loading_model': 0.05,
+        'warming_up': 0.7,
+        'ready': 1.0,
+    }
+
+    def __init__(self, factory, warmup=None, warmup_inputs=()):
+        """
+        Args:
+            factory (callable): Hàm không tham số trả về model đã tải
+            warmup (callable): Hàm warmup(model, text) chạy một input đại diện
+            warmup_inputs (list): Danh sách input dùng để warm-up
+        """
+        self._factory = factory
+        self._warmup = warmup
+        self._warmup_inputs = list(warmup_inputs)
+        self._model = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stage = 'pending'
+        self.progress = 0.0
+        self.error = None
+        self._started_at = None
+        self._ready_at = None
+
+    @property
+    def ready(self):
+        return self.stage == 'ready'
+
+    @property
+    def failed(self):
+        return self.stage == 'failed'
+
+    def start(self):
+        """Bắt đầu tải model trong luồng nền (gọi nhiều lần không sao)."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._started_at = time.monotonic()
+            self._thread = threading.Thread(target=self._load, name="model-loader", daemon=True)
+            self._thread.start()
+
+    def wait(self, timeout=None):
+        """Chờ cho đến khi tải xong (dùng cho script/CLI)."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.ready
+
+    def get(self):
+        """
+        Trả về model đã sẵn sàng.
+
+        Raises:
+            ModelNotReadyError: Khi model đang tải/warm-up hoặc tải thất bại
+        """
+        if not self.ready:
+            raise ModelNotReadyError(f"Model is not ready ({self.stage})", retry_after=5)
+        return self._model
+
+    def status(self):
+        """Thông tin tiến độ cho /readyz."""
+        now = time.monotonic()
+        status = {
+            'status': self.stage,
+            'progress': round(self.progress, 3),
+        }
+        if self._started_at is not None:
+            end = self._ready_at or now
+            status['elapsed_seconds'] = round(end - self._started_at, 2)
+        if self.error:
+            status['error'] = self.error
+        return status
+
+    def _set_stage(self, stage):
+        self.stage = stage
+        self.progress = self.STAGE_PROGRESS.get(stage, self.progress)
+        logger.info(f"Model loader: {stage} ({self.progress:.0%})")
+
+    def _load(self):
+        try:
+            self._set_stage('loading_model')
+            model = self._factory()
+
+            self._set_stage('warming_up')
+            self._run_warmup(model)
+
+            self._model = model
+            self._ready_at = time.monotonic()
+            self._set_stage('ready')
+        except Exception as e:
+            self.error = str(e)
+            self.stage = 'failed'
+            logger.error(f"Lỗi khi tải model: {e}")
+            logger.error(traceback.format_exc())
+
+    def _run_warmup(self, model):
+        if self._warmup is None or not self._warmup_inputs:
+            return
+        start_progress = self.progress
+        span = 1.0 - start_progress
+        total = len(self._warmup_inputs)
+        for i, item in enumerate(self._warmup_inputs):
+            try:
+                self._warmup(model, item)
+            except Exception as e:
+                # Warm-up lỗi không được làm replica chết, chỉ ghi log
+                logger.warning(f"Warm-up input failed: {e}")
+            # Giữ progress < 1.0 cho đến khi thật sự ready
+            self.progress = start_progress + span * (i + 1) / (total + 1)
@@ -0,0 +1,90 @@
+"""Prometheus metrics exported by the API process."""
+
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+except ImportError:
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+    Counter = Gauge = Histogram = generate_latest = None
+
+
+class _NoopMetric:
+    """Thay thế metric khi chưa cài prometheus_client: mọi thao tác đều bỏ qua."""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+def _metric(kind, *args, **kwargs):
+    return kind(*args, **kwargs) if kind is not None else _NoopMetric()
+
+
+# Thời gian sinh mỗi lô (giây); lô speculative/beam đều tính theo tầng model
+GENERATE_SECONDS = _metric(
+    Histogram, 'grammar_generate_seconds', 'Thời gian sinh một lô câu theo tầng model', ['tier'],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+GENERATED_SENTENCES = _metric(
+    Counter, 'grammar_generated_sentences_total', 'Số câu đã chạy qua model theo tầng', ['tier']
+)
+ROUTED_SENTENCES = _metric(
+    Counter, 'grammar_routed_sentences_total', 'Quyết định định tuyến theo tầng và lý do', ['tier', 'reason']
+)
+ESCALATED_SENTENCES = _metric(
+    Counter, 'grammar_escalated_sentences_total', 'Câu model nhỏ không đủ tự tin, chuyển sang model lớn'
+)
+TIER_CONFIDENCE = _metric(
+    Histogram, 'grammar_tier_confidence', 'Log-xác suất trung bình mỗi token của kết quả model nhỏ', ['tier'],
+    buckets=(-2.0, -1.0, -0.5, -0.3, -0.2, -0.1, -0.05, -0.02, 0.0)
+)
+CORRECTION_CACHE = _metric(
+    Counter, 'grammar_correction_cache_total', 'Tra cache kết quả từng câu khi sửa lỗi', ['result']
+)
+COALESCED_SENTENCES = _metric(
+    Counter, 'grammar_coalesced_sentences_total', 'Câu chờ kết quả của một lần sinh trùng đang chạy thay vì tự sinh'
+)
+
+# Ngân sách token mỗi lô (models/batching.py), tự điều chỉnh theo độ trễ và bộ nhớ trống
+BATCH_TOKEN_BUDGET = _metric(
+    Gauge, 'grammar_batch_token_budget', 'Số token tối đa (tính cả đệm và beam) của một lô sinh', ['tier']
+)
+
+# Mức degradation hiện tại của bộ điều khiển quá tải (0 = đầy đủ, xem models/overload.py)
+OVERLOAD_LEVEL = _metric(
+    Gauge, 'grammar_overload_level', 'Mức giảm chất lượng đang áp dụng khi quá tải'
+)
+
+# Băm mật khẩu trên executor riêng (models/auth.py)
+AUTH_HASH_SECONDS = _metric(
+    Histogram, 'grammar_auth_hash_seconds', 'Thời gian một phép băm/kiểm tra mật khẩu', ['operation'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+AUTH_HASH_PENDING = _metric(
+    Gauge, 'grammar_auth_hash_pending', 'Số phép băm mật khẩu đang chạy hoặc chờ'
+)
+AUTH_HASH_REJECTED = _metric(
+    Counter, 'grammar_auth_hash_rejected_total', 'Phép băm mật khẩu bị từ chối do hàng đợi đầy', ['operation']
+)
+AUTH_USER_CACHE = _metric(
+    Counter, 'grammar_auth_user_cache_total', 'Tra cứu người dùng theo kết quả cache', ['result']
+)
+
+# Số lô đang chạy/chờ trên từng tiến trình model (models/workers.py)
+WORKER_INFLIGHT = _metric(
+    Gauge, 'grammar_worker_inflight_batches', 'Số lô đang xử lý trên mỗi worker model', ['worker']
+)
+
+
+def render():
+    """Nội dung cho route /metrics: (body, content type)."""
+    if generate_latest is None:
+        return b"# prometheus_client is not installed\n", CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
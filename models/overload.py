@@ -0,0 +1,135 @@
+"""Overload controller that steps through degradation modes."""
+
+import logging
+import threading
+import time
+
+from models.metrics import OVERLOAD_LEVEL
+
+logger = logging.getLogger(__name__)
+
+
+class DegradationMode:
+    """Một mức chất lượng: có phân tích POS không, số beam, có gọi model không."""
+
+    __slots__ = ('level', 'name', 'analyze_pos', 'num_beams', 'use_model')
+
+    def __init__(self, level, name, analyze_pos=True, num_beams=None, use_model=True):
+        self.level = level
+        self.name = name
+        self.analyze_pos = analyze_pos
+        # None = số beam mặc định của model
+        self.num_beams = num_beams
+        self.use_model = use_model
+
+    def __repr__(self):
+        return f"DegradationMode({self.level}, {self.name!r})"
+
+
+def degradation_modes(reduced_beams=2):
+    """Các mức từ đầy đủ đến chỉ dùng cache/bộ luật, theo thứ tự giảm dần chi phí."""
+    return (
+        DegradationMode(0, 'full'),
+        DegradationMode(1, 'no_pos', analyze_pos=False),
+        DegradationMode(2, 'fewer_beams', analyze_pos=False, num_beams=reduced_beams),
+        DegradationMode(3, 'greedy', analyze_pos=False, num_beams=1),
+        DegradationMode(4, 'cached', analyze_pos=False, use_model=False),
+    )
+
+
+class OverloadController:
+    """
+    Chọn mức degradation theo độ đầy hàng đợi inference và độ trễ thực tế.
+
+    Áp lực = max(số tác vụ đang chờ / sức chứa executor, độ trễ EWMA / SLO).
+    Áp lực >= high_watermark thì tăng một mức (tối đa mỗi step_up_interval
+    giây); <= low_watermark đủ lâu (step_down_interval) thì giảm một mức.
+    Hai ngưỡng và hai khoảng thời gian khác nhau tránh dao động qua lại.
+    """
+
+    def __init__(self, executor, latency_slo=5.0, high_watermark=0.75, low_watermark=0.3,
+                 step_up_interval=2.0, step_down_interval=10.0, reduced_beams=2, max_level=4,
+                 enabled=True):
+        """
+        Args:
+            executor (InferenceExecutor): Hàng đợi model cần theo dõi
+            latency_slo (float): Độ trễ mục tiêu của /correct (giây, tính cả thời gian chờ)
+            reduced_beams (int): Số beam ở mức 'fewer_beams'
+            max_level (int): Mức cao nhất được phép (4 = chỉ cache/bộ luật)
+            enabled (bool): False = luôn chạy đầy đủ
+        """
+        self.executor = executor
+        self.latency_slo = latency_slo
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.step_up_interval = step_up_interval
+        self.step_down_interval = step_down_interval
+        self.modes = degradation_modes(reduced_beams)
+        self.max_level = min(max_level, len(self.modes) - 1) if enabled else 0
+        self._lock = threading.Lock()
+        self._level = 0
+        self._changed_at = time.monotonic()
+        self._latency = 0.0
+        OVERLOAD_LEVEL.set(0)
+
+    @property
+    def level(self):
+        return self._level
+
+    def observe(self, latency):
+        """Ghi nhận độ trễ (giây) của một request đã xong."""
+        with self._lock:
+            self._latency = 0.8 * self._latency + 0.2 * latency
+
+    def pressure(self):
+        capacity = max(self.executor.max_workers + self.executor.max_queue, 1)
+        queue_pressure = self.executor.pending / capacity
+        latency_pressure = self._latency / self.latency_slo if self.latency_slo else 0.0
+        return max(queue_pressure, latency_pressure)
+
+    def mode(self):
+        """
+        Mức áp dụng cho request sắp chạy (đánh giá lại áp lực ở mỗi lần gọi).
+
+        Ở mức chỉ cache/bộ luật, nơi giữ kết quả lâu dài (phiên tài liệu
+        incremental) phải đánh dấu kết quả để sửa lại bằng model khi hết quá tải.
+        """
+        return self._evaluate()
+
+    def _evaluate(self):
+        if self.max_level == 0:
+            return self.modes[0]
+        pressure = self.pressure()
+        now = time.monotonic()
+        with self._lock:
+            elapsed = now - self._changed_at
+            level = self._level
+            if pressure >= self.high_watermark and level < self.max_level and elapsed >= self.step_up_interval:
+                level += 1
+            elif pressure <= self.low_watermark and level > 0 and elapsed >= self.step_down_interval:
+                level -= 1
+            if level != self._level:
+                logger.warning(
+                    f"Overload: {self.modes[self._level].name} -> {self.modes[level].name} "
+                    f"(áp lực {pressure:.2f})"
+                )
+                self._level = level
+                self._changed_at = now
+                OVERLOAD_LEVEL.set(level)
+            return self.modes[level]
+
+    def cache_beams(self, default_beams):
+        """Số beam có thể đã được dùng cho kết quả trong cache, ưu tiên chất lượng cao nhất."""
+        beams = [default_beams]
+        for mode in self.modes:
+            if mode.num_beams is not None and mode.num_beams not in beams:
+                beams.append(mode.num_beams)
+        return beams
+
+    def stats(self):
+        return {
+            'level': self._level,
+            'mode': self.modes[self._level].name,
+            'pressure': round(self.pressure(), 3),
+            'latency_ewma': round(self._latency, 3),
+        }
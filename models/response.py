@@ -0,0 +1,155 @@
+"""Compact /correct responses, ETags and content negotiation for compression."""
+
+import difflib
+import gzip
+import hashlib
+import json
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Tăng khi định dạng response thay đổi để ETag cũ không còn khớp
+RESPONSE_FORMAT_VERSION = 1
+
+# Body nhỏ hơn ngưỡng này thì nén không đáng (header + CPU > byte tiết kiệm)
+MIN_COMPRESS_BYTES = 1024
+
+
+def sentence_hash(sentence):
+    """Hash ngắn, ổn định của một câu - client dùng để báo các câu đã có."""
+    return hashlib.blake2b(sentence.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def sentence_edits(original, corrected):
+    """
+    Các chỉnh sửa tối thiểu biến `original` thành `corrected`.
+
+    Returns:
+        list: [start, end, replacement] với offset tương đối trong câu gốc
+    """
+    if original == corrected:
+        return []
+    matcher = difflib.SequenceMatcher(None, original, corrected, autojunk=False)
+    return [
+        [i1, i2, corrected[j1:j2]]
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != 'equal'
+    ]
+
+
+def compact_result(text, spans, corrected_sentences, known=(), analysis=None, structure=None, partial=False,
+                   spelling=None):
+    """
+    Dạng rút gọn của kết quả /correct: chỉ trả delta theo từng câu.
+
+    Mỗi câu là {"s": start, "e": end, "h": hash, "edits": [...]} với s/e là
+    offset trong văn bản gốc và edits tương đối theo đầu câu. Với các câu mà
+    client đã có (hash nằm trong `known`), "edits" được bỏ đi - client dùng lại
+    kết quả cũ và chỉ cần vị trí mới. Không lặp lại message/corrected_text.
+
+    Args:
+        text (str): Văn bản gốc
+        spans (list): [(start, end)] của từng câu trong text
+        corrected_sentences (list): Câu đã sửa tương ứng với spans
+        known (iterable): Hash các câu client đã có kết quả
+        spelling (dict): Từ lạ -> danh sách gợi ý (SpellingIndex.suggest_many)
+    """
+    known = set(known)
+    sentences = []
+    for (start, end), corrected in zip(spans, corrected_sentences):
+        original = text[start:end]
+        digest = sentence_hash(original)
+        entry = {'s': start, 'e': end, 'h': digest}
+        if digest not in known:
+            entry['edits'] = sentence_edits(original, corrected)
+        sentences.append(entry)
+
+    result = {
+        'format': 'compact',
+        'sentences': sentences,
+        'partial': partial,
+    }
+    if analysis is not None:
+        # [word, pos] thay cho {"word": ..., "pos": ...}
+        result['analysis'] = [
+            [item.get('word'), item.get('pos')] for item in analysis if isinstance(item, dict)
+        ]
+    if structure is not None:
+        result['structure'] = structure
+    if spelling:
+        result['spelling'] = spelling
+    return result
+
+
+def request_etag(*parts):
+    """
+    ETag yếu tính từ nội dung request (văn bản, chế độ, phiên bản model...).
+    Yếu vì cùng một ETag được gửi cho body br, gzip và không nén.
+    """
+    digest = hashlib.sha256()
+    digest.update(str(RESPONSE_FORMAT_VERSION).encode('utf-8'))
+    for part in parts:
+        digest.update(b'\x00')
+        digest.update(str(part).encode('utf-8'))
+    return 'W/"' + digest.hexdigest()[:32] + '"'
+
+
+def _opaque_tag(etag):
+    etag = etag.strip()
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def etag_matches(if_none_match, etag):
+    """
+    So khớp header If-None-Match (có thể chứa nhiều ETag) theo kiểu so sánh
+    yếu. Không nhận '*': kết quả được tính từ văn bản gửi lên, "có bất kỳ
+    bản nào" không nói được client đã có đúng kết quả cho văn bản này.
+    """
+    if not if_none_match:
+        return False
+    tag = _opaque_tag(etag)
+    return any(_opaque_tag(candidate) == tag for candidate in if_none_match.split(',') if candidate.strip() != '*')
+
+
+def choose_encoding(accept_encoding):
+    """Chọn thuật toán nén tốt nhất mà client chấp nhận: br > gzip > không nén."""
+    accepted = {}
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.lower()] = quality
+
+    if brotli is not None and accepted.get('br', 0) > 0:
+        return 'br'
+    if accepted.get('gzip', 0) > 0:
+        return 'gzip'
+    return None
+
+
+def encode_json(payload, accept_encoding=None):
+    """
+    Serialize payload thành JSON gọn và nén theo Accept-Encoding.
+
+    Returns:
+        tuple: (body bytes, dict header)
+    """
+    body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    headers = {'Content-Type': 'application/json', 'Vary': 'Accept-Encoding'}
+
+    encoding = choose_encoding(accept_encoding) if len(body) >= MIN_COMPRESS_BYTES else None
+    if encoding == 'br':
+        body = brotli.compress(body, quality=4)
+        headers['Content-Encoding'] = 'br'
+    elif encoding == 'gzip':
+        body = gzip.compress(body, compresslevel=5)
+        headers['Content-Encoding'] = 'gzip'
+    return body, headers
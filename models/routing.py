@@ -0,0 +1,153 @@
+"""Per-sentence routing between a small and a large correction model."""
+
+import threading
+
+from models.metrics import ESCALATED_SENTENCES, ROUTED_SENTENCES, TIER_CONFIDENCE
+from models.segmentation import GRAMMAR_PREFIX
+
+SMALL_TIER = 'small'
+LARGE_TIER = 'large'
+
+
+class RoutingPolicy:
+    """
+    Quy tắc chọn model cho từng câu.
+
+    - Câu ngắn (<= short_words từ) đi model nhỏ.
+    - Câu dài (> max_small_words từ) đi thẳng model lớn.
+    - Câu ở giữa đi model nhỏ nếu bảng CYK của PartOfSpeechAnalyzer phủ được
+      cả câu (câu nằm trong ngữ pháp, nhiều khả năng không có lỗi), ngược lại
+      đi model lớn.
+    - Kết quả model nhỏ có log-xác suất trung bình mỗi token thấp hơn
+      min_confidence được sinh lại bằng model lớn.
+    """
+
+    def __init__(self, short_words=12, max_small_words=30, trust_parser=True, min_confidence=-0.15,
+                 small_num_beams=1):
+        """
+        Args:
+            short_words (int): Câu có tối đa số từ này luôn đi model nhỏ
+            max_small_words (int): Câu dài hơn số từ này luôn đi model lớn
+            trust_parser (bool): Câu ở giữa hai ngưỡng mà CYK parse được thì đi model nhỏ
+            min_confidence (float): Ngưỡng log-xác suất trung bình mỗi token để
+                chấp nhận kết quả model nhỏ (0 = luôn chuyển lên model lớn)
+            small_num_beams (int): Số beam của model nhỏ (1 = greedy)
+        """
+        self.short_words = short_words
+        self.max_small_words = max_small_words
+        self.trust_parser = trust_parser
+        self.min_confidence = min_confidence
+        self.small_num_beams = small_num_beams
+
+    def choose(self, sentence, is_well_formed=None):
+        """
+        Args:
+            sentence (Sentence): Câu cần sửa (models.segmentation)
+            is_well_formed (callable): is_well_formed(tokens) -> bool, chỉ được
+                gọi với câu nằm giữa hai ngưỡng độ dài
+
+        Returns:
+            tuple: (tầng model, lý do)
+        """
+        words = sentence.words
+        if len(words) <= self.short_words:
+            return SMALL_TIER, 'short'
+        if len(words) > self.max_small_words:
+            return LARGE_TIER, 'long'
+        if self.trust_parser and is_well_formed is not None \
+                and is_well_formed([word.lower() for word in words]):
+            return SMALL_TIER, 'parsed'
+        return LARGE_TIER, 'complex'
+
+    def accept(self, confidence):
+        return confidence >= self.min_confidence
+
+
+class ModelRouter:
+    """
+    Tầng model nhỏ cùng chính sách định tuyến; GrammarCorrector giữ model lớn.
+
+    split() chia các câu chờ sinh thành hai nhóm; nhóm nhỏ được sinh bằng
+    generate() (kèm độ tự tin), câu nào không được accept() thì quay lại
+    nhóm model lớn.
+    """
+
+    def __init__(self, model, tokenizer, policy=None, device="cpu", is_well_formed=None):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.policy = policy or RoutingPolicy()
+        self.device = device
+        self.is_well_formed = is_well_formed
+        self._lock = threading.Lock()
+        self._counts = {SMALL_TIER: 0, LARGE_TIER: 0, 'escalated': 0}
+
+    def split(self, pending):
+        """
+        Args:
+            pending (list): [(index, Sentence)] các câu chưa có trong cache
+
+        Returns:
+            tuple: (câu cho model nhỏ, câu cho model lớn), cùng định dạng pending
+        """
+        small, large = [], []
+        for index, item in pending:
+            tier, reason = self.policy.choose(item, self.is_well_formed)
+            ROUTED_SENTENCES.labels(tier, reason).inc()
+            (small if tier == SMALL_TIER else large).append((index, item))
+        with self._lock:
+            self._counts[SMALL_TIER] += len(small)
+            self._counts[LARGE_TIER] += len(large)
+        return small, large
+
+    def accept(self, confidence):
+        TIER_CONFIDENCE.labels(SMALL_TIER).observe(confidence)
+        if self.policy.accept(confidence):
+            return True
+        ESCALATED_SENTENCES.inc()
+        with self._lock:
+            self._counts['escalated'] += 1
+        return False
+
+    def generate(self, batch, max_length, stopping_criteria=None):
+        """
+        Sinh một lô bằng model nhỏ.
+
+        Returns:
+            tuple: (câu đã sửa, log-xác suất trung bình mỗi token của từng câu)
+        """
+        import torch
+
+        num_beams = self.policy.small_num_beams
+        inputs = self.tokenizer(
+            [GRAMMAR_PREFIX + item.text for _, item in batch], padding=True, return_tensors="pt"
+        ).to(self.device)
+        with torch.no_grad():
+            outputs = self.model.generate(
+                **inputs,
+                max_length=max_length,
+                num_beams=num_beams,
+                early_stopping=num_beams > 1,
+                stopping_criteria=stopping_criteria,
+                output_scores=True,
+                return_dict_in_generate=True,
+            )
+
+        sequences = outputs.sequences
+        if num_beams > 1:
+            # Beam search đã tính sẵn log-xác suất chuẩn hoá theo độ dài
+            confidences = outputs.sequences_scores.tolist()
+        else:
+            scores = self.model.compute_transition_scores(sequences, outputs.scores, normalize_logits=True)
+            # Bỏ token đệm sau EOS của các câu kết thúc sớm
+            mask = sequences[:, 1:] != self.tokenizer.pad_token_id
+            scores = torch.where(mask, scores, torch.zeros_like(scores))
+            confidences = (scores.sum(dim=1) / mask.sum(dim=1).clamp(min=1)).tolist()
+
+        return self.tokenizer.batch_decode(sequences, skip_special_tokens=True), confidences
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+        routed = counts[SMALL_TIER] + counts[LARGE_TIER]
+        counts['small_share'] = round(counts[SMALL_TIER] / routed, 4) if routed else 0.0
+        return counts
@@ -0,0 +1,224 @@
+"""Deterministic rule engine for high-frequency grammar errors."""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Tên nhóm trong pattern của luật được đổi thành r<i>_<tên> khi gộp
+_GROUP_NAME = re.compile(r"\(\?P<(\w+)>|\(\?P=(\w+)\)")
+_TEMPLATE_NAME = re.compile(r"\\g<(\w+)>")
+
+
+class Rule:
+    """Một luật: pattern (regex), phần thay thế (chuỗi/bảng theo từ) và thông báo."""
+
+    __slots__ = ('rule_id', 'category', 'pattern', 'replacement', 'message', 'preserve_case', 'after',
+                 'not_after')
+
+    def __init__(self, rule_id, pattern, replacement, category='grammar', message='', preserve_case=True,
+                 after=(), not_after=None):
+        self.rule_id = rule_id
+        self.pattern = pattern
+        self.after = tuple(after)
+        self.not_after = not_after
+        self.replacement = replacement
+        self.category = category
+        self.message = message
+        self.preserve_case = preserve_case
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data['id'], data['pattern'], data['replacement'],
+            category=data.get('category', 'grammar'),
+            message=data.get('message', ''),
+            preserve_case=data.get('preserve_case', True),
+            after=data.get('after', ()),
+            not_after=data.get('not_after'),
+        )
+
+    def compiled_pattern(self):
+        """
+        Pattern kèm điều kiện "đứng ngay sau một trong các từ `after`"
+        (lookbehind): từ đứng trước không bị tiêu thụ nên các luật khác vẫn
+        áp dụng được cho nó (ví dụ "i is" -> "I am").
+        """
+        if not self.after:
+            return self.pattern
+        lookbehind = "|".join(f"(?<=\\b{re.escape(word)}\\s)" for word in self.after)
+        return f"(?:{lookbehind}){self.pattern}"
+
+
+def _match_case(original, replacement):
+    if original.isupper() and len(original) > 1:
+        return replacement.upper()
+    if original[:1].isupper():
+        return replacement[:1].upper() + replacement[1:]
+    return replacement
+
+
+class RuleEngine:
+    """
+    Áp dụng mọi luật trong một lần quét: các pattern được gộp thành một
+    regex duy nhất (mỗi luật là một nhánh có tên r<i>), nên chi phí gần như
+    không đổi theo số luật và không cần gọi model.
+
+    Mỗi pattern phải bắt đầu tại đầu một từ. Pattern có nhóm (?P<fix>...)
+    thì chỉ phần đó được thay, không có thì thay cả đoạn khớp. replacement
+    là chuỗi (hỗ trợ \\g<tên>) hoặc bảng {từ gốc chữ thường: từ thay}.
+
+    not_after (tuỳ chọn) là regex phân biệt hoa thường, khớp với phần văn
+    bản ngay trước chỗ khớp thì luật bị bỏ qua (ngữ cảnh dài, độ rộng thay
+    đổi mà lookbehind không diễn đạt được, vd. "World War I is").
+    """
+
+    # Số ký tự phía trước được đưa vào kiểm tra not_after
+    CONTEXT_CHARS = 80
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self._not_after = [
+            re.compile(f"(?:{rule.not_after})\\Z") if rule.not_after else None for rule in self.rules
+        ]
+        branches = []
+        for index, rule in enumerate(self.rules):
+            prefix = f"r{index}_"
+            pattern = _GROUP_NAME.sub(
+                lambda m: f"(?P<{prefix}{m.group(1)}>" if m.group(1) else f"(?P={prefix}{m.group(2)})",
+                rule.compiled_pattern()
+            )
+            branches.append(f"(?P<r{index}>{pattern})")
+        # Mọi luật bắt đầu tại đầu một từ: kiểm tra \b trước giúp regex bỏ
+        # qua nhanh các vị trí giữa từ (nhanh hơn vài lần). Không có luật thì
+        # regex không bao giờ khớp.
+        combined = "|".join(branches)
+        self._regex = re.compile(rf"\b(?=\w)(?:{combined})" if branches else r"(?!)", re.IGNORECASE)
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        Raises:
+            OSError, ValueError, re.error: Khi không đọc được file hoặc luật sai
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(Rule.from_dict(item) for item in data.get('rules', []))
+
+    def apply(self, text):
+        """
+        Returns:
+            tuple: (văn bản đã sửa, danh sách sửa đổi theo offset của text gốc)
+        """
+        edits = []
+        for match in self._regex.finditer(text):
+            edit = self._edit(match)
+            if edit is not None:
+                edits.append(edit)
+
+        if not edits:
+            return text, edits
+        parts = []
+        position = 0
+        for edit in edits:
+            parts.append(text[position:edit['start_index']])
+            parts.append(edit['correction'])
+            position = edit['end_index']
+        parts.append(text[position:])
+        return "".join(parts), edits
+
+    def _edit(self, match):
+        name = match.lastgroup
+        index = int(name[1:])
+        rule = self.rules[index]
+        prefix = f"r{index}_"
+
+        fix_group = prefix + "fix"
+        if match.re.groupindex.get(fix_group) and match.group(fix_group) is not None:
+            start, end = match.span(fix_group)
+        else:
+            start, end = match.span(name)
+        original = match.string[start:end]
+
+        not_after = self._not_after[index]
+        if not_after is not None:
+            match_start = match.start(name)
+            if not_after.search(match.string, max(0, match_start - self.CONTEXT_CHARS), match_start):
+                return None
+
+        if isinstance(rule.replacement, dict):
+            replacement = rule.replacement.get(original.lower())
+            if replacement is None:
+                # Khoảng trắng trong cụm ("do  not") được chuẩn hoá trước khi tra
+                replacement = rule.replacement.get(" ".join(original.lower().split()))
+            if replacement is None:
+                return None
+        else:
+            template = _TEMPLATE_NAME.sub(lambda m: f"\\g<{prefix}{m.group(1)}>", rule.replacement)
+            replacement = match.expand(template)
+
+        if rule.preserve_case:
+            replacement = _match_case(original, replacement)
+        if replacement == original:
+            return None
+        return {
+            'type': 'grammar',
+            'original': original,
+            'correction': replacement,
+            'start_index': start,
+            'end_index': end,
+            'message': rule.message or f"Change '{original}' to '{replacement}'",
+            'rule': rule.rule_id,
+            'category': rule.category,
+        }
+
+
+class RuleSet:
+    """
+    RuleEngine nạp từ file dữ liệu, tự nạp lại khi file thay đổi (kiểm tra
+    mtime tối đa mỗi check_interval giây) để chỉnh luật không cần deploy.
+    Luật mới bị lỗi thì giữ bộ luật cũ và ghi log.
+    """
+
+    def __init__(self, path, check_interval=5.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._engine = RuleEngine(())
+        self._mtime = None
+        self._checked_at = 0.0
+        self.reload()
+
+    @property
+    def engine(self):
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            self.reload()
+        return self._engine
+
+    def reload(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return False
+        with self._lock:
+            if mtime == self._mtime:
+                return False
+            try:
+                engine = RuleEngine.from_file(self.path)
+            except (OSError, ValueError, KeyError, re.error) as e:
+                logger.error(f"Không nạp được luật từ {self.path}: {e}")
+                self._mtime = mtime
+                return False
+            self._engine = engine
+            self._mtime = mtime
+        logger.info(f"Đã nạp {len(engine.rules)} luật ngữ pháp từ {self.path}")
+        return True
+
+    def apply(self, text):
+        return self.engine.apply(text)
@@ -0,0 +1,133 @@
+"""Shared sentence segmentation and tokenization, run once per request."""
+
+import threading
+
+# Tiền tố T5 của coedit cho tác vụ sửa ngữ pháp
+GRAMMAR_PREFIX = "grammar: "
+
+# Dấu kết thúc câu bị bỏ khi phân tích cấu trúc (giống analyze_sentence cũ)
+END_PUNCTUATION = ('.', '?', '!')
+
+
+class Sentence:
+    """
+    Một câu trong văn bản kèm offset và các kết quả tách từ dùng chung.
+
+    Các thuộc tính `words`/`word_spans` được tính lười một lần; `token_ids`
+    (token HuggingFace của "grammar: <câu>") được GrammarCorrector điền khi cần.
+    `previous` là kết quả sửa của phiên bản trước của câu này (nếu biết),
+    dùng làm bản nháp khi giải mã speculative.
+    """
+
+    __slots__ = ('text', 'start', 'end', '_word_spans', 'token_ids', 'previous')
+
+    def __init__(self, text, start, end):
+        self.text = text
+        self.start = start
+        self.end = end
+        self._word_spans = None
+        self.token_ids = None
+        self.previous = None
+
+    @property
+    def word_spans(self):
+        """[(start, end)] của từng từ, offset tương đối trong câu."""
+        if self._word_spans is None:
+            self._word_spans = list(get_segmenter().word_tokenizer.span_tokenize(self.text))
+        return self._word_spans
+
+    @property
+    def words(self):
+        return [self.text[start:end] for start, end in self.word_spans]
+
+    def __repr__(self):
+        return f"Sentence({self.start}, {self.end}, {self.text!r})"
+
+
+class SegmentedText:
+    """Kết quả tách câu/tách từ của một văn bản, dùng chung cho mọi bước phía sau."""
+
+    def __init__(self, text, sentences):
+        self.text = text
+        self.sentences = sentences
+
+    @property
+    def spans(self):
+        return [(sentence.start, sentence.end) for sentence in self.sentences]
+
+    @property
+    def texts(self):
+        return [sentence.text for sentence in self.sentences]
+
+    def words(self):
+        """Tất cả các từ của văn bản (tương đương nltk.word_tokenize(text))."""
+        return [word for sentence in self.sentences for word in sentence.words]
+
+    def analysis_sentences(self):
+        """
+        Token cho PartOfSpeechAnalyzer theo từng câu: chữ thường, bỏ dấu kết
+        thúc của câu cuối cùng.
+        """
+        sentences = [[word.lower() for word in sentence.words] for sentence in self.sentences]
+        if sentences and sentences[-1] and sentences[-1][-1] in END_PUNCTUATION:
+            sentences[-1] = sentences[-1][:-1]
+        return sentences
+
+    def analysis_tokens(self):
+        """Như analysis_sentences() nhưng gộp thành một danh sách token."""
+        return [word for words in self.analysis_sentences() for word in words]
+
+    def __len__(self):
+        return len(self.sentences)
+
+    def __iter__(self):
+        return iter(self.sentences)
+
+
+class Segmenter:
+    """
+    Bộ tách câu (Punkt) và tách từ (Treebank/NLTK) được tải một lần cho cả
+    tiến trình.
+    """
+
+    def __init__(self):
+        import nltk
+        from nltk.tokenize import NLTKWordTokenizer
+
+        self.sentence_tokenizer = nltk.data.load('tokenizers/punkt/english.pickle')
+        self.word_tokenizer = NLTKWordTokenizer()
+
+    def spans(self, text):
+        """[(start, end)] của từng câu (cùng kết quả với nltk.sent_tokenize)."""
+        return list(self.sentence_tokenizer.span_tokenize(text))
+
+    def segment(self, text):
+        sentences = [Sentence(text[start:end], start, end) for start, end in self.spans(text)]
+        return SegmentedText(text, sentences)
+
+
+_segmenter = None
+_segmenter_lock = threading.Lock()
+
+
+def get_segmenter():
+    """Segmenter dùng chung cho cả tiến trình (tải model Punkt một lần)."""
+    global _segmenter
+    if _segmenter is None:
+        with _segmenter_lock:
+            if _segmenter is None:
+                _segmenter = Segmenter()
+    return _segmenter
+
+
+def segment(text):
+    """Tách câu + chuẩn bị tách từ cho một văn bản."""
+    return get_segmenter().segment(text)
+
+
+def sentence_spans(text):
+    """
+    Tách câu kèm offset: [(start, end)] sao cho text[start:end] là từng câu
+    (cùng kết quả với nltk.sent_tokenize).
+    """
+    return get_segmenter().spans(text)
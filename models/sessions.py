@@ -0,0 +1,206 @@
+"""Per-document sessions for the incremental editor protocol."""
+
+import bisect
+import threading
+import time
+from collections import OrderedDict
+
+from models.executor import RejectedError
+
+
+class SessionConflictError(RejectedError):
+    """Phiên bản client không khớp với server - client phải gửi lại toàn văn."""
+
+    status_code = 409
+
+    def __init__(self, message, version=None):
+        super().__init__(message)
+        self.version = version
+
+    def to_dict(self):
+        return {'error': 'resync', 'message': self.message, 'version': self.version}
+
+
+def apply_ops(text, ops):
+    """
+    Áp dụng lần lượt các thao tác sửa {start, end, text} lên văn bản.
+    Offset của mỗi thao tác tính trên văn bản sau thao tác trước đó.
+
+    Raises:
+        ValueError: Khi thao tác không hợp lệ
+    """
+    for op in ops:
+        start, end, insert = op.get('start'), op.get('end'), op.get('text', '')
+        if not isinstance(start, int) or not isinstance(end, int) or not isinstance(insert, str):
+            raise ValueError("Each op needs integer start/end and string text")
+        if not 0 <= start <= end <= len(text):
+            raise ValueError(f"Op range [{start}, {end}) is outside the document")
+        text = text[:start] + insert + text[end:]
+    return text
+
+
+def common_affix_lengths(old, new):
+    """
+    Độ dài phần đầu và phần cuối chung của hai chuỗi (không chồng lên nhau).
+
+    Dùng tìm kiếm nhị phân trên phép so sánh slice (memcmp ở tầng C) nên
+    nhanh hơn nhiều so với so từng ký tự bằng vòng lặp Python.
+    """
+    limit = min(len(old), len(new))
+
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if old[:mid] == new[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    prefix = lo
+
+    lo, hi = 0, limit - prefix
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if old[len(old) - mid:] == new[len(new) - mid:]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return prefix, lo
+
+
+class DocumentSession:
+    """
+    Trạng thái của một tài liệu đang được soạn: văn bản, phân đoạn câu và
+    kết quả sửa của từng câu ({'s', 'e', 'h', 'corrected', 'edits'}).
+    """
+
+    # Ước lượng chi phí bộ nhớ cố định cho mỗi câu (dict + chuỗi nhỏ)
+    SENTENCE_OVERHEAD_BYTES = 400
+
+    def __init__(self, document_id):
+        self.document_id = document_id
+        self.version = 0
+        self.text = ''
+        self.sentences = []
+        # time.monotonic() của lần ghi lịch sử gần nhất (None = chưa ghi)
+        self.recorded_at = None
+        self.lock = threading.Lock()
+
+    def size_bytes(self):
+        corrected = sum(len(entry['corrected']) for entry in self.sentences)
+        return 2 * (len(self.text) + corrected) + self.SENTENCE_OVERHEAD_BYTES * len(self.sentences)
+
+    def plan_update(self, new_text, segment, full=False):
+        """
+        Xác định vùng cần tách câu lại khi văn bản đổi thành `new_text`.
+
+        Các câu nằm hoàn toàn trong phần đầu/cuối không đổi được giữ nguyên
+        (phần cuối chỉ dịch offset); thêm một câu đệm mỗi bên vì ranh giới
+        câu của Punkt phụ thuộc ngữ cảnh lân cận.
+
+        Không thay đổi phiên: chỉ commit() mới ghi nhận kết quả, nên một cập
+        nhật bị từ chối giữa chừng giữ nguyên phiên bản cũ.
+
+        Args:
+            segment (callable): segment(text) -> [(start, end)]
+            full (bool): Đồng bộ lại toàn văn - thay toàn bộ các câu cũ
+
+        Returns:
+            tuple: (first, removed, spans, delta) - thay self.sentences[first:first+removed]
+                bằng các câu tại `spans` (offset trong new_text); các câu phía sau
+                dịch đi `delta` ký tự.
+        """
+        if full:
+            return 0, len(self.sentences), list(segment(new_text)), len(new_text) - len(self.text)
+
+        old = self.text
+        prefix, suffix = common_affix_lengths(old, new_text)
+        delta = len(new_text) - len(old)
+        changed_end = len(old) - suffix
+
+        ends = [entry['e'] for entry in self.sentences]
+        starts = [entry['s'] for entry in self.sentences]
+        count = len(self.sentences)
+
+        first = max(bisect.bisect_right(ends, prefix) - 1, 0)
+        last = min(bisect.bisect_left(starts, changed_end) + 1, count)
+        last = max(last, first)
+
+        region_start = self.sentences[first - 1]['e'] if first > 0 else 0
+        region_end = self.sentences[last]['s'] + delta if last < count else len(new_text)
+
+        spans = [
+            (region_start + start, region_start + end)
+            for start, end in segment(new_text[region_start:region_end])
+        ]
+        return first, last - first, spans, delta
+
+    def commit(self, new_text, first, removed, entries, delta):
+        """Ghi nhận kết quả của plan_update và tăng version."""
+        tail = self.sentences[first + removed:]
+        for entry in tail:
+            entry['s'] += delta
+            entry['e'] += delta
+        self.sentences = self.sentences[:first] + entries + tail
+        self.text = new_text
+        self.version += 1
+
+
+class DocumentSessionStore:
+    """
+    Kho phiên tài liệu có giới hạn: hết hạn theo TTL và loại bỏ theo LRU
+    khi vượt số phiên hoặc tổng bộ nhớ ước lượng.
+    """
+
+    def __init__(self, max_sessions=5000, max_bytes=256 * 1024 * 1024, ttl=1800):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # key -> (session, last_access, size_bytes)
+        self._sessions = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get_or_create(self, key, document_id):
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            item = self._sessions.pop(key, None)
+            if item is None:
+                session, size = DocumentSession(document_id), 0
+            else:
+                session, _, size = item
+            self._sessions[key] = (session, now, size)
+            return session
+
+    def account(self, key, session):
+        """Cập nhật kích thước của phiên sau khi thay đổi, rồi loại bỏ nếu vượt giới hạn."""
+        size = session.size_bytes()
+        with self._lock:
+            item = self._sessions.get(key)
+            if item is None or item[0] is not session:
+                return
+            self._total_bytes += size - item[2]
+            self._sessions[key] = (session, time.monotonic(), size)
+            self._sessions.move_to_end(key)
+            self._evict()
+
+    def stats(self):
+        return {'sessions': len(self._sessions), 'bytes': self._total_bytes}
+
+    def _expire(self, now):
+        # OrderedDict xếp theo lần truy cập cuối: phiên cũ nhất ở đầu
+        while self._sessions:
+            key, (session, last_access, size) = next(iter(self._sessions.items()))
+            if now - last_access < self.ttl:
+                break
+            self._drop(key)
+
+    def _evict(self):
+        while self._sessions and (
+            len(self._sessions) > self.max_sessions or self._total_bytes > self.max_bytes
+        ):
+            self._drop(next(iter(self._sessions)))
+
+    def _drop(self, key):
+        _, _, size = self._sessions.pop(key)
+        self._total_bytes -= size
@@ -0,0 +1,103 @@
+"""Single-flight deduplication of identical in-flight generations."""
+
+import threading
+
+from models.metrics import COALESCED_SENTENCES
+
+
+def normalize_sentence(text):
+    """Khoá so khớp câu: bỏ khác biệt khoảng trắng (tokenizer cũng bỏ qua chúng)."""
+    return " ".join(text.split())
+
+
+class _Call:
+    __slots__ = ('done', 'value', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Gộp các lần sinh trùng nhau đang chạy đồng thời.
+
+    Request đầu tiên claim một khoá là "leader" và phải resolve (hoặc
+    abandon) nó; các request claim cùng khoá trong lúc đó chỉ chờ kết quả
+    của leader thay vì gọi model.generate lần nữa. Khoá được xoá ngay khi
+    có kết quả: từ đó câu được phục vụ bởi cache kết quả.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    def claim(self, key):
+        """
+        Returns:
+            tuple: (leader, call) - leader=True nếu người gọi phải tự sinh
+                rồi resolve/abandon khoá; ngược lại chờ call bằng wait()
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                COALESCED_SENTENCES.inc()
+                return False, call
+            call = self._calls[key] = _Call()
+            self.leaders += 1
+            return True, call
+
+    def resolve(self, key, value):
+        with self._lock:
+            call = self._calls.pop(key, None)
+        if call is not None:
+            call.value = value
+            call.done.set()
+
+    def abandon(self, key, call):
+        """
+        Leader không sinh được (hết hạn/bị huỷ): người chờ nhận None và tự
+        sinh. Không làm gì nếu call đã được resolve.
+        """
+        with self._lock:
+            if self._calls.get(key) is not call:
+                return
+            del self._calls[key]
+            if call.waiters:
+                self.abandoned += 1
+        call.done.set()
+
+    @staticmethod
+    def wait(call, context=None, poll_interval=0.05):
+        """
+        Chờ kết quả của leader, kiểm tra deadline/cờ huỷ của request chờ.
+
+        Returns:
+            str hoặc None: Kết quả; None khi leader bỏ dở hoặc request chờ đã hết hạn
+
+        Raises:
+            RequestCancelled: Khi request chờ bị huỷ
+        """
+        while not call.done.wait(poll_interval if context is not None else None):
+            context.raise_if_cancelled()
+            if context.expired:
+                return None
+        return call.value
+
+    def __len__(self):
+        return len(self._calls)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'inflight': len(self._calls),
+                'leaders': self.leaders,
+                'coalesced': self.coalesced,
+                'abandoned': self.abandoned,
+            }
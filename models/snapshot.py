@@ -0,0 +1,212 @@
+"""Correction cache snapshots on disk and warm-start from past traffic."""
+
+import atexit
+import glob
+import json
+import logging
+import mmap
+import os
+import socket
+import struct
+import threading
+import time
+from collections import Counter
+
+from models.admission import RequestContext
+from models.segmentation import segment
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b"GCSNAP01"
+# Mỗi bản ghi: độ dài câu, độ dài kết quả (byte UTF-8), max_length, num_beams
+_RECORD = struct.Struct("<IIHH")
+_HEADER_LENGTH = struct.Struct("<I")
+
+
+def save_snapshot(cache, path, model_version):
+    """
+    Ghi toàn bộ cache ra file nhị phân gọn (ghi file tạm rồi đổi tên, nên
+    nhiều replica ghi chung một volume không làm hỏng file).
+
+    Các bản ghi giữ thứ tự LRU (cũ trước), nạp lại theo thứ tự đó cho ra
+    đúng thứ tự ưu tiên giữ lại như trước khi tắt.
+
+    Returns:
+        int: Số câu đã ghi
+    """
+    records = []
+    for key, corrected in cache.items():
+        text, max_length, num_beams = key
+        text_bytes = text.encode('utf-8')
+        corrected_bytes = corrected.encode('utf-8')
+        records.append(_RECORD.pack(len(text_bytes), len(corrected_bytes), max_length, num_beams))
+        records.append(text_bytes)
+        records.append(corrected_bytes)
+    count = len(records) // 3
+
+    header = json.dumps({'model_version': model_version, 'entries': count, 'created': time.time()}).encode('utf-8')
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    temp_path = os.path.join(directory, f".{os.path.basename(path)}.{socket.gethostname()}-{os.getpid()}.tmp")
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(SNAPSHOT_MAGIC)
+            f.write(_HEADER_LENGTH.pack(len(header)))
+            f.write(header)
+            f.writelines(records)
+        os.replace(temp_path, path)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return count
+
+
+def load_snapshot(cache, path, model_version):
+    """
+    Nạp snapshot vào cache bằng mmap (không đọc cả file vào bộ nhớ trước).
+    Snapshot của phiên bản model khác bị bỏ qua.
+
+    Returns:
+        int: Số câu đã nạp (0 nếu không có file hoặc khác phiên bản model)
+
+    Raises:
+        ValueError: Khi file không đúng định dạng
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return 0
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        if data[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a cache snapshot")
+        offset = len(SNAPSHOT_MAGIC)
+        (header_length,) = _HEADER_LENGTH.unpack_from(data, offset)
+        offset += _HEADER_LENGTH.size
+        header = json.loads(bytes(data[offset:offset + header_length]))
+        offset += header_length
+
+        if header.get('model_version') != model_version:
+            logger.info(
+                f"Bỏ qua snapshot cache {path}: model {header.get('model_version')} khác {model_version}"
+            )
+            return 0
+
+        count = 0
+        size = len(data)
+        while offset < size:
+            if offset + _RECORD.size > size:
+                raise ValueError(f"Truncated cache snapshot {path}")
+            text_length, corrected_length, max_length, num_beams = _RECORD.unpack_from(data, offset)
+            offset += _RECORD.size
+            end = offset + text_length + corrected_length
+            if end > size:
+                raise ValueError(f"Truncated cache snapshot {path}")
+            text = data[offset:offset + text_length].decode('utf-8')
+            corrected = data[offset + text_length:end].decode('utf-8')
+            cache.put((text, max_length, num_beams), corrected)
+            offset = end
+            count += 1
+    return count
+
+
+def frequent_sentences(pattern, limit=5000, min_count=2):
+    """
+    Các câu xuất hiện nhiều nhất trong log traffic cũ.
+
+    Args:
+        pattern (str): Đường dẫn hoặc glob tới các file JSON lines; mỗi dòng
+            là body của một request /correct (cần trường "text")
+        limit (int): Số câu tối đa trả về
+        min_count (int): Bỏ các câu xuất hiện ít hơn số lần này
+
+    Returns:
+        list: Câu, từ phổ biến nhất
+    """
+    counts = Counter()
+    for path in sorted(glob.glob(pattern)):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    text = record.get('text') if isinstance(record, dict) else None
+                    if isinstance(text, str) and text.strip():
+                        counts.update(sentence.text for sentence in segment(text.strip()).sentences)
+        except OSError as e:
+            logger.warning(f"Không đọc được log traffic {path}: {e}")
+    return [sentence for sentence, count in counts.most_common(limit) if count >= min_count]
+
+
+def prewarm_cache(model, sentences, time_budget=120.0, chunk_size=64):
+    """
+    Chạy trước các câu chưa có trong cache qua model, trong giới hạn thời gian
+    (mỗi lần chunk_size câu, model tự chia lô theo ngân sách token).
+
+    Returns:
+        int: Số câu đã sinh
+    """
+    missing = [sentence for sentence in sentences if model.lookup(sentence) is None]
+    context = RequestContext(timeout=time_budget)
+    generated = 0
+    for offset in range(0, len(missing), chunk_size):
+        if context.expired:
+            logger.info(f"Hết thời gian làm nóng cache sau {generated}/{len(missing)} câu")
+            break
+        chunk = missing[offset:offset + chunk_size]
+        model.correct_sentences(chunk, context=context)
+        generated += len(chunk)
+    return generated
+
+
+class CacheSnapshotter:
+    """
+    Ghi snapshot cache định kỳ (chỉ khi cache đã đổi) và khi tiến trình
+    dừng, để replica mới của lần deploy sau khởi động với cache nóng.
+    """
+
+    def __init__(self, cache, path, model_version, interval=300.0):
+        self.cache = cache
+        self.path = path
+        self.model_version = model_version
+        self.interval = interval
+        self._saved_writes = cache.writes
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='cache-snapshot', daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def save(self):
+        """Ghi snapshot nếu cache đã đổi kể từ lần ghi trước."""
+        writes = self.cache.writes
+        if writes == self._saved_writes:
+            return 0
+        try:
+            started = time.perf_counter()
+            count = save_snapshot(self.cache, self.path, self.model_version)
+        except OSError as e:
+            logger.warning(f"Không ghi được snapshot cache {self.path}: {e}")
+            return 0
+        self._saved_writes = writes
+        logger.info(f"Đã ghi {count} câu vào snapshot cache ({time.perf_counter() - started:.2f}s)")
+        return count
+
+    def close(self):
+        """Dừng luồng nền và ghi snapshot lần cuối."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stop.set()
+        thread.join()
+        self.save()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.save()
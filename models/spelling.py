@@ -0,0 +1,261 @@
+"""Indexed spelling suggestions (SymSpell-style deletion dictionary)."""
+
+import logging
+import os
+import pickle
+import threading
+
+from models.cache import CorrectionCache
+
+logger = logging.getLogger(__name__)
+
+# Tăng khi định dạng file chỉ mục thay đổi (file cũ sẽ được dựng lại)
+INDEX_FORMAT = 1
+
+
+def edit_distance(a, b, max_distance=None, transpositions=True):
+    """
+    Khoảng cách chỉnh sửa giữa hai chuỗi (Damerau kiểu OSA: đổi chỗ hai ký
+    tự liền nhau tính là một lỗi; transpositions=False cho Levenshtein).
+
+    Với max_distance, chỉ tính trong dải |i - j| <= max_distance và dừng
+    ngay khi cả một hàng đã vượt ngưỡng: chi phí O(max_distance * len)
+    thay vì O(len^2).
+
+    Returns:
+        int: Khoảng cách, hoặc max_distance + 1 nếu vượt ngưỡng
+    """
+    if a == b:
+        return 0
+    if len(a) > len(b):
+        a, b = b, a
+
+    # Bỏ tiền tố và hậu tố chung
+    start = 0
+    while start < len(a) and a[start] == b[start]:
+        start += 1
+    end_a, end_b = len(a), len(b)
+    while end_a > start and a[end_a - 1] == b[end_b - 1]:
+        end_a -= 1
+        end_b -= 1
+    a, b = a[start:end_a], b[start:end_b]
+
+    n, m = len(a), len(b)
+    if max_distance is None:
+        max_distance = m
+    too_far = max_distance + 1
+    if m - n > max_distance:
+        return too_far
+    if n == 0:
+        return m
+
+    before = None
+    previous = list(range(m + 1))
+    for i in range(1, n + 1):
+        char_a = a[i - 1]
+        low = max(1, i - max_distance)
+        high = min(m, i + max_distance)
+        current = [too_far] * (m + 1)
+        current[0] = i if i <= max_distance else too_far
+        row_min = current[0] if low == 1 else too_far
+
+        for j in range(low, high + 1):
+            char_b = b[j - 1]
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+            if transpositions and i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b:
+                value = min(value, before[j - 2] + 1)
+            current[j] = value
+            if value < row_min:
+                row_min = value
+
+        if row_min > max_distance:
+            return too_far
+        before, previous = previous, current
+
+    return previous[m] if previous[m] <= max_distance else too_far
+
+
+def _deletes(word, max_distance):
+    """Mọi chuỗi thu được khi xoá tối đa max_distance ký tự của word."""
+    result = set()
+    frontier = [word]
+    for _ in range(max_distance):
+        next_frontier = []
+        for item in frontier:
+            if len(item) <= 1:
+                continue
+            for k in range(len(item)):
+                deleted = item[:k] + item[k + 1:]
+                if deleted not in result:
+                    result.add(deleted)
+                    next_frontier.append(deleted)
+        frontier = next_frontier
+    return result
+
+
+class SpellingIndex:
+    """
+    Gợi ý sửa chính tả theo kiểu SymSpell.
+
+    Mỗi từ trong từ vựng (theo tần suất) sinh các chuỗi "xoá tối đa
+    max_distance ký tự" của prefix_length ký tự đầu; tra một từ lạ chỉ cần
+    sinh các chuỗi xoá của chính nó, lấy ứng viên chung khoá rồi kiểm tra
+    bằng edit_distance có ngưỡng. Không phải so với toàn bộ từ điển.
+
+    Chỉ mục được dựng một lần rồi lưu bằng pickle (xem get_spelling_index).
+    """
+
+    def __init__(self, vocabulary, max_distance=2, prefix_length=7, max_index_words=60000, memo_size=20000):
+        """
+        Args:
+            vocabulary (dict): Từ (chữ thường) -> tần suất; dùng để nhận biết từ lạ
+            max_distance (int): Khoảng cách chỉnh sửa tối đa của gợi ý
+            prefix_length (int): Số ký tự đầu dùng để sinh khoá (giới hạn kích thước chỉ mục)
+            max_index_words (int): Chỉ đưa các từ phổ biến nhất vào chỉ mục gợi ý
+            memo_size (int): Số từ lạ nhớ sẵn kết quả gợi ý
+        """
+        self.vocabulary = vocabulary
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.memo_size = memo_size
+
+        ranked = sorted(vocabulary.items(), key=lambda item: item[1], reverse=True)[:max_index_words]
+        self.words = [word for word, _ in ranked]
+        self.counts = [count for _, count in ranked]
+
+        index = {}
+        for word_id, word in enumerate(self.words):
+            prefix = word[:prefix_length]
+            for key in _deletes(prefix, max_distance) | {prefix}:
+                index.setdefault(key, []).append(word_id)
+        # tuple gọn hơn list khi lưu và nạp lại
+        self.index = {key: tuple(ids) for key, ids in index.items()}
+        self._memo = CorrectionCache(memo_size)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_memo']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._memo = CorrectionCache(self.memo_size)
+
+    def save(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        temp_path = os.path.join(directory, f".{os.path.basename(path)}.tmp")
+        with open(temp_path, "wb") as f:
+            pickle.dump((INDEX_FORMAT, self), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Raises:
+            ValueError: Khi file được ghi bởi định dạng chỉ mục khác
+        """
+        with open(path, "rb") as f:
+            version, index = pickle.load(f)
+        if version != INDEX_FORMAT or not isinstance(index, cls):
+            raise ValueError(f"Chỉ mục chính tả {path} không đúng định dạng {INDEX_FORMAT}")
+        return index
+
+    def is_known(self, word):
+        return word.lower() in self.vocabulary
+
+    def unknown(self, words):
+        """Các từ chữ cái (đã bỏ dấu câu hai đầu) không có trong từ vựng, giữ thứ tự, không trùng."""
+        result = []
+        seen = set()
+        for word in words:
+            word = word.strip(".,;:!?\"'()[]{}")
+            lower = word.lower()
+            if not lower.isalpha() or lower in seen:
+                continue
+            seen.add(lower)
+            if lower not in self.vocabulary:
+                result.append(word)
+        return result
+
+    def suggest(self, word, max_suggestions=5):
+        """
+        Returns:
+            list: Tối đa max_suggestions từ gợi ý, xếp theo (khoảng cách, tần suất giảm dần);
+                giữ kiểu viết hoa của từ gốc
+        """
+        lower = word.lower()
+        cached = self._memo.get((lower, max_suggestions))
+        if cached is None:
+            cached = self._lookup(lower, max_suggestions)
+            self._memo.put((lower, max_suggestions), cached)
+        return [_match_case(word, suggestion) for suggestion in cached]
+
+    def suggest_many(self, words, max_suggestions=5):
+        """Gợi ý cho các từ lạ của cả một văn bản (mỗi từ tra một lần)."""
+        return {word: self.suggest(word, max_suggestions) for word in self.unknown(words)}
+
+    def _lookup(self, word, max_suggestions):
+        prefix = word[:self.prefix_length]
+        candidates = set()
+        for key in _deletes(prefix, self.max_distance) | {prefix}:
+            candidates.update(self.index.get(key, ()))
+
+        scored = []
+        for word_id in candidates:
+            candidate = self.words[word_id]
+            distance = edit_distance(word, candidate, self.max_distance)
+            if distance <= self.max_distance:
+                scored.append((distance, -self.counts[word_id], candidate))
+        scored.sort()
+        return tuple(candidate for _, _, candidate in scored[:max_suggestions])
+
+
+def _match_case(original, suggestion):
+    if original.isupper() and len(original) > 1:
+        return suggestion.upper()
+    if original[:1].isupper():
+        return suggestion[:1].upper() + suggestion[1:]
+    return suggestion
+
+
+def build_default_index(**options):
+    """Dựng chỉ mục từ bảng tần suất từ tiếng Anh của pyspellchecker."""
+    from spellchecker import SpellChecker
+
+    vocabulary = dict(SpellChecker().word_frequency.dictionary)
+    return SpellingIndex(vocabulary, **options)
+
+
+_spelling_index = None
+_spelling_index_lock = threading.Lock()
+
+
+def get_spelling_index(path=None):
+    """
+    SpellingIndex dùng chung cho cả tiến trình.
+
+    Nạp từ `path` nếu có; chưa có (hoặc sai định dạng) thì dựng từ
+    pyspellchecker rồi lưu lại để lần khởi động sau chỉ cần nạp.
+    """
+    global _spelling_index
+    if _spelling_index is None:
+        with _spelling_index_lock:
+            if _spelling_index is None:
+                index = None
+                if path and os.path.exists(path):
+                    try:
+                        index = SpellingIndex.load(path)
+                    except (OSError, ValueError, pickle.UnpicklingError) as e:
+                        logger.warning(f"Không nạp được chỉ mục chính tả, dựng lại: {e}")
+                if index is None:
+                    logger.info("Đang dựng chỉ mục chính tả...")
+                    index = build_default_index()
+                    if path:
+                        try:
+                            index.save(path)
+                            logger.info(f"Đã lưu chỉ mục chính tả tại: {path}")
+                        except OSError as e:
+                            logger.warning(f"Không lưu được chỉ mục chính tả: {e}")
+                _spelling_index = index
+    return _spelling_index
@@ -0,0 +1,496 @@
+"""Process-pool inference: pinned model workers sharing mmap'd weights."""
+
+import atexit
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from models.metrics import WORKER_INFLIGHT
+
+logger = logging.getLogger(__name__)
+
+WEIGHTS_FILE = "weights.bin"
+MANIFEST_FILE = "manifest.json"
+# Căn lề mỗi tensor trong file trọng số (đủ cho mọi dtype và cache line)
+ALIGNMENT = 64
+# Chu kỳ kiểm tra RequestContext của request trong lúc chờ worker (giây)
+CANCEL_POLL_SECONDS = 0.05
+
+
+def parse_core_sets(value):
+    """
+    "0-7;8-15" -> [[0..7], [8..15]]. Mỗi nhóm cách nhau bởi ";", trong nhóm
+    dùng cú pháp cpulist của Linux ("0-3,8-11").
+    """
+    core_sets = []
+    for group in value.split(';'):
+        cores = []
+        for part in group.split(','):
+            part = part.strip()
+            if not part:
+                continue
+            start, _, end = part.partition('-')
+            cores.extend(range(int(start), int(end or start) + 1))
+        if cores:
+            core_sets.append(cores)
+    return core_sets
+
+
+def _numa_order(cores):
+    """Sắp các core theo NUMA node (đọc /sys), để nhóm liền nhau không vắt qua hai node."""
+    node_dir = "/sys/devices/system/node"
+    ordered = []
+    try:
+        nodes = sorted(name for name in os.listdir(node_dir) if name.startswith("node") and name[4:].isdigit())
+        for node in nodes:
+            with open(os.path.join(node_dir, node, "cpulist")) as f:
+                node_cores = parse_core_sets(f.read().strip())
+            ordered.extend(core for core in (node_cores[0] if node_cores else []) if core in cores)
+    except OSError:
+        return sorted(cores)
+    # Core không thuộc node nào đọc được thì để cuối
+    return ordered + sorted(set(cores) - set(ordered))
+
+
+def plan_core_sets(num_workers, cores=None):
+    """
+    Chia các core được phép dùng thành num_workers nhóm liền nhau, theo thứ
+    tự NUMA node: với số core chia hết, mỗi worker nằm gọn trong một node.
+    """
+    if cores is None:
+        cores = os.sched_getaffinity(0) if hasattr(os, "sched_getaffinity") else range(os.cpu_count() or 1)
+    ordered = _numa_order(set(cores))
+    num_workers = max(1, min(num_workers, len(ordered)))
+    size = len(ordered) // num_workers
+    return [ordered[index * size:(index + 1) * size] for index in range(num_workers)]
+
+
+def export_shared_weights(model, directory, model_version=None):
+    """
+    Ghi toàn bộ tensor của model vào một file phẳng (kèm manifest, config và
+    generation config) để các tiến trình map chung bằng mmap.
+
+    Tensor dùng chung (embedding được tie) chỉ ghi một lần. Chỉ dùng lại
+    file đã xuất khi manifest có cùng model_version (model_fingerprint) và
+    cùng cấu trúc tensor: checkpoint khác cùng kiến trúc vẫn được ghi lại.
+    Không có model_version thì luôn ghi lại.
+    """
+    import torch
+
+    state = model.state_dict()
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    signature = {name: [str(tensor.dtype), list(tensor.shape)] for name, tensor in state.items()}
+    if model_version is not None:
+        try:
+            with open(manifest_path) as f:
+                existing = json.load(f)
+            if existing.get('model_version') == model_version and existing.get('signature') == signature:
+                logger.info(f"Dùng lại trọng số đã xuất tại {directory}")
+                return directory
+        except (OSError, ValueError):
+            pass
+
+    os.makedirs(directory, exist_ok=True)
+    tensors = {}
+    offsets = {}
+    temp_path = os.path.join(directory, f".{WEIGHTS_FILE}.tmp")
+    with open(temp_path, "wb") as f:
+        for name, tensor in state.items():
+            if tensor.is_quantized or (not tensor.is_floating_point() and tensor.dtype != torch.int64):
+                raise ValueError(f"Không hỗ trợ xuất tensor {name} ({tensor.dtype})")
+            tensor = tensor.detach().cpu().contiguous()
+            key = tensor.data_ptr()
+            if key not in offsets:
+                padding = -f.tell() % ALIGNMENT
+                f.write(b"\0" * padding)
+                offsets[key] = f.tell()
+                f.write(tensor.view(-1).view(torch.uint8).numpy().tobytes())
+            tensors[name] = {
+                'offset': offsets[key],
+                'dtype': str(tensor.dtype).replace("torch.", ""),
+                'shape': list(tensor.shape),
+                'nbytes': tensor.element_size() * tensor.nelement(),
+            }
+        size = f.tell()
+    os.replace(temp_path, os.path.join(directory, WEIGHTS_FILE))
+
+    model.config.save_pretrained(directory)
+    if getattr(model, 'generation_config', None) is not None:
+        model.generation_config.save_pretrained(directory)
+    with open(manifest_path, "w") as f:
+        json.dump({'size': size, 'tensors': tensors, 'signature': signature, 'model_version': model_version}, f)
+    logger.info(f"Đã xuất {size / (1024 * 1024):.0f} MB trọng số tại {directory}")
+    return directory
+
+
+def attach_shared_weights(model, directory):
+    """
+    Thay tensor của model bằng view trên file trọng số được mmap (MAP_PRIVATE):
+    các tiến trình cùng đọc chung trang của page cache thay vì mỗi tiến
+    trình giữ một bản trọng số.
+    """
+    import torch
+
+    with open(os.path.join(directory, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    storage = torch.UntypedStorage.from_file(
+        os.path.join(directory, WEIGHTS_FILE), False, manifest['size']
+    )
+    flat = torch.empty(0, dtype=torch.uint8).set_(storage)
+
+    for name, entry in manifest['tensors'].items():
+        tensor = flat[entry['offset']:entry['offset'] + entry['nbytes']]
+        tensor = tensor.view(getattr(torch, entry['dtype'])).view(entry['shape'])
+        module_name, _, leaf = name.rpartition('.')
+        module = model.get_submodule(module_name)
+        if leaf in module._parameters:
+            module._parameters[leaf] = torch.nn.Parameter(tensor, requires_grad=False)
+        else:
+            module._buffers[leaf] = tensor
+    return model
+
+
+def load_shared_model(directory):
+    """Dựng model từ config (không cấp phát trọng số) rồi gắn trọng số mmap."""
+    from accelerate import init_empty_weights
+    from transformers import GenerationConfig, T5Config, T5ForConditionalGeneration
+
+    config = T5Config.from_pretrained(directory)
+    with init_empty_weights():
+        model = T5ForConditionalGeneration(config)
+    attach_shared_weights(model, directory)
+    missing = [name for name, param in model.named_parameters() if param.is_meta]
+    if missing:
+        raise RuntimeError(f"Thiếu trọng số trong file chia sẻ: {missing[:5]}")
+    try:
+        model.generation_config = GenerationConfig.from_pretrained(directory)
+    except OSError:
+        pass
+    return model.eval()
+
+
+class _SlotBuffers:
+    """
+    Vùng shared memory của một worker: mỗi slot gồm token đầu vào, độ dài
+    từng dòng và token đầu ra (int32), cùng một byte cờ huỷ, truy cập qua
+    view NumPy không copy.
+    """
+
+    def __init__(self, slots, max_batch, max_tokens, name=None):
+        self.shape = (slots, max_batch, max_tokens)
+        token_bytes = slots * max_batch * max_tokens * 4
+        size = 2 * token_bytes + slots * max_batch * 4 + slots
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        buffer = self.shm.buf
+        self.inputs = np.ndarray(self.shape, dtype=np.int32, buffer=buffer, offset=0)
+        self.outputs = np.ndarray(self.shape, dtype=np.int32, buffer=buffer, offset=token_bytes)
+        self.lengths = np.ndarray((slots, max_batch), dtype=np.int32, buffer=buffer, offset=2 * token_bytes)
+        # Tiến trình API đặt 1 khi request của lô bị huỷ; worker kiểm tra sau mỗi bước sinh
+        self.cancelled = np.ndarray(
+            (slots,), dtype=np.uint8, buffer=buffer, offset=2 * token_bytes + slots * max_batch * 4
+        )
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def close(self, unlink=False):
+        # Bỏ các view trước khi đóng vùng nhớ
+        self.inputs = self.outputs = self.lengths = self.cancelled = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+class _SlotStoppingCriteria:
+    """Dừng generate trong worker khi hết hạn hoặc khi slot bị tiến trình API đánh dấu huỷ."""
+
+    def __init__(self, context, cancelled, slot):
+        self.context = context
+        self.cancelled = cancelled
+        self.slot = slot
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return self.context.should_stop() or bool(self.cancelled[self.slot])
+
+
+def _worker_main(index, cores, threads, weights_dir, shm_name, shape, conn):
+    """Vòng lặp của một tiến trình worker (chạy với start method "spawn")."""
+    # Ghim core và số luồng trước khi import torch để OpenMP/MKL nhận đúng giá trị
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["MKL_NUM_THREADS"] = str(threads)
+
+    import torch
+    from transformers import StoppingCriteriaList
+
+    from models.admission import RequestContext
+
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+
+    buffers = _SlotBuffers(*shape, name=shm_name)
+    model = load_shared_model(weights_dir)
+    conn.send(('ready', index))
+
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        slot, rows, cols, max_length, num_beams, timeout = message
+        try:
+            lengths = torch.from_numpy(buffers.lengths[slot, :rows].copy())
+            input_ids = torch.from_numpy(buffers.inputs[slot, :rows, :cols].astype(np.int64))
+            attention_mask = (torch.arange(cols)[None, :] < lengths[:, None]).long()
+
+            context = RequestContext(timeout=timeout)
+            with torch.no_grad():
+                outputs = model.generate(
+                    input_ids=input_ids,
+                    attention_mask=attention_mask,
+                    max_length=max_length,
+                    num_beams=num_beams,
+                    early_stopping=num_beams > 1,
+                    stopping_criteria=StoppingCriteriaList([_SlotStoppingCriteria(context, buffers.cancelled, slot)]),
+                )
+            out_rows, out_cols = outputs.shape
+            buffers.outputs[slot, :out_rows, :out_cols] = outputs.numpy()
+            conn.send((slot, out_rows, out_cols, None))
+        except Exception as e:
+            conn.send((slot, 0, 0, f"{type(e).__name__}: {e}"))
+
+    buffers.close()
+
+
+class _Worker:
+    """Trạng thái phía API của một tiến trình worker."""
+
+    def __init__(self, index, cores, threads, process, conn, buffers, slots):
+        self.index = index
+        self.cores = cores
+        self.threads = threads
+        self.process = process
+        self.conn = conn
+        self.buffers = buffers
+        self.free_slots = list(range(slots))
+        self.futures = {}
+        self.outstanding_tokens = 0
+        self.completed = 0
+        self.alive = True
+        # Thời gian xử lý trung bình mỗi token (EWMA, giây): worker ít core chậm hơn
+        self.seconds_per_token = 0.001
+
+    def expected_wait(self, tokens):
+        return (self.outstanding_tokens + tokens) * self.seconds_per_token
+
+
+class WorkerPool:
+    """
+    N tiến trình model, mỗi tiến trình ghim vào một nhóm core với số luồng
+    riêng, dùng chung trọng số qua mmap.
+
+    Tiến trình API (GrammarCorrector) vẫn tokenize/decode; token ID đi qua
+    shared memory theo từng slot, trên Pipe chỉ có vài số nguyên điều khiển.
+    Bộ điều phối gửi mỗi lô cho worker có thời gian chờ ước tính nhỏ nhất
+    (token đang xử lý x thời gian mỗi token của worker đó).
+    """
+
+    def __init__(self, weights_dir, num_workers=2, core_sets=None, threads=None, slots=2,
+                 max_batch=16, max_tokens=512):
+        """
+        Args:
+            weights_dir (str): Thư mục trọng số đã xuất (export_shared_weights)
+            num_workers (int): Số tiến trình (bỏ qua nếu có core_sets)
+            core_sets (list): Nhóm core cho từng worker; mặc định plan_core_sets()
+            threads (int): Số luồng torch mỗi worker; mặc định bằng số core của nhóm
+            slots (int): Số lô được gửi trước cho mỗi worker (lô kế tiếp chờ
+                sẵn trong shared memory trong lúc lô trước đang chạy)
+            max_batch (int): Số câu tối đa mỗi lô
+            max_tokens (int): Số token tối đa của mỗi câu đầu vào/đầu ra
+        """
+        self.weights_dir = weights_dir
+        self.core_sets = core_sets or plan_core_sets(num_workers)
+        self.threads = threads
+        self.slots = slots
+        self.max_batch = max_batch
+        self.max_tokens = max_tokens
+        self.workers = []
+        self._condition = threading.Condition()
+        self._closed = False
+
+    def start(self, timeout=600):
+        """Khởi động các worker và chờ tất cả tải xong model."""
+        context = multiprocessing.get_context("spawn")
+        # Dừng worker và giải phóng shared memory khi tiến trình API thoát
+        atexit.register(self.close)
+        shape = (self.slots, self.max_batch, self.max_tokens)
+        for index, cores in enumerate(self.core_sets):
+            threads = self.threads or max(1, len(cores))
+            buffers = _SlotBuffers(*shape)
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(
+                target=_worker_main,
+                args=(index, cores, threads, self.weights_dir, buffers.name, shape, child_conn),
+                name=f"model-worker-{index}",
+                daemon=True,
+            )
+            process.start()
+            child_conn.close()
+            self.workers.append(_Worker(index, cores, threads, process, parent_conn, buffers, self.slots))
+
+        for worker in self.workers:
+            if not worker.conn.poll(timeout):
+                raise RuntimeError(f"Worker {worker.index} không sẵn sàng sau {timeout}s")
+            worker.conn.recv()
+            threading.Thread(
+                target=self._read_results, args=(worker,), name=f"model-worker-{worker.index}-results", daemon=True
+            ).start()
+            logger.info(f"Worker {worker.index} sẵn sàng (core {worker.cores}, {worker.threads} luồng)")
+
+    def accepts(self, token_ids, max_length):
+        """Lô có vừa với shared memory của worker không."""
+        return (
+            len(token_ids) <= self.max_batch
+            and max_length <= self.max_tokens
+            and max(len(ids) for ids in token_ids) <= self.max_tokens
+        )
+
+    def generate(self, token_ids, max_length, num_beams, timeout=None, context=None):
+        """
+        Sinh một lô trên worker ít tải nhất (chặn đến khi có kết quả).
+
+        Args:
+            token_ids (list): Token đầu vào của từng câu
+            timeout (float): Số giây còn lại của request; worker dừng sinh khi hết
+            context (RequestContext): Request bị huỷ (supersede, client ngắt
+                kết nối) thì worker dừng sinh ngay, như RequestStoppingCriteria
+
+        Returns:
+            list: Token đầu ra của từng câu (câu ngắn được đệm pad như generate())
+        """
+        rows = len(token_ids)
+        cols = max(len(ids) for ids in token_ids)
+        tokens = rows * cols
+        worker, slot = self._acquire(tokens)
+        started = time.perf_counter()
+        try:
+            buffers = worker.buffers
+            buffers.inputs[slot, :rows, :cols] = 0
+            for row, ids in enumerate(token_ids):
+                buffers.inputs[slot, row, :len(ids)] = ids
+                buffers.lengths[slot, row] = len(ids)
+            buffers.cancelled[slot] = 0
+
+            future = Future()
+            with self._condition:
+                worker.futures[slot] = future
+                worker.conn.send((slot, rows, cols, max_length, num_beams, timeout))
+            if context is not None:
+                # Vẫn chờ worker trả slot (nó dừng ở bước sinh kế tiếp) trước khi dùng lại
+                while not future.done():
+                    try:
+                        future.result(CANCEL_POLL_SECONDS)
+                    except FutureTimeoutError:
+                        if context.should_stop():
+                            buffers.cancelled[slot] = 1
+                    except Exception:
+                        break
+            out_rows, out_cols = future.result()
+            outputs = buffers.outputs[slot, :out_rows, :out_cols].tolist()
+        finally:
+            self._release(worker, slot, tokens, time.perf_counter() - started)
+        return outputs
+
+    def _acquire(self, tokens):
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise RuntimeError("WorkerPool đã đóng")
+                candidates = [worker for worker in self.workers if worker.alive and worker.free_slots]
+                if candidates:
+                    worker = min(candidates, key=lambda item: item.expected_wait(tokens))
+                    worker.outstanding_tokens += tokens
+                    WORKER_INFLIGHT.labels(str(worker.index)).set(self.slots - len(worker.free_slots) + 1)
+                    return worker, worker.free_slots.pop()
+                if not any(worker.alive for worker in self.workers):
+                    raise RuntimeError("Không còn worker nào hoạt động")
+                self._condition.wait()
+
+    def _release(self, worker, slot, tokens, seconds):
+        with self._condition:
+            worker.futures.pop(slot, None)
+            worker.free_slots.append(slot)
+            worker.outstanding_tokens -= tokens
+            worker.completed += 1
+            worker.seconds_per_token = 0.8 * worker.seconds_per_token + 0.2 * seconds / max(tokens, 1)
+            WORKER_INFLIGHT.labels(str(worker.index)).set(self.slots - len(worker.free_slots))
+            self._condition.notify()
+
+    def _read_results(self, worker):
+        while True:
+            try:
+                slot, rows, cols, error = worker.conn.recv()
+            except (EOFError, OSError):
+                break
+            future = worker.futures.get(slot)
+            if future is None:
+                continue
+            if error:
+                future.set_exception(RuntimeError(f"Worker {worker.index}: {error}"))
+            else:
+                future.set_result((rows, cols))
+
+        # Worker chết hoặc đã đóng: các lô đang chờ nhận lỗi, không nhận lô mới
+        with self._condition:
+            worker.alive = False
+            for future in worker.futures.values():
+                if not future.done():
+                    future.set_exception(RuntimeError(f"Worker {worker.index} đã dừng"))
+            self._condition.notify_all()
+        if not self._closed:
+            logger.error(f"Worker {worker.index} đã dừng (exit code {worker.process.exitcode})")
+
+    def stats(self):
+        with self._condition:
+            return [
+                {
+                    'worker': worker.index,
+                    'cores': len(worker.cores),
+                    'threads': worker.threads,
+                    'alive': worker.alive,
+                    'in_flight': self.slots - len(worker.free_slots),
+                    'completed': worker.completed,
+                    'ms_per_token': round(worker.seconds_per_token * 1000, 3),
+                }
+                for worker in self.workers
+            ]
+
+    def close(self, timeout=10):
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        for worker in self.workers:
+            try:
+                worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for worker in self.workers:
+            worker.process.join(timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.conn.close()
+            worker.buffers.close(unlink=True)
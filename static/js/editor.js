@@ -1,6 +1,6 @@
 import { showNotification } from './ui.js';
 import { debounce } from './utils.js';
-import { checkGrammar, displayGrammarResults, updateDocumentScore, displayError, resetDocumentScore } from './grammar.js';
+import { checkGrammarIncremental, displayGrammarResults, updateDocumentScore, displayError, resetDocumentScore } from './grammar.js';
 
 /**
  * Initialize the text editor
@@ -90,8 +90,8 @@ function createAutoCheckGrammar(editor, stateElements, documentScore) {
             // Switch to grammar tab
             document.getElementById('grammar-tab')?.click();
             
-            // Perform grammar check
-            checkGrammar(
+            // Perform grammar check (incremental: chỉ gửi phần vừa sửa)
+            checkGrammarIncremental(
                 text,
                 (data) => {
                     stateElements.loadingState.style.display = 'none';
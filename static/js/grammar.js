@@ -2,6 +2,100 @@ import { applyCorrections } from './utils.js';
 import { showNotification } from './ui.js';
 import { enhancedSentenceAnalysis } from './analysis.js';
 
+// Định danh luồng soạn thảo của tab này: server dùng để huỷ request cũ bị thay thế
+const STREAM_ID = Math.random().toString(36).slice(2) + Date.now().toString(36);
+
+// Khoá affinity gửi kèm mọi request kiểm tra: nginx băm khoá này để các lần kiểm
+// tra của cùng tài liệu tới cùng replica (dùng lại cache và phiên incremental)
+const DOCUMENT_ID = 'doc-' + STREAM_ID;
+const AFFINITY_HEADER = 'X-Document-Key';
+
+// Request /correct đang chờ (nếu có) - bị huỷ khi debounce kích hoạt lại
+let pendingController = null;
+
+// Kết quả theo câu đã nhận (hash câu -> edits), gửi lại server dưới dạng "known"
+// để response chế độ compact không lặp lại các câu client đã có
+const MAX_KNOWN_SENTENCES = 500;
+const sentenceEdits = new Map();
+
+// ETag + kết quả của lần kiểm tra gần nhất (dùng khi server trả 304)
+let lastEtag = null;
+let lastResult = null;
+
+/**
+ * Build the full /correct result shape from per-sentence edits
+ * @param {string} text - Text the sentence offsets refer to
+ * @param {Array} sentences - Sentences ({s, e, edits}) with edits relative to the sentence start
+ * @param {Object} extra - Extra fields to copy (analysis, structure, partial)
+ * @returns {Object} Result with corrected_text, errors, sentence_analysis, sentence_structure
+ */
+function buildResultFromSentences(text, sentences, extra = {}) {
+    const errors = [];
+    const correctedSentences = [];
+
+    sentences.forEach(sentence => {
+        const original = text.slice(sentence.s, sentence.e);
+        let corrected = '';
+        let cursor = 0;
+        (sentence.edits || []).forEach(([start, end, replacement]) => {
+            const removed = original.slice(start, end);
+            corrected += original.slice(cursor, start) + replacement;
+            cursor = end;
+
+            let type = 'grammar';
+            let message = `Change '${removed}' to '${replacement}'`;
+            if (!replacement) {
+                type = 'delete';
+                message = `Remove '${removed}'`;
+            } else if (start === end) {
+                type = 'insert';
+                message = `Insert '${replacement}'`;
+            }
+            errors.push({
+                type: type,
+                original: removed,
+                correction: replacement,
+                start_index: sentence.s + start,
+                end_index: sentence.s + end,
+                message: message
+            });
+        });
+        correctedSentences.push(corrected + original.slice(cursor));
+    });
+
+    return {
+        corrected_text: correctedSentences.join(' '),
+        errors: errors,
+        sentence_analysis: (extra.analysis || []).map(([word, pos]) => ({ word: word, pos: pos })),
+        sentence_structure: extra.structure || null,
+        partial: Boolean(extra.partial)
+    };
+}
+
+/**
+ * Expand a compact /correct response into the full response shape
+ * @param {string} text - Text that was sent to the server
+ * @param {Object} data - Compact response ({format: 'compact', sentences: [...]})
+ * @returns {Object} Result with corrected_text, errors, sentence_analysis, sentence_structure
+ */
+function expandCompactResult(text, data) {
+    const sentences = data.sentences.map(sentence => {
+        if (sentence.edits) {
+            sentenceEdits.delete(sentence.h);
+            sentenceEdits.set(sentence.h, sentence.edits);
+            return sentence;
+        }
+        return { ...sentence, edits: sentenceEdits.get(sentence.h) || [] };
+    });
+
+    // Giới hạn bộ nhớ: bỏ các câu cũ nhất
+    while (sentenceEdits.size > MAX_KNOWN_SENTENCES) {
+        sentenceEdits.delete(sentenceEdits.keys().next().value);
+    }
+
+    return buildResultFromSentences(text, sentences, data);
+}
+
 /**
  * Check grammar in the text
  * @param {string} text - Text to check
@@ -14,25 +108,66 @@ export function checkGrammar(text, onSuccess, onError) {
         return;
     }
     
+    // Huỷ lần kiểm tra trước, kết quả của nó không còn cần nữa
+    if (pendingController) {
+        pendingController.abort();
+    }
+    const controller = new AbortController();
+    pendingController = controller;
+    
+    const sentText = text.trim();
+    const headers = { 'Content-Type': 'application/json', [AFFINITY_HEADER]: DOCUMENT_ID };
+    if (lastEtag) {
+        headers['If-None-Match'] = lastEtag;
+    }
+    
     // Call API
     fetch('/correct', {
         method: 'POST',
-        headers: {
-            'Content-Type': 'application/json'
-        },
-        body: JSON.stringify({ text: text })
+        headers: headers,
+        body: JSON.stringify({
+            text: sentText,
+            stream_id: STREAM_ID,
+            compact: true,
+            known: Array.from(sentenceEdits.keys())
+        }),
+        signal: controller.signal
     })
     .then(response => {
+        // Văn bản không đổi so với lần trước: dùng lại kết quả cũ
+        if (response.status === 304 && lastResult) {
+            return lastResult;
+        }
+        if (response.status === 413) {
+            throw new Error('Văn bản quá dài, vui lòng chia nhỏ để kiểm tra');
+        }
+        if (response.status === 429) {
+            const retryAfter = response.headers.get('Retry-After') || '1';
+            throw new Error(`Máy chủ đang bận, vui lòng thử lại sau ${retryAfter} giây`);
+        }
         if (!response.ok) {
             throw new Error('Network response was not ok');
         }
-        return response.json();
+        const etag = response.headers.get('ETag');
+        return response.json().then(data => {
+            const result = data.format === 'compact' ? expandCompactResult(sentText, data) : data;
+            lastEtag = etag;
+            lastResult = etag ? result : null;
+            return result;
+        });
     })
     .then(data => {
         if (onSuccess) onSuccess(data);
     })
     .catch(error => {
+        // Request bị huỷ do có lần kiểm tra mới hơn: bỏ qua
+        if (error.name === 'AbortError') return;
         if (onError) onError(error.message);
+    })
+    .finally(() => {
+        if (pendingController === controller) {
+            pendingController = null;
+        }
     });
 }
 
@@ -285,4 +420,110 @@ export function resetDocumentScore(scoreElement) {
     scoreElement.textContent = '--';
     scoreElement.style.backgroundColor = 'var(--bg-tertiary)';
     scoreElement.style.color = 'var(--text-secondary)';
-}
\ No newline at end of file
+}
+// Tài liệu đang soạn trong tab này (giao thức incremental): server giữ phân đoạn
+// câu + kết quả, client chỉ gửi phần thay đổi so với phiên bản đã được xác nhận
+let ackedText = null;
+let ackedVersion = null;
+let documentSentences = [];
+
+/**
+ * Compute a single edit op turning oldText into newText
+ * @param {string} oldText - Text acknowledged by the server
+ * @param {string} newText - Current editor text
+ * @returns {Object} Edit op {start, end, text}
+ */
+function diffOp(oldText, newText) {
+    const limit = Math.min(oldText.length, newText.length);
+    let prefix = 0;
+    while (prefix < limit && oldText[prefix] === newText[prefix]) {
+        prefix++;
+    }
+    let suffix = 0;
+    while (suffix < limit - prefix &&
+           oldText[oldText.length - 1 - suffix] === newText[newText.length - 1 - suffix]) {
+        suffix++;
+    }
+    return {
+        start: prefix,
+        end: oldText.length - suffix,
+        text: newText.slice(prefix, newText.length - suffix)
+    };
+}
+
+/**
+ * Check grammar incrementally: only the edited region is re-checked on the server
+ * @param {string} text - Current editor text
+ * @param {Function} onSuccess - Success callback
+ * @param {Function} onError - Error callback
+ */
+export function checkGrammarIncremental(text, onSuccess, onError) {
+    if (!text || text.trim() === '') {
+        return;
+    }
+
+    if (pendingController) {
+        pendingController.abort();
+    }
+    const controller = new AbortController();
+    pendingController = controller;
+
+    const send = (fullSync) => {
+        const body = { document_id: DOCUMENT_ID, stream_id: STREAM_ID };
+        if (fullSync || ackedText === null) {
+            body.text = text;
+        } else {
+            body.base_version = ackedVersion;
+            body.ops = [diffOp(ackedText, text)];
+        }
+        return fetch('/correct/incremental', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', [AFFINITY_HEADER]: DOCUMENT_ID },
+            body: JSON.stringify(body),
+            signal: controller.signal
+        }).then(response => {
+            // Server mất phiên hoặc lệch phiên bản: gửi lại toàn văn một lần
+            if (response.status === 409 && !fullSync) {
+                return response.json().then(data => {
+                    if (data.error === 'resync') {
+                        return send(true);
+                    }
+                    throw new Error('Request superseded');
+                });
+            }
+            if (response.status === 429 || response.status === 503) {
+                const retryAfter = response.headers.get('Retry-After') || '1';
+                throw new Error(`Máy chủ đang bận, vui lòng thử lại sau ${retryAfter} giây`);
+            }
+            if (!response.ok) {
+                throw new Error('Network response was not ok');
+            }
+            return response.json();
+        });
+    };
+
+    send(false)
+    .then(data => {
+        // Server trả về toàn bộ câu (đồng bộ toàn văn hoặc tài liệu ngắn)
+        if (data.total === data.sentences.length) {
+            documentSentences = data.sentences;
+        } else {
+            const tail = documentSentences.slice(data.first + data.removed).map(sentence => ({
+                ...sentence, s: sentence.s + data.delta, e: sentence.e + data.delta
+            }));
+            documentSentences = documentSentences.slice(0, data.first).concat(data.sentences, tail);
+        }
+        ackedText = text;
+        ackedVersion = data.version;
+        if (onSuccess) onSuccess(buildResultFromSentences(text, documentSentences));
+    })
+    .catch(error => {
+        if (error.name === 'AbortError') return;
+        if (onError) onError(error.message);
+    })
+    .finally(() => {
+        if (pendingController === controller) {
+            pendingController = null;
+        }
+    });
+}
@@ -0,0 +1,13 @@
+# conftest.py
+import os
+import sys
+import tempfile
+
+# Các test import app/asgi: DB, lịch sử, snapshot và thống kê ghi vào thư mục tạm, không vào repo
+_STATE_DIR = tempfile.mkdtemp(prefix="grammar-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_STATE_DIR, 'users.db')}")
+os.environ.setdefault("HISTORY_DB_PATH", os.path.join(_STATE_DIR, "history", "corrections.db"))
+os.environ.setdefault("CACHE_SNAPSHOT_PATH", os.path.join(_STATE_DIR, "cache", "corrections.snap"))
+os.environ.setdefault("ANALYTICS_DIR", os.path.join(_STATE_DIR, "analytics"))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,95 @@
+# test_admission.py
+import pytest
+
+from models.admission import (
+    InputTooLargeError, RequestContext, SupersedeRegistry, TokenBucketLimiter, TokenBudgetExceeded
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr("models.admission.time.monotonic", fake)
+    return fake
+
+
+def test_bucket_refills_over_time(clock):
+    limiter = TokenBucketLimiter(capacity=100, refill_rate=10)
+    limiter.consume("user", 80)
+    with pytest.raises(TokenBudgetExceeded) as exceeded:
+        limiter.consume("user", 50)
+    assert exceeded.value.status_code == 429
+    # Còn 20 token, cần 50: chờ 3 giây
+    assert exceeded.value.retry_after == pytest.approx(3.0)
+    assert exceeded.value.headers() == {'Retry-After': '3'}
+
+    clock.now += 3.0
+    limiter.consume("user", 50)
+    # Khoá khác có bucket riêng
+    limiter.consume("other", 100)
+
+
+def test_bucket_never_exceeds_capacity(clock):
+    limiter = TokenBucketLimiter(capacity=100, refill_rate=10)
+    limiter.consume("user", 100)
+    clock.now += 1000.0
+    limiter.consume("user", 100)
+    with pytest.raises(TokenBudgetExceeded):
+        limiter.consume("user", 1)
+
+
+def test_bucket_tracks_limited_keys(clock):
+    limiter = TokenBucketLimiter(capacity=10, refill_rate=1, max_keys=2)
+    limiter.consume("a", 10)
+    limiter.consume("b", 10)
+    limiter.consume("c", 10)
+    # "a" bị loại khỏi LRU: bắt đầu lại với bucket đầy
+    limiter.consume("a", 10)
+    with pytest.raises(TokenBudgetExceeded):
+        limiter.consume("c", 10)
+
+
+def test_new_request_cancels_superseded_one():
+    registry = SupersedeRegistry()
+    first, second = RequestContext(), RequestContext()
+    registry.register(("client", "stream"), first)
+    registry.register(("client", "stream"), second)
+    assert first.cancelled and not second.cancelled
+
+    # Request cũ kết thúc muộn không gỡ request mới
+    registry.release(("client", "stream"), first)
+    third = RequestContext()
+    registry.register(("client", "stream"), third)
+    assert second.cancelled
+
+    registry.release(("client", "stream"), third)
+    registry.register(("client", "stream"), RequestContext())
+    assert not third.cancelled
+
+
+def test_other_streams_are_independent():
+    registry = SupersedeRegistry()
+    first, second = RequestContext(), RequestContext()
+    registry.register(("client", "a"), first)
+    registry.register(("client", "b"), second)
+    assert not first.cancelled and not second.cancelled
+
+
+def test_oversized_request_gets_413(monkeypatch):
+    pytest.importorskip("flask")
+    app = pytest.importorskip("app")
+    monkeypatch.setattr(app.model_loader, "get", lambda: None)
+    with pytest.raises(InputTooLargeError) as too_large:
+        app.admit_correction("", "client", tokens=app.token_limiter.capacity + 1)
+    assert too_large.value.status_code == 413
+    assert too_large.value.retry_after is None
+    # Không trừ vào ngân sách của client
+    app.admit_correction("", "client", tokens=app.token_limiter.capacity)
@@ -0,0 +1,98 @@
+# test_asgi.py
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("a2wsgi")
+asgi = pytest.importorskip("asgi")
+
+SLOW_SECONDS = 0.5
+
+
+async def call(method, path, body=b"", headers=()):
+    """Gửi một request HTTP thẳng vào asgi.application, trả về (status, body, số giây)."""
+    raw_headers = [(b"host", b"testserver")] + [
+        (name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers
+    ]
+    if body:
+        raw_headers.append((b"content-length", str(len(body)).encode("latin-1")))
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+        "scheme": "http", "path": path, "raw_path": path.encode("latin-1"), "query_string": b"",
+        "root_path": "", "headers": raw_headers, "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    disconnected = asyncio.Event()
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    response = {"status": None, "body": b""}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+
+    started = time.monotonic()
+    try:
+        await asgi.application(scope, receive, send)
+    finally:
+        disconnected.set()
+    return response["status"], response["body"], time.monotonic() - started
+
+
+def slow_view():
+    time.sleep(SLOW_SECONDS)
+    return "ok"
+
+
+def test_flask_routes_run_concurrently(monkeypatch):
+    # Route Flask chậm (không nằm trong ASYNC_ROUTES) được chạy song song trên thread pool
+    monkeypatch.setitem(asgi.flask_app.view_functions, "health_check", slow_view)
+
+    async def run():
+        started = time.monotonic()
+        results = await asyncio.gather(*(call("GET", "/health") for _ in range(4)))
+        return results, time.monotonic() - started
+
+    results, elapsed = asyncio.run(run())
+    assert [status for status, _, _ in results] == [200] * 4
+    assert elapsed < 2 * SLOW_SECONDS
+
+
+def test_logins_do_not_block_other_routes(monkeypatch):
+    # Hai lần đăng nhập chờ băm mật khẩu chậm; /health vẫn trả lời ngay
+    import app
+    import models.auth
+
+    def slow_check(password_hash, password):
+        time.sleep(SLOW_SECONDS)
+        return False
+
+    monkeypatch.setattr(models.auth, "check_password_hash", slow_check)
+    monkeypatch.setattr(app, "find_user", lambda user_id=None, email=None: models.auth.CachedUser(
+        1, "Test", email, "pbkdf2:sha256$x$y"
+    ))
+    form = b"email=student%40example.com&password=secret"
+    form_headers = [("Content-Type", "application/x-www-form-urlencoded")]
+
+    async def run():
+        started = time.monotonic()
+        logins = [asyncio.ensure_future(call("POST", "/login", form, form_headers)) for _ in range(2)]
+        await asyncio.sleep(0.1)
+        health = await asyncio.gather(*(call("GET", "/health") for _ in range(4)))
+        results = await asyncio.gather(*logins)
+        return results, health, time.monotonic() - started
+
+    logins, health, elapsed = asyncio.run(run())
+    assert [status for status, _, _ in logins] == [200, 200]
+    assert all(status == 200 and seconds < SLOW_SECONDS / 2 for status, _, seconds in health)
+    # Hai phép băm chạy song song (AUTH_HASH_WORKERS = 2)
+    assert elapsed < 2 * SLOW_SECONDS
@@ -0,0 +1,66 @@
+# test_batching.py
+from models.batching import TokenBudget, batch_cost, plan_batches
+
+
+def test_batch_cost_counts_padding_and_beams():
+    assert batch_cost([3, 10, 5], num_beams=2) == 3 * 10 * 2
+    assert batch_cost([]) == 0
+
+
+def test_plan_batches_respects_budget():
+    lengths = [2, 3, 4, 4, 6, 8]
+    batches = plan_batches(lengths, lambda length: length, budget=16, num_beams=1)
+    assert [item for batch in batches for item in batch] == lengths
+    assert all(batch_cost(batch) <= 16 for batch in batches)
+    assert batches == [[2, 3, 4, 4], [6, 8]]
+
+
+def test_plan_batches_counts_beams_and_max_sentences():
+    assert plan_batches([4, 4, 4], lambda length: length, budget=16, num_beams=2) == [[4, 4], [4]]
+    assert plan_batches([1] * 5, lambda length: length, budget=100, max_sentences=2) == [[1, 1], [1, 1], [1]]
+
+
+def test_plan_batches_puts_oversized_sentence_alone():
+    assert plan_batches([2, 50, 3], lambda length: length, budget=10) == [[2], [50], [3]]
+
+
+def budget(**kwargs):
+    options = dict(initial=512, minimum=64, maximum=1024, target_latency=1.0,
+                   increase_step=64, decrease_factor=0.5, min_free_bytes=0)
+    options.update(kwargs)
+    return TokenBudget("test", **options)
+
+
+def test_budget_grows_only_when_batches_fill_it():
+    tokens = budget()
+    tokens.observe(100, 0.1, sentences=4)
+    assert tokens.budget == 512
+    tokens.observe(500, 0.1, sentences=4)
+    assert tokens.budget == 576
+    for _ in range(20):
+        tokens.observe(tokens.budget, 0.1, sentences=4)
+    assert tokens.budget == 1024
+
+
+def test_budget_shrinks_on_slow_batches():
+    tokens = budget()
+    tokens.observe(512, 2.0, sentences=4)
+    assert tokens.budget == 256
+    for _ in range(10):
+        tokens.observe(tokens.budget, 2.0, sentences=4)
+    assert tokens.budget == 64
+    assert tokens.stats()['decreases'] == 11
+
+
+def test_slow_single_sentence_keeps_budget():
+    tokens = budget()
+    tokens.observe(300, 2.0, sentences=1)
+    assert tokens.budget == 512
+    assert tokens.stats()['decreases'] == 0
+
+
+def test_low_memory_shrinks_budget(monkeypatch):
+    tokens = budget()
+    monkeypatch.setattr(tokens, "memory_low", lambda: True)
+    tokens.observe(512, 0.1, sentences=4)
+    assert tokens.budget == 256
@@ -0,0 +1,119 @@
+# test_decoding.py
+from types import SimpleNamespace
+
+import pytest
+
+from models.decoding import propose_draft, speculative_greedy
+
+START, EOS, VOCAB = 0, 1, 64
+
+
+def test_propose_draft_copies_after_last_match():
+    source = [10, 11, 12, 13, 14, 15]
+    assert propose_draft(source, [], max_tokens=3) == [10, 11, 12]
+    assert propose_draft(source, [10, 11], max_tokens=3) == [12, 13, 14]
+    # Token mới (sửa lỗi) không có trong câu gốc: dò lại bằng n-gram ngắn hơn
+    assert propose_draft(source, [10, 99, 12], max_tokens=2) == [13, 14]
+    assert propose_draft(source, [99]) == []
+    assert propose_draft(source, [15]) == []
+
+
+class StubSeq2Seq:
+    """
+    Model giả có API như T5 của transformers: đích của mỗi câu được sinh từ
+    đầu vào encoder bằng `rewrite`; logits ở mỗi vị trí chỉ đúng khi tiền tố
+    decoder khớp đích, nên KV cache cắt sai sẽ cho kết quả khác.
+    """
+
+    config = SimpleNamespace(eos_token_id=EOS, decoder_start_token_id=START)
+
+    def __init__(self, torch, rewrite):
+        self.torch = torch
+        self.rewrite = rewrite
+        self.forward_passes = 0
+
+    def get_encoder(self):
+        return lambda input_ids, attention_mask=None: input_ids
+
+    def __call__(self, encoder_outputs, attention_mask=None, decoder_input_ids=None,
+                 past_key_values=None, use_cache=True):
+        torch = self.torch
+        self.forward_passes += 1
+        target = self.rewrite(encoder_outputs[0].tolist()) + [EOS]
+        past = past_key_values[0][0][0, 0].long().tolist() if past_key_values else []
+        tokens = past + decoder_input_ids[0].tolist()
+        logits = torch.zeros((1, len(tokens) - len(past), VOCAB))
+        for position in range(len(past), len(tokens)):
+            prefix = tokens[1:position + 1]
+            matches = prefix == target[:len(prefix)] and len(prefix) < len(target)
+            logits[0, position - len(past), target[len(prefix)] if matches else EOS] = 1.0
+        cache = torch.tensor(tokens, dtype=torch.float32).view(1, 1, -1)
+        return SimpleNamespace(logits=logits, past_key_values=((cache, cache),))
+
+
+def plain_greedy(torch, model, input_ids, max_length):
+    generated = [START]
+    while len(generated) < max_length:
+        outputs = model(encoder_outputs=input_ids, decoder_input_ids=torch.tensor([generated]))
+        token = int(outputs.logits[0, -1].argmax())
+        generated.append(token)
+        if token == EOS:
+            break
+    return generated
+
+
+def fix_tokens(source):
+    """Sửa giả: bỏ EOS, thay 20 bằng 21 22, xoá 30."""
+    output = []
+    for token in source[:-1]:
+        if token == 20:
+            output.extend([21, 22])
+        elif token != 30:
+            output.append(token)
+    return output
+
+
+SOURCES = [
+    [10, 11, 12, 13, 14, EOS],
+    [10, 20, 12, 13, 20, 14, 15, 16, 17, 18, 19, EOS],
+    [30, 10, 11, 30, 12, 30, EOS],
+    [EOS],
+    list(range(2, 60)) + [EOS],
+]
+
+
+@pytest.mark.parametrize("source", SOURCES)
+@pytest.mark.parametrize("max_length", [4, 128])
+def test_speculative_matches_plain_greedy(source, max_length):
+    torch = pytest.importorskip("torch")
+    model = StubSeq2Seq(torch, fix_tokens)
+    input_ids = torch.tensor([source])
+    expected = plain_greedy(torch, model, input_ids, max_length)
+
+    model.forward_passes = 0
+    output, passes = speculative_greedy(model, input_ids, max_length=max_length, draft_tokens=4)
+    assert output == expected
+    assert passes == model.forward_passes <= len(expected) - 1
+
+
+def test_speculative_uses_fewer_passes_on_clean_sentence():
+    torch = pytest.importorskip("torch")
+    model = StubSeq2Seq(torch, lambda source: source[:-1])
+    source = list(range(2, 40)) + [EOS]
+    output, passes = speculative_greedy(model, torch.tensor([source]), draft_tokens=8)
+    assert output == [START] + source
+    assert passes <= len(source) // 8 + 1
+
+
+def test_previous_correction_as_draft_source():
+    torch = pytest.importorskip("torch")
+    model = StubSeq2Seq(torch, fix_tokens)
+    source = [10, 20, 12, 20, 13, 20, 14, EOS]
+    input_ids = torch.tensor([source])
+    expected = plain_greedy(torch, model, input_ids, 128)
+    previous = fix_tokens(source) + [EOS]
+    output, passes = speculative_greedy(
+        model, input_ids, draft_tokens=16, draft_sources=[previous, source]
+    )
+    assert output == expected
+    assert passes == 1
@@ -0,0 +1,75 @@
+# test_history.py
+import pytest
+
+from models.history import HistoryStore, apply_edits, document_edits
+
+LONG_TEXT = "This sentence are long enough to be compressed. " * 10
+
+
+@pytest.fixture
+def store(tmp_path):
+    history = HistoryStore(str(tmp_path / "history.db"), flush_interval=0.01)
+    history.start()
+    yield history
+    history.close()
+
+
+def record_all(store, records):
+    for user_id, text, spans, corrected in records:
+        store.record(user_id, text, spans, corrected)
+    # close() ghi nốt hàng đợi; đọc vẫn dùng được sau đó
+    store.close()
+
+
+def test_document_edits_round_trip():
+    text = "She go home. He have a cat."
+    spans = [(0, 12), (13, 27)]
+    corrected = ["She goes home.", "He has a cat."]
+    edits = document_edits(text, spans, corrected)
+    assert apply_edits(text, edits) == "She goes home. He has a cat."
+    assert all(start <= end for start, end, _ in edits)
+
+
+def test_entries_paginate_newest_first(store):
+    record_all(store, [
+        (1, f"Sentence number {i}.", [(0, 18 + len(str(i)))], [f"Sentence number {i}."])
+        for i in range(5)
+    ] + [(2, "Other user.", [(0, 11)], ["Other user."])])
+
+    first_page = store.entries(1, limit=2)
+    assert [item['text'] for item in first_page] == ["Sentence number 4.", "Sentence number 3."]
+    second_page = store.entries(1, before=first_page[-1]['id'], limit=2)
+    assert [item['text'] for item in second_page] == ["Sentence number 2.", "Sentence number 1."]
+    last_page = store.entries(1, before=second_page[-1]['id'], limit=2)
+    assert [item['text'] for item in last_page] == ["Sentence number 0."]
+    assert store.stats()['written'] == 6
+
+
+def test_entries_restore_corrected_text(store):
+    spans = [(0, len(LONG_TEXT.strip()))]
+    corrected = LONG_TEXT.strip().replace("sentence are", "sentence is")
+    record_all(store, [(1, LONG_TEXT.strip(), spans, [corrected])])
+    (item,) = store.entries(1)
+    assert item['text'] == LONG_TEXT.strip()
+    assert item['corrected'] == corrected
+    assert item['error_count'] == len(item['edits']) > 0
+
+
+def test_search_matches_words_and_prefix_per_user(store):
+    if not store.fts:
+        pytest.skip("SQLite không hỗ trợ FTS5")
+    record_all(store, [
+        (1, "The quick brown fox.", [(0, 20)], ["The quick brown fox."]),
+        (1, "A slow green turtle.", [(0, 20)], ["A slow green turtle."]),
+        (2, "The quick red fox.", [(0, 18)], ["The quick red fox."]),
+    ])
+    assert [item['text'] for item in store.entries(1, query="quick fox")] == ["The quick brown fox."]
+    assert [item['text'] for item in store.entries(1, query="tur")] == ["A slow green turtle."]
+    assert [item['text'] for item in store.entries(2, query="quick")] == ["The quick red fox."]
+    assert store.entries(1, query="red") == []
+
+
+def test_record_before_start_is_ignored(tmp_path):
+    history = HistoryStore(str(tmp_path / "history.db"))
+    history.record(1, "Text.", [(0, 5)], ["Text."])
+    assert history.stats()['queued'] == 0
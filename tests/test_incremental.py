@@ -0,0 +1,120 @@
+# test_incremental.py
+import re
+
+import pytest
+
+pytest.importorskip("flask")
+app = pytest.importorskip("app")
+
+from models.admission import InputTooLargeError
+from models.sessions import SessionConflictError
+
+
+class StubModel:
+    """Model giả: viết hoa câu, đếm số câu đã sinh."""
+
+    num_beams = 4
+    version = "stub"
+
+    def __init__(self):
+        self.generated = []
+
+    def correct_sentences(self, sentences, context=None, num_beams=None, speculative=False):
+        self.generated.extend(sentence.text for sentence in sentences)
+        return [sentence.text.upper() for sentence in sentences]
+
+    def lookup(self, text, num_beams=None):
+        return None
+
+
+def simple_spans(text):
+    """Tách câu đơn giản theo dấu chấm (không cần dữ liệu Punkt)."""
+    return [match.span() for match in re.finditer(r"[^.\s][^.]*\.?", text)]
+
+
+@pytest.fixture
+def model(monkeypatch):
+    stub = StubModel()
+    monkeypatch.setattr(app.model_loader, "get", lambda: stub)
+    monkeypatch.setattr(app, "sentence_spans", simple_spans)
+    return stub
+
+
+def test_rejected_resync_keeps_session(model, monkeypatch):
+    document_id = "doc-too-large"
+    text = "First one here. Second one here."
+    result = app.run_incremental("client", document_id, None, [], text)
+    assert result["version"] == 1
+
+    monkeypatch.setattr(app.config, "MAX_INPUT_CHARS", 40)
+    with pytest.raises(InputTooLargeError):
+        app.run_incremental("client", document_id, None, [], "x" * 41)
+
+    # Phiên vẫn ở phiên bản cũ: client gửi tiếp ops từ version 1
+    op = {"start": len(text), "end": len(text), "text": " Third."}
+    result = app.run_incremental("client", document_id, 1, [op], None)
+    assert result["version"] == 2
+    assert result["total"] == 3
+    assert model.generated[-1] == "Third."
+
+
+def test_cached_mode_results_are_redone_with_model(model):
+    document_id = "doc-overload"
+    cached, full = app.overload_controller.modes[-1], app.overload_controller.modes[0]
+    text = "First one here. Second one here."
+    result = app.run_incremental("client", document_id, None, [], text, mode=cached)
+    assert result["mode"] == "cached"
+    assert model.generated == []
+
+    # Hết quá tải: cập nhật tiếp theo sửa lại cả hai câu cũ bằng model
+    op = {"start": len(text), "end": len(text), "text": " Third."}
+    result = app.run_incremental("client", document_id, 1, [op], None, mode=full)
+    assert (result["first"], result["removed"], result["total"]) == (0, 2, 3)
+    assert sorted(model.generated) == ["First one here.", "Second one here.", "Third."]
+
+    # Không còn câu 'degraded': cập nhật sau chỉ tách lại vùng bị sửa
+    op = {"start": 0, "end": 5, "text": "Fifth"}
+    result = app.run_incremental("client", document_id, 2, [op], None, mode=full)
+    assert result["first"] == 0 and result["removed"] < 3
+    assert model.generated[-1] == "Fifth one here."
+
+
+def test_committed_updates_are_recorded_in_history(model, monkeypatch):
+    records = []
+    monkeypatch.setattr(app.history_store, "record", lambda *args: records.append(args))
+    document_id = "doc-history"
+    text = "First one here. Second one here."
+    app.run_incremental("client", document_id, None, [], text, user_id=7)
+    assert records == [(7, text, [(0, 15), (16, 32)], ["FIRST ONE HERE.", "SECOND ONE HERE."])]
+
+    # Trong HISTORY_INCREMENTAL_SECONDS: không ghi thêm một dòng cho mỗi lần gõ
+    op = {"start": len(text), "end": len(text), "text": " Third."}
+    app.run_incremental("client", document_id, 1, [op], None, user_id=7)
+    assert len(records) == 1
+
+    monkeypatch.setattr(app.config, "HISTORY_INCREMENTAL_SECONDS", 0)
+    op = {"start": 0, "end": 5, "text": "Fifth"}
+    app.run_incremental("client", document_id, 2, [op], None, user_id=7)
+    assert records[-1][1] == "Fifth one here. Second one here. Third."
+    assert records[-1][3][-1] == "THIRD."
+
+    # Khách (không đăng nhập) không có lịch sử
+    app.run_incremental("guest", document_id, None, [], text)
+    assert len(records) == 2
+
+
+def test_stale_or_invalid_ops_ask_for_resync(model):
+    document_id = "doc-conflict"
+    text = "First one here."
+    app.run_incremental("client", document_id, None, [], text)
+
+    with pytest.raises(SessionConflictError) as stale:
+        app.run_incremental("client", document_id, 0, [{"start": 0, "end": 0, "text": "x"}], None)
+    assert stale.value.status_code == 409
+    assert stale.value.to_dict()["version"] == 1
+
+    with pytest.raises(SessionConflictError):
+        app.run_incremental("client", document_id, 1, [{"start": 0, "end": 99, "text": "x"}], None)
+
+    result = app.run_incremental("client", document_id, 1, [{"start": 0, "end": 5, "text": "Only"}], None)
+    assert result["version"] == 2
@@ -0,0 +1,96 @@
+# test_overload.py
+from models.overload import OverloadController
+
+
+class FakeExecutor:
+    max_workers = 2
+    max_queue = 8
+
+    def __init__(self):
+        self.pending = 0
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def controller(monkeypatch, **kwargs):
+    clock = FakeClock()
+    monkeypatch.setattr("models.overload.time.monotonic", clock)
+    options = dict(latency_slo=5.0, step_up_interval=2.0, step_down_interval=10.0)
+    options.update(kwargs)
+    executor = FakeExecutor()
+    return OverloadController(executor, **options), executor, clock
+
+
+def test_steps_up_one_level_per_interval(monkeypatch):
+    overload, executor, clock = controller(monkeypatch)
+    executor.pending = 10
+    assert overload.mode().name == 'full'
+
+    clock.now += 2.0
+    assert overload.mode().name == 'no_pos'
+    # Chưa đủ step_up_interval kể từ lần đổi trước: giữ nguyên
+    clock.now += 1.0
+    assert overload.mode().name == 'no_pos'
+
+    names = []
+    for _ in range(4):
+        clock.now += 2.0
+        names.append(overload.mode().name)
+    assert names == ['fewer_beams', 'greedy', 'cached', 'cached']
+    assert not overload.mode().use_model
+
+
+def test_steps_down_after_sustained_low_pressure(monkeypatch):
+    overload, executor, clock = controller(monkeypatch)
+    executor.pending = 10
+    for _ in range(2):
+        clock.now += 2.0
+        overload.mode()
+    assert overload.level == 2
+
+    # Áp lực giữa hai ngưỡng: không đổi mức
+    executor.pending = 5
+    clock.now += 20.0
+    assert overload.mode().level == 2
+
+    # Áp lực thấp: giảm một mức, mức tiếp theo phải chờ step_down_interval
+    executor.pending = 0
+    assert overload.mode().level == 1
+    clock.now += 5.0
+    assert overload.mode().level == 1
+    clock.now += 5.0
+    assert overload.mode().level == 0
+
+def test_latency_raises_pressure(monkeypatch):
+    overload, _, clock = controller(monkeypatch)
+    for _ in range(10):
+        overload.observe(10.0)
+    assert overload.pressure() > 1.0
+    clock.now += 2.0
+    assert overload.mode().level == 1
+
+
+def test_max_level_and_disabled(monkeypatch):
+    overload, executor, clock = controller(monkeypatch, max_level=3)
+    executor.pending = 10
+    for _ in range(10):
+        clock.now += 2.0
+        overload.mode()
+    assert overload.mode().name == 'greedy'
+
+    disabled, executor, clock = controller(monkeypatch, enabled=False)
+    executor.pending = 10
+    clock.now += 100.0
+    assert disabled.mode().name == 'full'
+
+
+def test_reduced_beams_and_cache_beams(monkeypatch):
+    overload, _, _ = controller(monkeypatch, reduced_beams=3)
+    assert [mode.num_beams for mode in overload.modes] == [None, None, 3, 1, None]
+    assert overload.cache_beams(5) == [5, 3, 1]
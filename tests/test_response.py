@@ -0,0 +1,22 @@
+# test_response.py
+from models.response import etag_matches, request_etag
+
+
+def test_etag_is_weak_and_depends_on_every_part():
+    etag = request_etag("model-v1", "compact", "She don't like cats.")
+    assert etag.startswith('W/"')
+    assert etag != request_etag("model-v2", "compact", "She don't like cats.")
+    assert etag != request_etag("model-v1", "full", "She don't like cats.")
+
+
+def test_etag_matches_weak_comparison():
+    etag = request_etag("model-v1", "full", "text")
+    assert etag_matches(etag, etag)
+    assert etag_matches(etag[2:], etag)
+    assert etag_matches(f'"other", {etag}', etag)
+    assert not etag_matches('"other"', etag)
+    assert not etag_matches(None, etag)
+
+
+def test_etag_wildcard_is_not_a_match():
+    assert not etag_matches("*", request_etag("model-v1", "full", "text"))
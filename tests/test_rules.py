@@ -0,0 +1,60 @@
+# test_rules.py
+import os
+
+import pytest
+
+from models.rules import RuleEngine
+
+RULES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "grammar_rules.json")
+
+# Câu sai -> câu luật phải sửa thành
+POSITIVE_CASES = [
+    ("i think so", "I think so"),
+    ("She ate a apple.", "She ate an apple."),
+    ("A apple a day.", "An apple a day."),
+    ("It was a honest mistake.", "It was an honest mistake."),
+    ("He is an university student.", "He is a university student."),
+    ("She don't like cats.", "She doesn't like cats."),
+    ("He have a car.", "He has a car."),
+    ("They is late.", "They are late."),
+    ("i is happy", "I am happy"),
+    ("Yesterday I is tired.", "Yesterday I am tired."),
+    ("You should of asked.", "You should have asked."),
+    ("I like it alot.", "I like it a lot."),
+    ("We went to the the park.", "We went to the park."),
+]
+
+# Câu đúng (hoặc không chắc chắn) mà luật không được sửa
+NEGATIVE_CASES = [
+    "Plan A is better.",
+    "You can choose A or B.",
+    "Take vitamin A and zinc.",
+    "She got a grade A in maths.",
+    "Bring a USB drive.",
+    "He works for a NATO office.",
+    "A is the first letter.",
+    "World War I is over.",
+    "King Henry I is buried here.",
+    "a university",
+    "a one-way ticket",
+    "an hour",
+    "He doesn't have to go.",
+]
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return RuleEngine.from_file(RULES_PATH)
+
+
+@pytest.mark.parametrize("text,expected", POSITIVE_CASES)
+def test_rules_fix_common_errors(engine, text, expected):
+    corrected, edits = engine.apply(text)
+    assert corrected == expected
+    assert edits
+
+
+@pytest.mark.parametrize("text", NEGATIVE_CASES)
+def test_rules_leave_correct_text(engine, text):
+    corrected, edits = engine.apply(text)
+    assert corrected == text, [edit['rule'] for edit in edits]
@@ -0,0 +1,96 @@
+# test_sessions.py
+import re
+
+import pytest
+
+from models.sessions import DocumentSession, DocumentSessionStore, apply_ops
+
+
+def simple_spans(text):
+    """Tách câu đơn giản theo dấu chấm (không cần dữ liệu Punkt)."""
+    return [match.span() for match in re.finditer(r"[^.\s][^.]*\.?", text)]
+
+
+def simple_spans_text(text):
+    return [text[start:end] for start, end in simple_spans(text)]
+
+
+def commit_text(session, text, full=False):
+    """Áp dụng plan_update + commit với kết quả sửa giả (viết hoa)."""
+    first, removed, spans, delta = session.plan_update(text, simple_spans, full=full)
+    entries = [
+        {'s': start, 'e': end, 'h': text[start:end], 'corrected': text[start:end].upper(), 'edits': []}
+        for start, end in spans
+    ]
+    session.commit(text, first, removed, entries, delta)
+    return first, removed, spans, delta
+
+
+def test_apply_ops_in_sequence():
+    text = apply_ops("Hello world.", [
+        {'start': 0, 'end': 5, 'text': "Goodbye"},
+        {'start': 7, 'end': 7, 'text': " cruel"},
+    ])
+    assert text == "Goodbye cruel world."
+
+
+@pytest.mark.parametrize("op", [
+    {'start': -1, 'end': 2, 'text': "x"},
+    {'start': 3, 'end': 2, 'text': "x"},
+    {'start': 0, 'end': 13, 'text': "x"},
+    {'start': "0", 'end': 2, 'text': "x"},
+    {'start': 0, 'end': 2, 'text': None},
+])
+def test_apply_ops_rejects_invalid_ops(op):
+    with pytest.raises(ValueError):
+        apply_ops("Hello world.", [op])
+
+
+def test_plan_update_only_touches_edited_region():
+    session = DocumentSession("doc")
+    text = "One here. Two here. Three here. Four here."
+    commit_text(session, text)
+    assert session.version == 1
+    assert len(session.sentences) == 4
+
+    new_text = apply_ops(text, [{'start': 20, 'end': 25, 'text': "Third"}])
+    first, removed, spans, delta = session.plan_update(new_text, simple_spans)
+    # Câu bị sửa cùng một câu đệm mỗi bên
+    assert (first, removed, delta) == (1, 3, 0)
+    assert [new_text[start:end] for start, end in spans] == ["Two here.", "Third here.", "Four here."]
+
+    # plan_update không thay đổi phiên
+    assert session.text == text and session.version == 1
+
+
+def test_commit_shifts_tail_offsets():
+    session = DocumentSession("doc")
+    text = "One here. Two here. Three here. Four here. Five here."
+    commit_text(session, text)
+    new_text = apply_ops(text, [{'start': 0, 'end': 3, 'text': "Number one"}])
+    first, removed, _, delta = commit_text(session, new_text)
+    assert delta == 7
+    assert first == 0 and first + removed < len(session.sentences)
+    assert [new_text[entry['s']:entry['e']] for entry in session.sentences] == simple_spans_text(new_text)
+    assert session.version == 2
+
+
+def test_full_plan_replaces_every_sentence():
+    session = DocumentSession("doc")
+    commit_text(session, "One here. Two here. Three here.")
+    first, removed, spans, _ = session.plan_update("Other text.", simple_spans, full=True)
+    assert (first, removed, spans) == (0, 3, [(0, 11)])
+
+
+def test_store_evicts_least_recently_used():
+    store = DocumentSessionStore(max_sessions=2)
+    sessions = {key: store.get_or_create(key, key) for key in ("a", "b")}
+    for key, session in sessions.items():
+        store.account(key, session)
+    store.get_or_create("a", "a")
+    third = store.get_or_create("c", "c")
+    store.account("c", third)
+    assert store.stats()['sessions'] == 2
+    # "b" ít được dùng nhất: bị loại, tạo lại thì là phiên mới
+    assert store.get_or_create("a", "a") is sessions["a"]
+    assert store.get_or_create("b", "b") is not sessions["b"]
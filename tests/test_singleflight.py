@@ -0,0 +1,80 @@
+# test_singleflight.py
+import threading
+import time
+
+from models.admission import RequestContext
+from models.singleflight import SingleFlight, normalize_sentence
+
+
+def wait_in_thread(flight, call, context=None):
+    """Chạy SingleFlight.wait ở luồng khác, trả về (thread, kết quả)."""
+    result = {}
+
+    def target():
+        result['value'] = flight.wait(call, context)
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    return thread, result
+
+
+def test_followers_receive_leader_result():
+    flight = SingleFlight()
+    leader, call = flight.claim("key")
+    assert leader
+    followers = [flight.claim("key") for _ in range(3)]
+    assert not any(is_leader for is_leader, _ in followers)
+    threads = [wait_in_thread(flight, follower_call) for _, follower_call in followers]
+
+    flight.resolve("key", "Corrected.")
+    for thread, result in threads:
+        thread.join(1.0)
+        assert result['value'] == "Corrected."
+    assert len(flight) == 0
+    assert flight.stats()['coalesced'] == 3
+
+
+def test_leader_failure_releases_followers():
+    flight = SingleFlight()
+    _, call = flight.claim("key")
+    _, follower_call = flight.claim("key")
+    thread, result = wait_in_thread(flight, follower_call)
+
+    # Leader lỗi: corrector gọi abandon trong finally, người chờ nhận None và tự sinh
+    try:
+        raise RuntimeError("generate failed")
+    except RuntimeError:
+        flight.abandon("key", call)
+    thread.join(1.0)
+    assert not thread.is_alive()
+    assert result['value'] is None
+    assert flight.stats()['abandoned'] == 1
+
+    # Khoá đã được trả lại: request sau trở thành leader mới
+    leader, _ = flight.claim("key")
+    assert leader
+
+
+def test_abandon_after_resolve_is_ignored():
+    flight = SingleFlight()
+    _, call = flight.claim("key")
+    flight.resolve("key", "Done.")
+    _, new_call = flight.claim("key")
+    flight.abandon("key", call)
+    assert len(flight) == 1
+    flight.abandon("key", new_call)
+    assert len(flight) == 0
+    assert call.value == "Done."
+
+
+def test_expired_waiter_stops_waiting():
+    flight = SingleFlight()
+    flight.claim("key")
+    _, call = flight.claim("key")
+    started = time.monotonic()
+    assert flight.wait(call, RequestContext(timeout=0.1), poll_interval=0.01) is None
+    assert time.monotonic() - started < 1.0
+
+
+def test_normalize_sentence_ignores_whitespace():
+    assert normalize_sentence("  She  go\tto school. ") == "She go to school."
@@ -0,0 +1,82 @@
+# test_snapshot.py
+import pytest
+
+from models.cache import CorrectionCache
+from models.snapshot import CacheSnapshotter, load_snapshot, prewarm_cache, save_snapshot
+
+ENTRIES = [
+    (("She go to school.", 128, 4), "She goes to school."),
+    (("Tôi đi học.", 128, 4), "Tôi đi học."),
+    (("He have a car.", 128, 1), "He has a car."),
+]
+
+
+def filled_cache():
+    cache = CorrectionCache()
+    for key, value in ENTRIES:
+        cache.put(key, value)
+    return cache
+
+
+def test_round_trip_keeps_entries_and_lru_order(tmp_path):
+    path = str(tmp_path / "cache.snap")
+    assert save_snapshot(filled_cache(), path, "model-a") == 3
+
+    restored = CorrectionCache()
+    assert load_snapshot(restored, path, "model-a") == 3
+    assert restored.items() == ENTRIES
+
+
+def test_other_model_version_is_ignored(tmp_path):
+    path = str(tmp_path / "cache.snap")
+    save_snapshot(filled_cache(), path, "model-a")
+    restored = CorrectionCache()
+    assert load_snapshot(restored, path, "model-b") == 0
+    assert len(restored) == 0
+
+
+def test_missing_file_loads_nothing(tmp_path):
+    assert load_snapshot(CorrectionCache(), str(tmp_path / "missing.snap"), "model-a") == 0
+
+
+def test_corrupt_files_are_rejected(tmp_path):
+    path = tmp_path / "cache.snap"
+    path.write_bytes(b"not a snapshot")
+    with pytest.raises(ValueError):
+        load_snapshot(CorrectionCache(), str(path), "model-a")
+
+    save_snapshot(filled_cache(), str(path), "model-a")
+    path.write_bytes(path.read_bytes()[:-5])
+    with pytest.raises(ValueError):
+        load_snapshot(CorrectionCache(), str(path), "model-a")
+
+
+def test_snapshotter_saves_only_after_changes(tmp_path):
+    cache = filled_cache()
+    snapshotter = CacheSnapshotter(cache, str(tmp_path / "cache.snap"), "model-a")
+    assert snapshotter.save() == 0
+    cache.put(("New sentence.", 128, 4), "New sentence.")
+    assert snapshotter.save() == 4
+    assert snapshotter.save() == 0
+
+
+class StubModel:
+    def __init__(self, cache):
+        self.cache = cache
+        self.calls = []
+
+    def lookup(self, text):
+        return self.cache.get((text, 128, 4))
+
+    def correct_sentences(self, sentences, context=None):
+        self.calls.append(list(sentences))
+        for sentence in sentences:
+            self.cache.put((sentence, 128, 4), sentence)
+        return list(sentences)
+
+
+def test_prewarm_skips_cached_sentences():
+    model = StubModel(filled_cache())
+    sentences = ["She go to school.", "One.", "Two.", "Three."]
+    assert prewarm_cache(model, sentences, chunk_size=2) == 3
+    assert model.calls == [["One.", "Two."], ["Three."]]
@@ -0,0 +1,47 @@
+"""
+Dựng trước chỉ mục gợi ý chính tả (models/spelling.py) và lưu ra file, để
+API chỉ cần nạp lại khi khởi động.
+
+    python utils/build_spelling_index.py
+    python utils/build_spelling_index.py --output data/spelling_index.pkl --max-distance 2
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from models.spelling import build_default_index  # noqa: E402
+
+# Thiết lập logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default=os.path.join(BASE_DIR, "data", "spelling_index.pkl"))
+    parser.add_argument("--max-distance", type=int, default=2)
+    parser.add_argument("--prefix-length", type=int, default=7)
+    parser.add_argument("--max-index-words", type=int, default=60000)
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    index = build_default_index(
+        max_distance=args.max_distance,
+        prefix_length=args.prefix_length,
+        max_index_words=args.max_index_words
+    )
+    index.save(args.output)
+    logger.info(
+        f"Đã dựng chỉ mục {len(index.words):,} từ / {len(index.index):,} khoá "
+        f"trong {time.monotonic() - started:.1f}s: {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
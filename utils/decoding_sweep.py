@@ -0,0 +1,234 @@
+"""
+Quét các cấu hình sinh câu (num_beams, max_length, lượng tử hoá, batch size)
+trên một tập cố định và đo đánh đổi chất lượng - tốc độ.
+
+Mỗi cấu hình ghi lại throughput, phân vị độ trễ, bộ nhớ (RSS) và GLEU/F0.5
+(dùng lại utils/model_evaluation.py). Kết quả gồm báo cáo JSON với các cấu
+hình trên biên Pareto (throughput cao hơn và/hoặc GLEU cao hơn, không bị cấu
+hình nào khác vượt cả hai) và biểu đồ trong evaluation/charts.
+
+    python utils/decoding_sweep.py
+    python utils/decoding_sweep.py --num-beams 1 2 5 --batch-size 1 8 --quantize none int8 --repeat 3
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from utils.model_evaluation import DEFAULT_DATA, DEFAULT_MODEL, load_corrector, score_corpus  # noqa: E402
+
+# Thiết lập logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+QUANTIZATION = {'none': False, 'int8': True}
+
+
+def rss_mb():
+    import psutil
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+def model_size_mb(model):
+    """Kích thước tham số + buffer (model lượng tử hoá lưu trọng số Linear trong packed params)."""
+    state = model.state_dict()
+    total = 0
+    for value in state.values():
+        # Packed params của lớp Linear lượng tử hoá là tuple (weight, bias)
+        for tensor in (value if isinstance(value, tuple) else (value,)):
+            if hasattr(tensor, 'element_size'):
+                total += tensor.element_size() * tensor.nelement()
+    return total / (1024 * 1024)
+
+
+def run_setting(corrector, examples, sentences, groups, num_beams, max_length, batch_size, repeat,
+                speculative=False):
+    """
+    Chạy một cấu hình: mỗi lần gọi correct_sentences là đúng một lô, nên độ
+    trễ của một câu là thời gian của lô chứa nó (giống request đang chờ lô).
+    """
+    # Warm-up một lô để không tính chi phí lần đầu (cấp phát, cache kernel)
+    options = {'max_length': max_length, 'batch_size': batch_size,
+               'num_beams': num_beams, 'speculative': speculative}
+    corrector.correct_sentences(sentences[:batch_size], **options)
+
+    latencies = []
+    peak_rss = rss_mb()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        corrected = []
+        for offset in range(0, len(sentences), batch_size):
+            chunk = sentences[offset:offset + batch_size]
+            batch_started = time.perf_counter()
+            corrected.extend(corrector.correct_sentences(chunk, **options))
+            latencies.extend([(time.perf_counter() - batch_started) * 1000] * len(chunk))
+            peak_rss = max(peak_rss, rss_mb())
+    seconds = time.perf_counter() - started
+
+    # Ghép lại theo từng mẫu để chấm điểm
+    predictions = []
+    offset = 0
+    for count in groups:
+        predictions.append(" ".join(corrected[offset:offset + count]))
+        offset += count
+    quality = score_corpus(examples, predictions)
+
+    percentiles = np.percentile(latencies, [50, 90, 95, 99])
+    return {
+        'sentences_per_second': round(len(sentences) * repeat / seconds, 3),
+        'latency_ms': {f"p{p}": round(float(v), 2) for p, v in zip([50, 90, 95, 99], percentiles)},
+        'peak_rss_mb': round(peak_rss, 1),
+        'gleu': quality['gleu'],
+        'f0_5': quality['f0_5'],
+        'exact_match': quality['exact_match'],
+    }
+
+
+def pareto_frontier(results):
+    """Các cấu hình không bị cấu hình nào khác tốt hơn hoặc bằng ở cả throughput và GLEU."""
+    frontier = []
+    for candidate in results:
+        dominated = any(
+            other['sentences_per_second'] >= candidate['sentences_per_second']
+            and other['gleu'] >= candidate['gleu']
+            and (other['sentences_per_second'] > candidate['sentences_per_second'] or other['gleu'] > candidate['gleu'])
+            for other in results
+        )
+        if not dominated:
+            frontier.append(candidate)
+    return sorted(frontier, key=lambda item: item['sentences_per_second'])
+
+
+def setting_label(result):
+    decoding = 'spec' if result.get('speculative') else f"b{result['num_beams']}"
+    return f"{decoding}/L{result['max_length']}/{result['quantize']}/bs{result['batch_size']}"
+
+
+def create_pareto_chart(results, frontier, output_path):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(12, 7))
+    for quantize in sorted({result['quantize'] for result in results}):
+        points = [result for result in results if result['quantize'] == quantize]
+        plt.scatter(
+            [point['sentences_per_second'] for point in points],
+            [point['gleu'] for point in points],
+            alpha=0.6, label=f"quantize={quantize}"
+        )
+    plt.plot(
+        [point['sentences_per_second'] for point in frontier],
+        [point['gleu'] for point in frontier],
+        'r--', alpha=0.8, label='Biên Pareto'
+    )
+    for point in frontier:
+        plt.annotate(setting_label(point), (point['sentences_per_second'], point['gleu']),
+                     textcoords='offset points', xytext=(5, 5), fontsize=8)
+    plt.title('Chất lượng (GLEU) theo throughput cho từng cấu hình sinh câu')
+    plt.xlabel('Câu / giây')
+    plt.ylabel('GLEU')
+    plt.grid(True, alpha=0.3)
+    plt.legend()
+    plt.tight_layout()
+    plt.savefig(output_path)
+    plt.close()
+
+
+def run_sweep(data_path=DEFAULT_DATA, model_name=DEFAULT_MODEL, device="cpu", num_beams=(1, 2, 5),
+              max_lengths=(64, 128), quantize=('none', 'int8'), batch_sizes=(1, 4, 8), repeat=1,
+              speculative=False):
+    """Chạy toàn bộ lưới cấu hình và ghi báo cáo + biểu đồ vào evaluation/."""
+    from models.segmentation import segment
+
+    reports_dir = os.path.join(BASE_DIR, "evaluation", "reports")
+    charts_dir = os.path.join(BASE_DIR, "evaluation", "charts")
+    os.makedirs(reports_dir, exist_ok=True)
+    os.makedirs(charts_dir, exist_ok=True)
+
+    with open(data_path, 'r', encoding='utf-8') as f:
+        examples = json.load(f)
+    segmented = [segment(example['original']) for example in examples]
+    sentences = [sentence for item in segmented for sentence in item.sentences]
+    groups = [len(item) for item in segmented]
+    logger.info(f"Tập cố định: {len(examples)} mẫu, {len(sentences)} câu")
+
+    results = []
+    # Mỗi chế độ lượng tử hoá tải model một lần; các tham số còn lại dùng chung model
+    for mode in quantize:
+        corrector = load_corrector(model_name, device, use_8bit=QUANTIZATION[mode])
+        size_mb = model_size_mb(corrector.model)
+        # Speculative chỉ áp dụng cho greedy (num_beams=1)
+        decodings = [(beams, False) for beams in num_beams]
+        if speculative and 1 in num_beams:
+            decodings.append((1, True))
+        for (beams, spec), max_length, batch_size in itertools.product(decodings, max_lengths, batch_sizes):
+            logger.info(f"Cấu hình: num_beams={beams} speculative={spec} max_length={max_length} "
+                        f"quantize={mode} batch={batch_size}")
+            result = {
+                'num_beams': beams,
+                'speculative': spec,
+                'max_length': max_length,
+                'quantize': mode,
+                'batch_size': batch_size,
+                'model_size_mb': round(size_mb, 1),
+            }
+            result.update(run_setting(
+                corrector, examples, sentences, groups, beams, max_length, batch_size, repeat, spec
+            ))
+            logger.info(
+                f"  {result['sentences_per_second']} câu/s, p95 {result['latency_ms']['p95']} ms, "
+                f"GLEU {result['gleu']}, RSS {result['peak_rss_mb']} MB"
+            )
+            results.append(result)
+        del corrector
+
+    frontier = pareto_frontier(results)
+    report = {
+        'model': model_name,
+        'data': os.path.relpath(data_path, BASE_DIR),
+        'examples': len(examples),
+        'sentences': len(sentences),
+        'repeat': repeat,
+        'cpu_count': os.cpu_count(),
+        'results': results,
+        'pareto_frontier': [setting_label(point) for point in frontier],
+    }
+
+    output_path = os.path.join(reports_dir, "decoding_sweep.json")
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    create_pareto_chart(results, frontier, os.path.join(charts_dir, "decoding_sweep_pareto.png"))
+    logger.info(f"Biên Pareto: {', '.join(report['pareto_frontier'])}")
+    logger.info(f"Đã ghi báo cáo tại: {output_path}")
+    return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default=DEFAULT_DATA, help="Tập cố định (original/corrected/error_type)")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--num-beams", type=int, nargs="+", default=[1, 2, 5])
+    parser.add_argument("--max-length", type=int, nargs="+", default=[64, 128])
+    parser.add_argument("--quantize", nargs="+", choices=sorted(QUANTIZATION), default=['none', 'int8'])
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--repeat", type=int, default=1, help="Số lần chạy lại tập cho mỗi cấu hình")
+    parser.add_argument("--speculative", action="store_true",
+                        help="Thêm cấu hình greedy speculative (cần num_beams 1 trong lưới)")
+    args = parser.parse_args()
+    run_sweep(args.data, args.model, args.device, args.num_beams, args.max_length,
+              args.quantize, args.batch_size, args.repeat, args.speculative)
+
+
+if __name__ == "__main__":
+    main()
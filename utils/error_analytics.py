@@ -0,0 +1,157 @@
+"""
+Tổng hợp thống kê lỗi theo từng câu từ dữ liệu Parquet do AnalyticsRecorder ghi.
+
+Mọi phép tính đều vector hoá trên cột NumPy/pandas (bitmask loại lỗi, độ trễ),
+nên chạy được trên hàng triệu dòng mà không cần đọc log văn bản.
+
+    python utils/error_analytics.py                        # toàn bộ dữ liệu trong analytics/
+    python utils/error_analytics.py --hours 24 --output evaluation/reports/error_analytics.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from models.analytics import COLUMNS, ERROR_CATEGORIES  # noqa: E402
+
+# Thiết lập logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+PERCENTILES = [50, 90, 95, 99]
+
+# Nhóm độ dài câu (số từ) khi thống kê độ trễ
+LENGTH_BINS = [0, 5, 10, 20, 40, 80, np.inf]
+
+
+def load_frame(directory, since_ms=None):
+    """Đọc các cột thống kê (bỏ qua cột phân vùng date/hour), lọc theo thời gian nếu cần."""
+    filters = [('ts', '>=', since_ms)] if since_ms is not None else None
+    return pd.read_parquet(directory, columns=[name for name, _ in COLUMNS], filters=filters)
+
+
+def latency_percentiles(values):
+    if len(values) == 0:
+        return None
+    return {f"p{p}": round(float(v), 2) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+
+
+def aggregate(df):
+    """
+    Returns:
+        dict: Tần suất loại lỗi, phân phối độ trễ và lưu lượng theo giờ
+    """
+    masks = df['categories'].to_numpy(dtype=np.uint32)
+    latency = df['latency_ms'].to_numpy(dtype=np.float64)
+    cache_hit = df['cache_hit'].to_numpy(dtype=bool)
+    changed = df['changed'].to_numpy(dtype=bool)
+    total = len(df)
+    changed_count = int(changed.sum())
+
+    # Mỗi loại lỗi là một phép AND trên cả cột bitmask
+    generated = ~cache_hit
+    categories = {}
+    for index, name in enumerate(ERROR_CATEGORIES):
+        hit = (masks & np.uint32(1 << index)) != 0
+        count = int(hit.sum())
+        if not count:
+            continue
+        categories[name] = {
+            'count': count,
+            'share_of_changed': round(count / changed_count, 4) if changed_count else 0.0,
+            'latency_ms': latency_percentiles(latency[hit & generated]),
+        }
+    categories = dict(sorted(categories.items(), key=lambda item: item[1]['count'], reverse=True))
+
+    # Độ trễ sinh câu (không tính cache hit) theo nhóm độ dài
+    generated_df = df.loc[generated, ['sentence_words', 'latency_ms']]
+    by_length = pd.DataFrame()
+    if not generated_df.empty:
+        buckets = pd.cut(generated_df['sentence_words'], LENGTH_BINS, right=False)
+        grouped = generated_df.groupby(buckets, observed=True)['latency_ms']
+        by_length = grouped.quantile([p / 100 for p in PERCENTILES]).unstack()
+        by_length['rows'] = grouped.size()
+
+    # Lưu lượng và độ trễ theo giờ
+    hours = pd.to_datetime(df['ts'] // 3_600_000 * 3_600_000, unit='ms', utc=True)
+    by_hour = df.groupby(hours)
+    hourly = by_hour.agg(
+        rows=('ts', 'size'),
+        cache_hit_rate=('cache_hit', 'mean'),
+        changed_rate=('changed', 'mean'),
+    )
+    hourly['latency_p95_ms'] = by_hour['latency_ms'].quantile(0.95)
+
+    return {
+        'rows': total,
+        'changed_rate': round(changed_count / total, 4) if total else 0.0,
+        'cache_hit_rate': round(float(cache_hit.mean()), 4) if total else 0.0,
+        'errors_per_changed_sentence': (
+            round(float(df['error_count'].to_numpy()[changed].mean()), 3) if changed_count else 0.0
+        ),
+        'latency_ms': {
+            'generated': latency_percentiles(latency[generated]),
+            'cache_hit': latency_percentiles(latency[cache_hit]),
+        },
+        'error_types': categories,
+        'latency_by_sentence_words': [
+            {
+                'words': str(bucket),
+                'rows': int(row['rows']),
+                **{f"p{p}": round(float(row[p / 100]), 2) for p in PERCENTILES},
+            }
+            for bucket, row in by_length.iterrows()
+        ],
+        'hourly': [
+            {
+                'hour': hour.isoformat(),
+                'rows': int(row['rows']),
+                'cache_hit_rate': round(float(row['cache_hit_rate']), 4),
+                'changed_rate': round(float(row['changed_rate']), 4),
+                'latency_p95_ms': round(float(row['latency_p95_ms']), 2),
+            }
+            for hour, row in hourly.iterrows()
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", default=os.path.join(BASE_DIR, "analytics"), help="Thư mục dữ liệu Parquet")
+    parser.add_argument("--hours", type=float, help="Chỉ tính dữ liệu trong N giờ gần nhất")
+    parser.add_argument("--output", help="Ghi báo cáo JSON ra file")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.dir):
+        logger.error(f"Không tìm thấy thư mục dữ liệu: {args.dir}")
+        sys.exit(1)
+
+    since_ms = int((time.time() - args.hours * 3600) * 1000) if args.hours else None
+    started = time.monotonic()
+    df = load_frame(args.dir, since_ms)
+    logger.info(f"Đã đọc {len(df):,} dòng trong {time.monotonic() - started:.2f}s")
+    if df.empty:
+        logger.warning("Không có dữ liệu trong khoảng thời gian đã chọn")
+        return
+
+    report = aggregate(df)
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+        logger.info(f"Đã ghi báo cáo tại: {args.output}")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
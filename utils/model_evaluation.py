@@ -0,0 +1,317 @@
+"""
+Đánh giá chất lượng sửa lỗi trên một tập có nhãn (định dạng data/examples.json).
+
+Tính GLEU, precision/recall/F0.5 theo chỉnh sửa ở mức token và độ chính xác
+theo từng error_type. Thống kê của mỗi câu là một vector số nguyên; các chỉ
+số toàn tập/theo nhóm được tính bằng phép cộng vector hoá trên ma trận đó.
+
+    python utils/model_evaluation.py
+    python utils/model_evaluation.py --data data/examples.json --batch-size 16 --workers 2
+"""
+
+import argparse
+import difflib
+import json
+import logging
+import math
+import multiprocessing
+import os
+import re
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+# Thiết lập logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = os.environ.get("EVAL_MODEL", "grammarly/coedit-large")
+DEFAULT_DATA = os.path.join(BASE_DIR, "data", "examples.json")
+
+MAX_NGRAM = 4
+BETA = 0.5
+
+# Cột của ma trận thống kê mỗi câu
+# [hyp_len, ref_len, match_1, total_1, ..., match_4, total_4, tp, fp, fn, exact]
+GLEU_COLUMNS = 2 + 2 * MAX_NGRAM
+TP, FP, FN, EXACT = GLEU_COLUMNS, GLEU_COLUMNS + 1, GLEU_COLUMNS + 2, GLEU_COLUMNS + 3
+STAT_COLUMNS = GLEU_COLUMNS + 4
+
+TOKEN_PATTERN = re.compile(r"\w+(?:'\w+)?|[^\w\s]")
+
+
+def tokenize(text):
+    """Tách token: từ (giữ nguyên dạng viết tắt như don't) và từng dấu câu."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def extract_edits(source, target):
+    """Tập chỉnh sửa (start, end, token thay thế) biến `source` thành `target`."""
+    matcher = difflib.SequenceMatcher(None, source, target, autojunk=False)
+    return {
+        (i1, i2, tuple(target[j1:j2]))
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != 'equal'
+    }
+
+
+def ngrams(tokens, n):
+    return Counter(tuple(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+
+
+def sentence_stats(source, hypothesis, reference):
+    """
+    Vector thống kê của một câu.
+
+    GLEU theo Napoles et al. (2015/2016): n-gram của câu sinh khớp với câu
+    chuẩn, trừ đi các n-gram giữ nguyên từ câu gốc mà câu chuẩn đã sửa.
+    """
+    src, hyp, ref = tokenize(source), tokenize(hypothesis), tokenize(reference)
+    stats = np.zeros(STAT_COLUMNS, dtype=np.int64)
+    stats[0], stats[1] = len(hyp), len(ref)
+    for n in range(1, MAX_NGRAM + 1):
+        hyp_ngrams, ref_ngrams = ngrams(hyp, n), ngrams(ref, n)
+        source_only = ngrams(src, n) - ref_ngrams
+        matched = sum((hyp_ngrams & ref_ngrams).values()) - sum((hyp_ngrams & source_only).values())
+        stats[2 * n] = max(matched, 0)
+        stats[2 * n + 1] = max(len(hyp) + 1 - n, 0)
+
+    hyp_edits, ref_edits = extract_edits(src, hyp), extract_edits(src, ref)
+    stats[TP] = len(hyp_edits & ref_edits)
+    stats[FP] = len(hyp_edits - ref_edits)
+    stats[FN] = len(ref_edits - hyp_edits)
+    stats[EXACT] = hyp == ref
+    return stats
+
+
+def summarize(totals):
+    """Chỉ số từ tổng các vector thống kê (một dòng của ma trận đã cộng)."""
+    hyp_len, ref_len = totals[0], totals[1]
+    matches, counts = totals[2:GLEU_COLUMNS:2], totals[3:GLEU_COLUMNS:2]
+    if hyp_len == 0 or np.any(matches == 0) or np.any(counts == 0):
+        gleu = 0.0
+    else:
+        log_precision = float(np.mean(np.log(matches / counts)))
+        gleu = math.exp(min(0.0, 1 - ref_len / hyp_len) + log_precision)
+
+    tp, fp, fn = (int(value) for value in totals[[TP, FP, FN]])
+    precision = tp / (tp + fp) if tp + fp else 1.0
+    recall = tp / (tp + fn) if tp + fn else 1.0
+    beta2 = BETA * BETA
+    denominator = beta2 * precision + recall
+    f_score = (1 + beta2) * precision * recall / denominator if denominator else 0.0
+    return {
+        'gleu': round(gleu, 4),
+        'precision': round(precision, 4),
+        'recall': round(recall, 4),
+        'f0_5': round(f_score, 4),
+        'tp': tp,
+        'fp': fp,
+        'fn': fn,
+    }
+
+
+def score_corpus(examples, predictions):
+    """
+    Args:
+        examples (list): [{original, corrected, error_type}]
+        predictions (list): Câu model sinh ra, cùng thứ tự với examples
+
+    Returns:
+        dict: Chỉ số toàn tập và theo từng error_type
+    """
+    matrix = np.stack([
+        sentence_stats(example['original'], prediction, example['corrected'])
+        for example, prediction in zip(examples, predictions)
+    ]) if examples else np.zeros((0, STAT_COLUMNS), dtype=np.int64)
+
+    # Cộng theo nhóm error_type bằng một lần np.add.at thay vì lặp theo nhóm
+    types, codes = np.unique([example.get('error_type', 'unknown') for example in examples], return_inverse=True)
+    grouped = np.zeros((len(types), STAT_COLUMNS), dtype=np.int64)
+    np.add.at(grouped, codes, matrix)
+    counts = np.bincount(codes, minlength=len(types))
+
+    overall = summarize(matrix.sum(axis=0))
+    overall['exact_match'] = round(float(matrix[:, EXACT].mean()), 4) if len(matrix) else 0.0
+    by_type = {}
+    for index, error_type in enumerate(types):
+        metrics = summarize(grouped[index])
+        metrics['count'] = int(counts[index])
+        metrics['accuracy'] = round(grouped[index, EXACT] / counts[index], 4)
+        by_type[str(error_type)] = metrics
+    overall['error_types'] = by_type
+    return overall
+
+
+def load_corrector(model_name=DEFAULT_MODEL, device="cpu", **kwargs):
+    """GrammarCorrector không cache kết quả/encoder, để mọi câu đều thực sự chạy model."""
+    from models.corrector import GrammarCorrector
+    return GrammarCorrector(model_name=model_name, device=device, cache_size=0, encoder_cache_size=0, **kwargs)
+
+
+def correct_corpus(corrector, sources, batch_size=8, max_length=128):
+    """
+    Sửa cả tập theo lô: tách câu từng mẫu, sinh tất cả các câu theo lô rồi ghép lại.
+
+    Returns:
+        tuple: (danh sách câu đã sửa, số giây chạy model)
+    """
+    from models.segmentation import segment
+
+    segmented = [segment(source) for source in sources]
+    sentences = [sentence for item in segmented for sentence in item.sentences]
+
+    started = time.perf_counter()
+    corrected = corrector.correct_sentences(
+        sentences, max_length=max_length, batch_size=batch_size
+    )
+    seconds = time.perf_counter() - started
+
+    predictions = []
+    offset = 0
+    for item in segmented:
+        predictions.append(" ".join(corrected[offset:offset + len(item)]))
+        offset += len(item)
+    return predictions, seconds
+
+
+_worker_corrector = None
+
+
+def _init_worker(model_name, device, threads):
+    global _worker_corrector
+    import torch
+    torch.set_num_threads(threads)
+    _worker_corrector = load_corrector(model_name, device)
+
+
+def _run_shard(task):
+    indices, sources, batch_size, max_length = task
+    predictions, seconds = correct_corpus(_worker_corrector, sources, batch_size, max_length)
+    return indices, predictions, seconds
+
+
+def predict_parallel(sources, model_name, device, batch_size, max_length, workers):
+    """
+    Chia tập thành các shard và sửa song song trên `workers` tiến trình
+    (mỗi tiến trình tải model một lần và dùng cpu_count / workers luồng).
+    """
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    shards = [shard for shard in np.array_split(np.arange(len(sources)), workers * 4) if len(shard)]
+    tasks = [
+        (shard.tolist(), [sources[i] for i in shard], batch_size, max_length)
+        for shard in shards
+    ]
+    predictions = [None] * len(sources)
+    model_seconds = 0.0
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(workers, initializer=_init_worker, initargs=(model_name, device, threads)) as pool:
+        for indices, shard_predictions, seconds in pool.imap_unordered(_run_shard, tasks):
+            for index, prediction in zip(indices, shard_predictions):
+                predictions[index] = prediction
+            model_seconds += seconds
+    return predictions, model_seconds
+
+
+def create_accuracy_chart(report, output_path):
+    """Biểu đồ độ chính xác và F0.5 theo error_type."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    names = list(report['error_types'])
+    accuracy = [report['error_types'][name]['accuracy'] for name in names]
+    f_scores = [report['error_types'][name]['f0_5'] for name in names]
+    positions = np.arange(len(names))
+
+    plt.figure(figsize=(12, 6))
+    plt.bar(positions - 0.2, accuracy, width=0.4, label='Exact match')
+    plt.bar(positions + 0.2, f_scores, width=0.4, label='F0.5 (token edits)')
+    plt.xticks(positions, names, rotation=30, ha='right')
+    plt.ylim(0, 1.05)
+    plt.title(f"Chất lượng theo loại lỗi - GLEU {report['gleu']:.3f}, F0.5 {report['f0_5']:.3f}")
+    plt.legend()
+    plt.grid(True, axis='y', alpha=0.3)
+    plt.tight_layout()
+    plt.savefig(output_path)
+    plt.close()
+
+
+def evaluate_model(data_path=DEFAULT_DATA, model_name=DEFAULT_MODEL, device="cpu",
+                   batch_size=8, max_length=128, workers=1):
+    """Chạy đánh giá và ghi báo cáo JSON + biểu đồ vào evaluation/."""
+    try:
+        reports_dir = os.path.join(BASE_DIR, "evaluation", "reports")
+        charts_dir = os.path.join(BASE_DIR, "evaluation", "charts")
+        os.makedirs(reports_dir, exist_ok=True)
+        os.makedirs(charts_dir, exist_ok=True)
+
+        with open(data_path, 'r', encoding='utf-8') as f:
+            examples = json.load(f)
+        sources = [example['original'] for example in examples]
+        logger.info(f"Đang đánh giá {model_name} trên {len(examples)} mẫu ({data_path})")
+
+        started = time.perf_counter()
+        if workers > 1:
+            predictions, model_seconds = predict_parallel(
+                sources, model_name, device, batch_size, max_length, workers
+            )
+        else:
+            corrector = load_corrector(model_name, device)
+            predictions, model_seconds = correct_corpus(corrector, sources, batch_size, max_length)
+        wall_seconds = time.perf_counter() - started
+
+        report = score_corpus(examples, predictions)
+        report.update({
+            'model': model_name,
+            'data': os.path.relpath(data_path, BASE_DIR),
+            'examples': len(examples),
+            'batch_size': batch_size,
+            'max_length': max_length,
+            'workers': workers,
+            'wall_seconds': round(wall_seconds, 3),
+            'model_seconds': round(model_seconds, 3),
+            'examples_per_second': round(len(examples) / wall_seconds, 3) if wall_seconds else None,
+            'mistakes': [
+                {'original': example['original'], 'expected': example['corrected'], 'predicted': prediction}
+                for example, prediction in zip(examples, predictions)
+                if tokenize(prediction) != tokenize(example['corrected'])
+            ][:50],
+        })
+
+        output_path = os.path.join(reports_dir, "model_evaluation.json")
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        create_accuracy_chart(report, os.path.join(charts_dir, "error_type_accuracy.png"))
+
+        logger.info(
+            f"GLEU {report['gleu']:.4f} | P {report['precision']:.4f} R {report['recall']:.4f} "
+            f"F0.5 {report['f0_5']:.4f} | exact {report['exact_match']:.4f}"
+        )
+        logger.info(f"Đã ghi báo cáo đánh giá tại: {output_path}")
+        return output_path
+
+    except Exception as e:
+        logger.error(f"Lỗi khi đánh giá mô hình: {str(e)}")
+        raise
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default=DEFAULT_DATA, help="Tập đánh giá (original/corrected/error_type)")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="Tên model HuggingFace hoặc đường dẫn cục bộ")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--max-length", type=int, default=128)
+    parser.add_argument("--workers", type=int, default=1, help="Số tiến trình (mỗi tiến trình tải một bản model)")
+    args = parser.parse_args()
+    evaluate_model(args.data, args.model, args.device, args.batch_size, args.max_length, args.workers)
+
+
+if __name__ == "__main__":
+    main()